@@ -0,0 +1,12 @@
+import os
+
+from celery import Celery
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'admin_api.settings')
+
+app = Celery('admin_api')
+app.config_from_object('django.conf:settings', namespace='CELERY')
+app.autodiscover_tasks()
+
+# Connects the task instrumentation signal handlers
+from . import task_metrics  # noqa: E402,F401
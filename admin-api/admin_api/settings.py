@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
 from pathlib import Path
+from datetime import timedelta
 import os
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -38,9 +39,14 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'rest_framework',
+    'rest_framework_simplejwt',
+    'books',
+    'users',
 ]
 
 MIDDLEWARE = [
+    'library_common.metrics.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -71,6 +77,101 @@ ROOT_URLCONF = 'admin_api.urls'
 WSGI_APPLICATION = 'admin_api.wsgi.application'
 CELERY_BROKER_URL = os.environ.get('REDIS_URL', 'redis://localhost:6379/1')  # Note: database 1
 
+# Inter-service communication
+INTER_SERVICE_TOKEN = os.environ.get('INTER_SERVICE_TOKEN', 'your-inter-service-token')
+# Further keys accepted while one is rotated in or out (comma-separated);
+# see library_common/inter_service_keys.py for the rotation steps
+INTER_SERVICE_ACCEPTED_TOKENS = [key for key in os.environ.get('INTER_SERVICE_ACCEPTED_TOKENS', '').split(',') if key]
+INTER_SERVICE_KEYS_REDIS_URL = os.environ.get('REDIS_URL')
+INTER_SERVICE_KEYS_REDIS_KEY = 'inter-service:keys'
+INTER_SERVICE_KEYS_REFRESH = float(os.environ.get('INTER_SERVICE_KEYS_REFRESH', 30))
+# Sign outgoing requests with HMAC instead of sending the key; reject unsigned ones
+INTER_SERVICE_SIGN_REQUESTS = os.environ.get('INTER_SERVICE_SIGN_REQUESTS', 'False') == 'True'
+INTER_SERVICE_REQUIRE_SIGNATURE = os.environ.get('INTER_SERVICE_REQUIRE_SIGNATURE', 'False') == 'True'
+# Seconds of clock skew (and replay window) tolerated on a signature
+INTER_SERVICE_SIGNATURE_MAX_AGE = int(os.environ.get('INTER_SERVICE_SIGNATURE_MAX_AGE', 300))
+
+# Request metrics: requests slower than this are logged with their SQL
+SLOW_REQUEST_THRESHOLD = float(os.environ.get('SLOW_REQUEST_THRESHOLD', 1.0))
+SLOW_REQUEST_MAX_QUERIES = int(os.environ.get('SLOW_REQUEST_MAX_QUERIES', 100))
+METRICS_COLLECTORS = ['admin_api.task_metrics.TaskMetricsCollector']
+
+# Celery task metrics: recent runs kept for latency percentiles
+TASK_METRICS_SAMPLES = int(os.environ.get('TASK_METRICS_SAMPLES', 2000))
+FRONTEND_API_URL = os.environ.get('FRONTEND_API_URL', 'http://localhost:8000')
+
+# Pooled keep-alive client used for every admin -> frontend call
+INTER_SERVICE_CONNECT_TIMEOUT = float(os.environ.get('INTER_SERVICE_CONNECT_TIMEOUT', 3.05))
+INTER_SERVICE_READ_TIMEOUT = float(os.environ.get('INTER_SERVICE_READ_TIMEOUT', 30))
+INTER_SERVICE_POOL_SIZE = int(os.environ.get('INTER_SERVICE_POOL_SIZE', 0))  # 0: match worker concurrency
+CELERY_WORKER_CONCURRENCY = int(os.environ.get('CELERY_WORKER_CONCURRENCY', 0)) or None
+
+# Outbox changes sent to the frontend per relay request
+SYNC_BATCH_SIZE = int(os.environ.get('SYNC_BATCH_SIZE', 500))
+
+# Retries of failed catalog sync: exponential backoff with full jitter, then
+# the change goes to the dead-letter queue (manage.py dead_letters)
+SYNC_MAX_RETRIES = int(os.environ.get('SYNC_MAX_RETRIES', 8))
+SYNC_RETRY_BASE_DELAY = float(os.environ.get('SYNC_RETRY_BASE_DELAY', 2))
+SYNC_RETRY_MAX_DELAY = float(os.environ.get('SYNC_RETRY_MAX_DELAY', 300))
+
+# Rows fetched from the server-side cursor per chunk in streaming exports
+EXPORT_CHUNK_SIZE = int(os.environ.get('EXPORT_CHUNK_SIZE', 2000))
+
+# Catalog outbox relay
+OUTBOX_RELAY_INTERVAL = float(os.environ.get('OUTBOX_RELAY_INTERVAL', 10))
+OUTBOX_RELAY_LOCK_TIMEOUT = int(os.environ.get('OUTBOX_RELAY_LOCK_TIMEOUT', 300))
+
+# Catalog reconciliation (hash-range diff against the frontend)
+RECONCILE_INTERVAL = float(os.environ.get('RECONCILE_INTERVAL', 6 * 60 * 60))
+RECONCILE_PREFIX_LENGTHS = [4, 6, 8, 10, 13]
+RECONCILE_LEAF_SIZE = int(os.environ.get('RECONCILE_LEAF_SIZE', 64))
+
+# How often the frontend is asked to purge expired book tombstones
+TOMBSTONE_PURGE_INTERVAL = float(os.environ.get('TOMBSTONE_PURGE_INTERVAL', 24 * 60 * 60))
+
+# Overdue loan sweep
+OVERDUE_SWEEP_INTERVAL = float(os.environ.get('OVERDUE_SWEEP_INTERVAL', 60 * 60))
+OVERDUE_SWEEP_CHUNK_SIZE = int(os.environ.get('OVERDUE_SWEEP_CHUNK_SIZE', 500))
+OVERDUE_SWEEP_LOCK_TIMEOUT = int(os.environ.get('OVERDUE_SWEEP_LOCK_TIMEOUT', 30 * 60))
+DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL', 'library@example.com')
+EMAIL_HOST = os.environ.get('EMAIL_HOST', 'localhost')
+EMAIL_PORT = int(os.environ.get('EMAIL_PORT', 25))
+
+CELERY_BEAT_SCHEDULE = {
+    'relay-book-changes': {
+        'task': 'books.tasks.relay_book_changes',
+        'schedule': OUTBOX_RELAY_INTERVAL,
+    },
+    'reconcile-catalog': {
+        'task': 'books.tasks.reconcile_catalog',
+        'schedule': RECONCILE_INTERVAL,
+    },
+    'purge-book-tombstones': {
+        'task': 'books.tasks.purge_book_tombstones',
+        'schedule': TOMBSTONE_PURGE_INTERVAL,
+    },
+    'sweep-overdue-loans': {
+        'task': 'books.tasks.sweep_overdue_loans',
+        'schedule': OVERDUE_SWEEP_INTERVAL,
+    },
+}
+
+# Cache (shared through Redis when available so locks work across workers)
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+
+# Publisher/Category lookups cached per process; invalidated over Redis pub/sub when set
+REFERENCE_CACHE_SIZE = int(os.environ.get('REFERENCE_CACHE_SIZE', 1000))
+REFERENCE_CACHE_REDIS_URL = os.environ.get('REDIS_URL')
+# Channels are shared by every Redis database, so each service gets its own
+REFERENCE_CACHE_CHANNEL = 'admin:reference-cache:invalidate'
+
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
@@ -122,3 +223,26 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# REST Framework
+REST_FRAMEWORK = {
+    'DEFAULT_AUTHENTICATION_CLASSES': (
+        'rest_framework_simplejwt.authentication.JWTAuthentication',
+    ),
+    'DEFAULT_PERMISSION_CLASSES': [
+        'rest_framework.permissions.IsAuthenticated',
+    ],
+    'DEFAULT_RENDERER_CLASSES': [
+        # JSONRenderer that times itself for serializer_duration_seconds
+        'library_common.metrics.TimedJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    'PAGE_SIZE': 20
+}
+
+# JWT Settings
+SIMPLE_JWT = {
+    'ACCESS_TOKEN_LIFETIME': timedelta(hours=1),
+    'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
+}
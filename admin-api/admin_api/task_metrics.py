@@ -0,0 +1,251 @@
+"""
+Celery task instrumentation: time spent queued, run time, time spent calling
+the frontend and the outcome of every task run, plus the edit-to-frontend
+lag of every outbox change the relay delivers.
+
+Workers add these to histogram counters in the shared cache, exported by
+the metrics endpoint, and to fixed-size rings of recent samples read by the
+``sync_lag`` command. Both need a cache every process sees: with a
+process-local one (no REDIS_URL) workers, web processes and the command
+would each count only their own runs, so they refuse to start instead.
+"""
+import logging
+import math
+import time
+from collections import Counter
+from datetime import datetime
+
+from celery import current_app, current_task
+from celery.signals import before_task_publish, task_postrun, task_prerun, worker_init
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+from django.utils import timezone
+from prometheus_client.core import CounterMetricFamily, HistogramMetricFamily
+from prometheus_client.utils import floatToGoString
+
+logger = logging.getLogger(__name__)
+
+SEQUENCE_KEY = 'tasks:metrics:sequence'
+SAMPLE_KEY = 'tasks:metrics:sample:{}'
+RUNS_KEY = 'tasks:metrics:runs:{}:{}'
+# Task, timing, then a bucket's upper bound (non-cumulative count) or 'sum' (microseconds)
+HISTOGRAM_KEY = 'tasks:metrics:histogram:{}:{}:{}'
+SYNC_LAG_SEQUENCE_KEY = 'tasks:metrics:sync-lag:sequence'
+SYNC_LAG_SAMPLE_KEY = 'tasks:metrics:sync-lag:sample:{}'
+# A bucket's upper bound or 'sum', as above
+SYNC_LAG_KEY = 'tasks:metrics:sync-lag:{}'
+OUTCOMES = ('success', 'error', 'retry', 'failure')
+TIMINGS = ('queue', 'runtime', 'http')
+QUANTILES = (0.5, 0.9, 0.99)
+# Seconds; sync lag covers relay retries with backoff, hence the long tail
+BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 900, 3600, float('inf'))
+
+
+def require_shared_cache():
+    backend = caches['default']
+    if isinstance(backend, (LocMemCache, DummyCache)):
+        raise ImproperlyConfigured(
+            'Task metrics need a cache shared by every worker and web process '
+            f'(set REDIS_URL); the default cache is {type(backend).__name__}.'
+        )
+
+
+@worker_init.connect
+def check_cache(**kwargs):
+    # Celery logs and carries on when a signal handler raises; this must stop the worker
+    try:
+        require_shared_cache()
+    except ImproperlyConfigured as e:
+        raise SystemExit(str(e))
+
+
+@before_task_publish.connect
+def stamp_due_time(headers=None, **kwargs):
+    # Queue time counts from when the message is due: the countdown of a
+    # retry (or any eta) is backoff, not time spent waiting for a worker.
+    # Stamped on every publish, so a retry starts counting afresh
+    if headers is not None:
+        eta = headers.get('eta')
+        due_at = datetime.fromisoformat(eta).timestamp() if eta else 0
+        headers['due_at'] = max(time.time(), due_at)
+
+
+@task_prerun.connect
+def start_run(task=None, **kwargs):
+    task.request.metrics_started = time.perf_counter()
+    task.request.metrics_started_at = time.time()
+    task.request.metrics_http = 0.0
+    task.request.metrics_error = False
+
+
+def running_request():
+    # current_task is a proxy that is falsy outside a task
+    if current_task and getattr(current_task.request, 'metrics_started', None) is not None:
+        return current_task.request
+    return None
+
+
+def add_http_time(seconds):
+    request = running_request()
+    if request is not None:
+        request.metrics_http += seconds
+
+
+def record_error():
+    """Mark the running task as failed when it handles the error itself."""
+    request = running_request()
+    if request is not None:
+        request.metrics_error = True
+
+
+@task_postrun.connect
+def finish_run(task=None, state=None, **kwargs):
+    request = task.request
+    started = getattr(request, 'metrics_started', None)
+    if started is None:
+        return
+
+    runtime = time.perf_counter() - started
+    # Workers expose message headers on the request, eager runs under request.headers
+    due_at = getattr(request, 'due_at', None) or (request.headers or {}).get('due_at')
+    queue = max(0.0, request.metrics_started_at - due_at) if due_at else 0.0
+    outcome = (state or 'failure').lower()
+    if outcome == 'success' and request.metrics_error:
+        outcome = 'error'
+
+    try:
+        record_sample({
+            'task': task.name,
+            'outcome': outcome,
+            'queue': queue,
+            'runtime': runtime,
+            'http': request.metrics_http,
+            'finished_at': time.time(),
+        })
+    except Exception:
+        logger.exception('Error recording task metrics')
+
+
+def incr(key, delta=1):
+    cache.add(key, 0, None)
+    return cache.incr(key, delta)
+
+
+def bucket_for(seconds):
+    return next(bound for bound in BUCKETS if seconds <= bound)
+
+
+def record_sample(sample):
+    position = (incr(SEQUENCE_KEY) - 1) % settings.TASK_METRICS_SAMPLES
+    cache.set(SAMPLE_KEY.format(position), sample, None)
+    incr(RUNS_KEY.format(sample['task'], sample['outcome']))
+    # One bucket and the sum per timing; the exporter accumulates the buckets
+    for timing in TIMINGS:
+        incr(HISTOGRAM_KEY.format(sample['task'], timing, bucket_for(sample[timing])))
+        incr(HISTOGRAM_KEY.format(sample['task'], timing, 'sum'), round(sample[timing] * 1_000_000))
+
+
+def record_sync_lag(created_at):
+    """Record the lag of outbox changes the frontend just applied, given when each was written."""
+    now = timezone.now()
+    lags = [(now - written).total_seconds() for written in created_at]
+    if not lags:
+        return
+    end = incr(SYNC_LAG_SEQUENCE_KEY, len(lags))
+    cache.set_many({
+        SYNC_LAG_SAMPLE_KEY.format(position % settings.TASK_METRICS_SAMPLES): lag
+        for position, lag in zip(range(end - len(lags), end), lags)
+    }, None)
+    for bound, count in Counter(map(bucket_for, lags)).items():
+        incr(SYNC_LAG_KEY.format(bound), count)
+    incr(SYNC_LAG_KEY.format('sum'), round(sum(lags) * 1_000_000))
+
+
+def ring(sequence_key, sample_key):
+    sequence = cache.get(sequence_key) or 0
+    keys = [sample_key.format(position) for position in range(min(sequence, settings.TASK_METRICS_SAMPLES))]
+    return list(cache.get_many(keys).values())
+
+
+def recent_samples():
+    return ring(SEQUENCE_KEY, SAMPLE_KEY)
+
+
+def recent_sync_lags():
+    return ring(SYNC_LAG_SEQUENCE_KEY, SYNC_LAG_SAMPLE_KEY)
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def quantiles(values):
+    return {**{quantile: percentile(values, quantile) for quantile in QUANTILES}, 'max': max(values)}
+
+
+def summarize(samples):
+    """Per task: run count, outcome counts and quantiles of every timing."""
+    by_task = {}
+    for sample in samples:
+        by_task.setdefault(sample['task'], []).append(sample)
+
+    summary = {}
+    for task, runs in sorted(by_task.items()):
+        summary[task] = {
+            'runs': len(runs),
+            'outcomes': {outcome: sum(run['outcome'] == outcome for run in runs) for outcome in OUTCOMES},
+            'timings': {timing: quantiles([run[timing] for run in runs]) for timing in TIMINGS},
+        }
+    return summary
+
+
+def cumulative_buckets(counts, key):
+    """Prometheus buckets and their total from per-bucket counts stored under ``key.format(bound)``."""
+    total, buckets = 0, []
+    for bound in BUCKETS:
+        total += counts.get(key.format(bound), 0)
+        buckets.append((floatToGoString(bound), total))
+    return buckets, total
+
+
+class TaskMetricsCollector:
+    """prometheus_client collector for the metrics endpoint (see METRICS_COLLECTORS)."""
+
+    def collect(self):
+        require_shared_cache()
+        names = sorted(name for name in current_app.tasks if not name.startswith('celery.'))
+
+        runs = CounterMetricFamily('celery_task_runs_total', 'Task runs by outcome.', labels=('outcome', 'task'))
+        keys = {RUNS_KEY.format(name, outcome): (name, outcome) for name in names for outcome in OUTCOMES}
+        for key, count in sorted(cache.get_many(list(keys)).items()):
+            name, outcome = keys[key]
+            runs.add_metric((outcome, name), count)
+        yield runs
+
+        keys = [
+            HISTOGRAM_KEY.format(name, timing, slot)
+            for name in names for timing in TIMINGS for slot in BUCKETS + ('sum',)
+        ]
+        counts = cache.get_many(keys)
+        for timing in TIMINGS:
+            histogram = HistogramMetricFamily(
+                f'celery_task_{timing}_seconds', f'Task {timing} time per run.', labels=('task',)
+            )
+            for name in names:
+                key = HISTOGRAM_KEY.format(name, timing, '{}')
+                buckets, total = cumulative_buckets(counts, key)
+                if total:
+                    histogram.add_metric((name,), buckets, counts.get(key.format('sum'), 0) / 1_000_000)
+            yield histogram
+
+        counts = cache.get_many([SYNC_LAG_KEY.format(slot) for slot in BUCKETS + ('sum',)])
+        lag = HistogramMetricFamily(
+            'book_sync_lag_seconds', 'Time from an admin edit to the frontend applying it, per outbox change.'
+        )
+        buckets, _ = cumulative_buckets(counts, SYNC_LAG_KEY)
+        lag.add_metric((), buckets, counts.get(SYNC_LAG_KEY.format('sum'), 0) / 1_000_000)
+        yield lag
@@ -0,0 +1,96 @@
+"""
+Compare admin -> frontend call throughput: one-off ``requests.post`` calls
+(the previous sync task behaviour) against the pooled keep-alive session.
+
+Usage:
+    python -m benchmarks.inter_service_client --requests 2000 --threads 4
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import django
+import requests
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'admin_api.settings')
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    body = json.dumps({'applied': 1, 'skipped': 0}).encode()
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(self.body)))
+        self.end_headers()
+        self.wfile.write(self.body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub_server(handler=StubHandler):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def run(call, total, threads):
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        for response in executor.map(lambda _: call(), range(total)):
+            response.raise_for_status()
+    return total / (time.perf_counter() - started)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--threads', type=int, default=4)
+    args = parser.parse_args(argv)
+
+    server = start_stub_server()
+    base_url = f'http://127.0.0.1:{server.server_port}'
+
+    django.setup()
+    from django.conf import settings
+    from admin_api import inter_service
+    settings.FRONTEND_API_URL = base_url
+    settings.INTER_SERVICE_POOL_SIZE = args.threads
+
+    payload = {'changes': [{'operation': 'delete', 'sequence': 1, 'isbn': '9780132350884'}]}
+    headers = {
+        'Authorization': f'Token {settings.INTER_SERVICE_TOKEN}',
+        'Content-Type': 'application/json'
+    }
+
+    results = {
+        'requests': args.requests,
+        'threads': args.threads,
+        'unpooled_rps': run(
+            lambda: requests.post(f'{base_url}/api/internal/book-changes/', json=payload, headers=headers),
+            args.requests, args.threads
+        ),
+        'pooled_rps': run(
+            lambda: inter_service.post('/api/internal/book-changes/', json=payload),
+            args.requests, args.threads
+        ),
+    }
+    results['speedup'] = results['pooled_rps'] / results['unpooled_rps']
+    server.shutdown()
+
+    json.dump(results, sys.stdout, indent=2)
+    sys.stdout.write('\n')
+
+
+if __name__ == '__main__':
+    main()
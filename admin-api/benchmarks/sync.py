@@ -0,0 +1,117 @@
+"""
+Time the catalog sync path from the admin side: building payloads, the outbox
+relay pushing the whole catalog once, and the relay draining an edit storm.
+
+Usage (point DATABASE_URL at a PostgreSQL database; it will be filled):
+    python -m benchmarks.sync --books 1000000 --changes 50000 --output sync.json
+
+Without --url the frontend is a stub that accepts everything, which times
+this service alone; with it (and the frontend's INTER_SERVICE_TOKEN) the
+books really land in that frontend, end to end.
+"""
+import argparse
+import json
+import os
+import time
+
+import django
+
+from benchmarks.inter_service_client import StubHandler, start_stub_server
+from library_common.benchmarks.report import emit, run_params, summarize
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'admin_api.settings')
+
+
+class CountingHandler(StubHandler):
+    # Reports real counts, as the frontend does, instead of StubHandler's fixed body
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        reply = json.dumps({'applied': len(body.get('changes', [])), 'skipped': 0}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(reply)))
+        self.end_headers()
+        self.wfile.write(reply)
+
+
+def payload_benchmark(book_ids, batch_size):
+    from books.models import Book
+    from books.tasks import book_sync_payloads
+
+    timings = []
+    for start in range(0, len(book_ids), batch_size):
+        batch = list(Book.objects.filter(id__in=book_ids[start:start + batch_size]))
+        started = time.perf_counter()
+        book_sync_payloads(batch)
+        timings.append((time.perf_counter() - started) * 1000)
+    results = summarize(timings)
+    results['books_per_second'] = len(book_ids) * 1000 / sum(timings)
+    return results
+
+
+def timed_relay(book_ids, edits):
+    """Queue ``edits`` outbox changes per book, then time one relay run draining them."""
+    from django.core.cache import cache
+    from books.models import Book, BookChange
+    from books.tasks import RELAY_FAILURES_KEY, RELAY_LOCK_KEY, RELAY_RETRY_AT_KEY, relay_book_changes
+
+    BookChange.objects.all().delete()
+    isbns = dict(Book.objects.filter(id__in=book_ids).values_list('id', 'isbn'))
+    BookChange.objects.bulk_create([
+        BookChange(operation=BookChange.UPSERT, book_id=book_id, isbn=isbns[book_id])
+        for _ in range(edits) for book_id in book_ids
+    ], batch_size=5000)
+    cache.delete_many([RELAY_LOCK_KEY, RELAY_FAILURES_KEY, RELAY_RETRY_AT_KEY])
+
+    started = time.perf_counter()
+    relayed = relay_book_changes()
+    return relayed, time.perf_counter() - started, BookChange.objects.count()
+
+
+def bulk_sync_benchmark(book_ids):
+    # A full resync is one outbox change per book
+    synced, elapsed, _ = timed_relay(book_ids, edits=1)
+    return {'books': len(book_ids), 'synced': synced, 'elapsed_ms': elapsed * 1000,
+            'books_per_second': len(book_ids) / elapsed}
+
+
+def relay_benchmark(book_ids, edits):
+    # Every book edited ``edits`` times: the relay should send each only once
+    relayed, elapsed, left_over = timed_relay(book_ids, edits)
+    return {'changes': relayed, 'left_over': left_over, 'elapsed_ms': elapsed * 1000,
+            'changes_per_second': relayed / elapsed}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--books', type=int, default=100_000)
+    parser.add_argument('--changes', type=int, default=10_000, help='Books edited before the relay runs.')
+    parser.add_argument('--edits', type=int, default=3, help='Edits per book, coalesced by the relay.')
+    parser.add_argument('--url', help='A running frontend API to sync into, instead of the stub.')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='Write the results here instead of to stdout.')
+    args = parser.parse_args(argv)
+
+    server = None if args.url else start_stub_server(CountingHandler)
+
+    django.setup()
+    from django.conf import settings
+    from benchmarks.data import generate_catalog
+    from books.models import Book
+    settings.FRONTEND_API_URL = args.url or f'http://127.0.0.1:{server.server_port}'
+
+    generate_catalog(args.books, seed=args.seed)
+    book_ids = list(Book.objects.order_by('id').values_list('id', flat=True)[:args.books])
+    results = {
+        'payloads': payload_benchmark(book_ids, settings.SYNC_BATCH_SIZE),
+        'bulk_sync': bulk_sync_benchmark(book_ids),
+        'relay': relay_benchmark(book_ids[:args.changes], args.edits),
+    }
+    if server is not None:
+        server.shutdown()
+
+    emit('sync', dict(run_params(args), frontend='stub' if server else 'live'), results, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from books.models import Book, BookChange, DeadLetter
+from books.tasks import kick_relay
+
+
+class Command(BaseCommand):
+    help = 'Inspect, replay or purge book changes in the sync dead-letter queue.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('action', nargs='?', default='list', choices=['list', 'show', 'replay', 'purge'])
+        parser.add_argument('ids', nargs='*', type=int, help='Dead letters to act on (default: all).')
+
+    def handle(self, *args, **options):
+        letters = DeadLetter.objects.all()
+        if options['ids']:
+            letters = letters.filter(id__in=options['ids'])
+        elif options['action'] == 'show':
+            raise CommandError('show needs at least one id')
+        getattr(self, options['action'])(letters)
+
+    def list(self, letters):
+        count = 0
+        for letter in letters.iterator():
+            count += 1
+            self.stdout.write(
+                f'{letter.id:>6}  {letter.created_at:%Y-%m-%d %H:%M}  {letter.operation:<6}  '
+                f'{letter.isbn:<13}  attempts={letter.attempts}  {letter.error.splitlines()[0][:80]}'
+            )
+        self.stdout.write(f'{count} dead letter(s)')
+
+    def show(self, letters):
+        for letter in letters:
+            self.stdout.write(
+                f'#{letter.id} {letter.operation} {letter.isbn} (book {letter.book_id}), '
+                f'{letter.attempts} attempt(s), {letter.created_at:%Y-%m-%d %H:%M:%S}\n{letter.error}\n'
+            )
+
+    def replay(self, letters):
+        # Back through the outbox, so replays are ordered and collapsed like any edit
+        with transaction.atomic():
+            letters = list(letters.select_for_update())
+            # A delete replayed after its ISBN was added again would get a newer
+            # sequence than that upsert and remove the book from the frontend
+            existing = set(Book.objects.filter(
+                isbn__in=[letter.isbn for letter in letters if letter.operation == BookChange.DELETE]
+            ).values_list('isbn', flat=True))
+            replayed = [
+                letter for letter in letters
+                if not (letter.operation == BookChange.DELETE and letter.isbn in existing)
+            ]
+            BookChange.objects.bulk_create([
+                BookChange(operation=letter.operation, book_id=letter.book_id, isbn=letter.isbn)
+                for letter in replayed
+            ])
+            DeadLetter.objects.filter(id__in=[letter.id for letter in letters]).delete()
+            if replayed:
+                transaction.on_commit(kick_relay)
+        self.stdout.write(f'Replayed {len(replayed)} dead letter(s)')
+        if len(replayed) < len(letters):
+            self.stdout.write(f'Dropped {len(letters) - len(replayed)} delete(s) of books that exist again')
+
+    def purge(self, letters):
+        deleted, _ = letters.delete()
+        self.stdout.write(f'Purged {deleted} dead letter(s)')
@@ -0,0 +1,199 @@
+import argparse
+import csv
+import hashlib
+import json
+import os
+import time
+from datetime import date
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from books.models import Book, BookChange, CatalogImport, Category, Publisher
+from books.tasks import kick_relay
+
+REQUIRED_FIELDS = ('isbn', 'title', 'author', 'publisher', 'category', 'published_date')
+MAX_LENGTHS = {'isbn': 13, 'title': 200, 'author': 100, 'publisher': 100, 'category': 50}
+ALIASES = {'publisher_name': 'publisher', 'category_name': 'category'}
+UPDATE_FIELDS = ['title', 'author', 'publisher', 'category', 'published_date', 'description', 'updated_at']
+MAX_REPORTED_ERRORS = 20
+
+
+def positive_int(value):
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f'must be a positive integer, not {value}')
+    return number
+
+
+def fingerprint(path):
+    # Size plus the head of the file: cheap, and stable across a crash and rerun
+    digest = hashlib.sha256(str(os.path.getsize(path)).encode())
+    with open(path, 'rb') as f:
+        digest.update(f.read(1 << 16))
+    return digest.hexdigest()
+
+
+def read_records(path, file_format):
+    """Yield one dict per record (or the ValueError of an unparsable line) without loading the file."""
+    with open(path, newline='', encoding='utf-8') as f:
+        if file_format == 'csv':
+            yield from csv.DictReader(f)
+            return
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError as e:
+                yield e
+
+
+def clean_record(record):
+    if isinstance(record, Exception):
+        raise record
+    if not isinstance(record, dict):
+        raise ValueError('not an object')
+
+    record = {ALIASES.get(key, key): value for key, value in record.items() if key}
+    record = {key: value.strip() if isinstance(value, str) else value for key, value in record.items()}
+    missing = [field for field in REQUIRED_FIELDS if not record.get(field)]
+    if missing:
+        raise ValueError(f"missing {', '.join(missing)}")
+
+    record['isbn'] = str(record['isbn']).replace('-', '').replace(' ', '')
+    for field, max_length in MAX_LENGTHS.items():
+        if len(str(record[field])) > max_length:
+            raise ValueError(f'{field} longer than {max_length} characters')
+
+    return {
+        'isbn': record['isbn'],
+        'title': str(record['title']),
+        'author': str(record['author']),
+        'publisher': str(record['publisher']),
+        'category': str(record['category']),
+        'published_date': date.fromisoformat(str(record['published_date'])),
+        'description': str(record.get('description') or ''),
+    }
+
+
+class NameCache:
+    """Name -> id for a small lookup table, creating unseen names in bulk."""
+
+    def __init__(self, model):
+        self.model = model
+        self.ids = dict(model.objects.values_list('name', 'id'))
+        self.created = 0
+
+    def resolve(self, names):
+        missing = set(names) - self.ids.keys()
+        if missing:
+            self.model.objects.bulk_create([self.model(name=name) for name in missing], ignore_conflicts=True)
+            found = dict(self.model.objects.filter(name__in=missing).values_list('name', 'id'))
+            self.ids.update(found)
+            self.created += len(found)
+        return self.ids
+
+
+class Command(BaseCommand):
+    help = 'Import books from a CSV or JSON-lines feed, resuming an interrupted import of the same file.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='Default: taken from the file extension.')
+        parser.add_argument('--batch-size', type=positive_int, default=1000)
+        parser.add_argument('--restart', action='store_true', help='Ignore the progress of an earlier run.')
+        parser.add_argument('--no-sync', action='store_true', help='Do not queue the books for the frontend.')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.isfile(path):
+            raise CommandError(f'{path} does not exist')
+        file_format = options['format'] or ('csv' if path.lower().endswith('.csv') else 'jsonl')
+        self.batch_size = options['batch_size']
+        self.sync = not options['no_sync']
+        self.publishers = NameCache(Publisher)
+        self.categories = NameCache(Category)
+
+        file_fingerprint = fingerprint(path)
+        unfinished = CatalogImport.objects.filter(fingerprint=file_fingerprint, finished_at__isnull=True)
+        if options['restart']:
+            unfinished.delete()
+        progress = unfinished.order_by('-id').first()
+        if progress is not None:
+            self.stdout.write(f'Resuming {path} after {progress.records_done:,} records')
+        else:
+            progress = CatalogImport.objects.create(source=path, fingerprint=file_fingerprint)
+
+        resumed_at = done = progress.records_done
+        imported = skipped = 0
+        batch = []
+        started = time.monotonic()
+
+        for record in islice(read_records(path, file_format), resumed_at, None):
+            done += 1
+            try:
+                batch.append(clean_record(record))
+            except (ValueError, TypeError) as e:
+                skipped += 1
+                if skipped <= MAX_REPORTED_ERRORS:
+                    self.stderr.write(f'Record {done}: {e}')
+            if (done - resumed_at) % self.batch_size == 0:
+                imported += self.write_batch(batch, progress, done)
+                batch = []
+                self.report_progress(done, imported, skipped, done - resumed_at, started)
+
+        imported += self.write_batch(batch, progress, done)
+        progress.finished_at = timezone.now()
+        progress.save(update_fields=['finished_at', 'updated_at'])
+
+        # One relay run sends the whole import to the frontend in SYNC_BATCH_SIZE batches
+        if self.sync and imported:
+            kick_relay()
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            f'Imported {imported:,} books from {done - resumed_at:,} records in {elapsed:.1f}s '
+            f'({(done - resumed_at) / elapsed if elapsed else 0:,.0f} records/s); '
+            f'{skipped:,} skipped, {self.publishers.created:,} publishers and '
+            f'{self.categories.created:,} categories created'
+        )
+
+    def write_batch(self, rows, progress, records_done):
+        # The last record wins when a feed repeats an ISBN
+        rows = {row['isbn']: row for row in rows}
+        publishers = self.publishers.resolve(row['publisher'] for row in rows.values())
+        categories = self.categories.resolve(row['category'] for row in rows.values())
+
+        with transaction.atomic():
+            if rows:
+                Book.objects.bulk_create([
+                    Book(
+                        isbn=isbn,
+                        title=row['title'],
+                        author=row['author'],
+                        publisher_id=publishers[row['publisher']],
+                        category_id=categories[row['category']],
+                        published_date=row['published_date'],
+                        description=row['description'],
+                    )
+                    for isbn, row in rows.items()
+                ], update_conflicts=True, unique_fields=['isbn'], update_fields=UPDATE_FIELDS)
+            if rows and self.sync:
+                # Outbox rows commit with the books, so a crash never loses a sync
+                BookChange.objects.bulk_create([
+                    BookChange(operation=BookChange.UPSERT, book_id=book_id, isbn=isbn)
+                    for book_id, isbn in Book.objects.filter(isbn__in=rows).values_list('id', 'isbn')
+                ])
+            progress.records_done = records_done
+            progress.save(update_fields=['records_done', 'updated_at'])
+        return len(rows)
+
+    def report_progress(self, done, imported, skipped, processed, started):
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            f'{done:,} records, {imported:,} imported, {skipped:,} skipped '
+            f'({processed / elapsed if elapsed else 0:,.0f} records/s)'
+        )
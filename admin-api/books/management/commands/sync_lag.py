@@ -0,0 +1,69 @@
+import time
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+
+from admin_api.task_metrics import (
+    QUANTILES, quantiles, recent_samples, recent_sync_lags, require_shared_cache, summarize,
+)
+
+
+class Command(BaseCommand):
+    help = 'Print edit-to-frontend sync lag percentiles and the timings of recent Celery task runs.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--task', action='append', default=[],
+                            help='Only show tasks whose name contains this text (repeatable).')
+        parser.add_argument('--watch', type=float, default=0,
+                            help='Refresh every N seconds until interrupted.')
+
+    def handle(self, *args, **options):
+        try:
+            require_shared_cache()
+        except ImproperlyConfigured as e:
+            raise CommandError(e)
+        while True:
+            self.report(options['task'])
+            if not options['watch']:
+                return
+            try:
+                time.sleep(options['watch'])
+            except KeyboardInterrupt:
+                return
+            self.stdout.write('')
+
+    def report(self, filters):
+        labels = [f'p{int(quantile * 100)}' for quantile in QUANTILES]
+
+        lags = recent_sync_lags()
+        if lags:
+            lag = quantiles(lags)
+            self.stdout.write(f'Sync lag over the last {len(lags)} relayed changes: ' + ', '.join(
+                f'{label} {lag[quantile]:.3f}s' for label, quantile in zip(labels + ['max'], QUANTILES + ('max',))
+            ))
+        else:
+            self.stdout.write('No relayed changes recorded yet.')
+        self.stdout.write('')
+
+        summary = summarize(recent_samples())
+        tasks = [task for task in summary if not filters or any(text in task for text in filters)]
+        if not tasks:
+            self.stdout.write('No task runs recorded yet.')
+            return
+
+        header = ['task', 'runs', 'errors'] + [f'queue {label}' for label in labels] + ['run p50', 'http p50']
+        rows = []
+        for task in tasks:
+            stats = summary[task]
+            timings = stats['timings']
+            failed = sum(count for outcome, count in stats['outcomes'].items() if outcome != 'success')
+            rows.append([task, str(stats['runs']), str(failed)] + [
+                f'{timings["queue"][quantile]:.3f}s' for quantile in QUANTILES
+            ] + [
+                f'{timings["runtime"][0.5]:.3f}s',
+                f'{timings["http"][0.5]:.3f}s',
+            ])
+
+        widths = [max(len(row[column]) for row in [header] + rows) for column in range(len(header))]
+        for row in [header] + rows:
+            self.stdout.write('  '.join(cell.ljust(width) for cell, width in zip(row, widths)).rstrip())
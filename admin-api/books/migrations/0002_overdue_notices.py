@@ -0,0 +1,22 @@
+# Generated by Django 4.2.7 on 2026-10-18 04:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='borrowedbook',
+            name='overdue_notified_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='borrowedbook',
+            index=models.Index(condition=models.Q(('actual_return_date__isnull', True), ('overdue_notified_at__isnull', True)), fields=['return_date', 'id'], name='borrow_overdue_idx'),
+        ),
+    ]
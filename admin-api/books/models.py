@@ -37,6 +37,64 @@ class Book(models.Model):
     def __str__(self):
         return self.title
 
+class BookChange(models.Model):
+    """Outbox row written in the same transaction as the Book change it describes."""
+    UPSERT = 'upsert'
+    DELETE = 'delete'
+    OPERATION_CHOICES = [
+        (UPSERT, 'Upsert'),
+        (DELETE, 'Delete'),
+    ]
+
+    # Plain columns rather than a FK so the row outlives a deleted book
+    book_id = models.BigIntegerField()
+    isbn = models.CharField(max_length=13)
+    operation = models.CharField(max_length=6, choices=OPERATION_CHOICES)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['id']
+
+    def __str__(self):
+        return f"{self.operation} {self.isbn} #{self.id}"
+
+    @property
+    def sequence(self):
+        # Ids only grow, and the Book row is written (and locked) first, so they
+        # also order the changes made to any single book
+        return self.id
+
+    @classmethod
+    def record(cls, operation, book_id, isbn):
+        return cls.objects.create(operation=operation, book_id=book_id, isbn=isbn)
+
+class DeadLetter(models.Model):
+    """A book change the frontend kept rejecting; replayed through the outbox."""
+    book_id = models.BigIntegerField()
+    isbn = models.CharField(max_length=13)
+    operation = models.CharField(max_length=6, choices=BookChange.OPERATION_CHOICES)
+    error = models.TextField()
+    attempts = models.PositiveIntegerField(default=1)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['id']
+
+    def __str__(self):
+        return f"{self.operation} {self.isbn}: {self.error[:50]}"
+
+class CatalogImport(models.Model):
+    """Progress of a bulk catalog import, committed with every batch so a crashed run can resume."""
+    source = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64, db_index=True)
+    records_done = models.PositiveBigIntegerField(default=0)
+    started_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.source} ({self.records_done} records)"
+
 class LibraryUser(models.Model):
     email = models.EmailField(unique=True)
     first_name = models.CharField(max_length=30)
@@ -52,9 +110,21 @@ class BorrowedBook(models.Model):
     borrowed_date = models.DateTimeField()
     return_date = models.DateTimeField()
     actual_return_date = models.DateTimeField(null=True, blank=True)
+    # Set once the overdue notice for this loan has been sent
+    overdue_notified_at = models.DateTimeField(null=True, blank=True)
     
     class Meta:
         ordering = ['-borrowed_date']
+        indexes = [
+            # Overdue sweep: open, not yet notified loans by due date
+            models.Index(fields=['return_date', 'id'],
+                         condition=models.Q(actual_return_date__isnull=True, overdue_notified_at__isnull=True),
+                         name='borrow_overdue_idx'),
+            # Open loans newest first: the borrowed-books and unavailable-books
+            # reports (and their keyset pagination order)
+            models.Index(fields=['-borrowed_date', '-id'], condition=models.Q(actual_return_date__isnull=True),
+                         name='borrow_open_recent_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.email} - {self.book.title}"
\ No newline at end of file
@@ -0,0 +1,18 @@
+from rest_framework.pagination import PageNumberPagination
+
+from library_common.pagination import KeysetPagination, wants_cursor
+
+
+class OptionalCursorPagination(PageNumberPagination):
+    """Page numbers by default; keyset pages when the client sends ?pagination=cursor."""
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = KeysetPagination() if wants_cursor(request) else None
+        if self.keyset is not None:
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
@@ -0,0 +1,28 @@
+from functools import reduce
+from operator import or_
+
+from library_common.reconcile import DIGEST_FIELDS, prefix_range, row_digest
+
+from .models import Book
+
+
+def catalog_rows(prefixes):
+    queryset = Book.objects.order_by().values_list(*DIGEST_FIELDS)
+    if not prefixes:
+        return queryset.none()
+    return queryset.filter(reduce(or_, (prefix_range(prefix) for prefix in prefixes)))
+
+
+def summarize_ranges(parents, length):
+    """Return {prefix: [count, hash]} for every non-empty child range of ``parents``."""
+    summaries = {}
+    for row in catalog_rows(parents).iterator(chunk_size=2000):
+        prefix = row[0][:length]
+        count, digest = summaries.get(prefix, (0, 0))
+        summaries[prefix] = (count + 1, digest ^ row_digest(row))
+    return {prefix: [count, f'{digest:016x}'] for prefix, (count, digest) in summaries.items()}
+
+
+def range_digests(prefixes):
+    """Return {isbn: hash} for every book inside ``prefixes``."""
+    return {row[0]: f'{row_digest(row):016x}' for row in catalog_rows(prefixes).iterator(chunk_size=2000)}
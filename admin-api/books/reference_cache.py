@@ -0,0 +1,6 @@
+"""Cached Publisher and Category lookups (see library_common.reference_cache)."""
+from library_common.reference_cache import LookupCache, apply_invalidation, clear_all, register  # noqa: F401
+from .models import Category, Publisher
+
+publishers = register(Publisher)
+categories = register(Category)
@@ -0,0 +1,36 @@
+from rest_framework import serializers
+from .models import Book, Publisher, Category, LibraryUser, BorrowedBook
+
+class PublisherSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Publisher
+        fields = ['id', 'name']
+
+class CategorySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Category
+        fields = ['id', 'name']
+
+class BookSerializer(serializers.ModelSerializer):
+    publisher_name = serializers.CharField(source='publisher.name', read_only=True)
+    category_name = serializers.CharField(source='category.name', read_only=True)
+    
+    class Meta:
+        model = Book
+        fields = ['id', 'title', 'author', 'isbn', 'publisher', 'publisher_name', 
+                  'category', 'category_name', 'published_date', 'description', 
+                  'is_available']
+
+class LibraryUserSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = LibraryUser
+        fields = ['id', 'email', 'first_name', 'last_name', 'enrollment_date']
+
+class BorrowedBookSerializer(serializers.ModelSerializer):
+    user_email = serializers.EmailField(source='user.email', read_only=True)
+    book_details = BookSerializer(source='book', read_only=True)
+    
+    class Meta:
+        model = BorrowedBook
+        fields = ['id', 'user', 'user_email', 'book', 'book_details', 'borrowed_date', 
+                  'return_date', 'actual_return_date']
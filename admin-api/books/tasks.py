@@ -1,56 +1,368 @@
-from celery import shared_task
+import logging
+import random
+import time
+
 import requests
+from celery import shared_task
 from django.conf import settings
-from .models import Book, Publisher, Category
+from django.core.cache import cache
+from django.core.mail import send_mass_mail
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from admin_api import inter_service, task_metrics
+from .models import Book, BookChange, BorrowedBook, DeadLetter
+from .reconcile import summarize_ranges, range_digests
+from .reference_cache import categories, publishers
+
+logger = logging.getLogger(__name__)
+
+RELAY_LOCK_KEY = 'books:outbox-relay-lock'
+RELAY_KICK_KEY = 'books:outbox-relay-kick'
+RELAY_FAILURES_KEY = 'books:outbox-relay-failures'
+RELAY_RETRY_AT_KEY = 'books:outbox-relay-retry-at'
+OVERDUE_LOCK_KEY = 'books:overdue-sweep-lock'
+OVERDUE_CHECKPOINT_KEY = 'books:overdue-sweep-checkpoint'
+
+
+def book_sync_payload(book, publisher_name, category_name):
+    return {
+        'title': book.title,
+        'author': book.author,
+        'isbn': book.isbn,
+        'publisher_name': publisher_name,
+        'category_name': category_name,
+        'published_date': str(book.published_date),
+        'description': book.description,
+        'is_available': book.is_available
+    }
+
+
+def book_sync_payloads(books):
+    # Names come from the per-process lookup caches rather than a join per query
+    publisher_names = publishers.names_for({book.publisher_id for book in books})
+    category_names = categories.names_for({book.category_id for book in books})
+    return [
+        book_sync_payload(book, publisher_names[book.publisher_id], category_names[book.category_id])
+        for book in books
+    ]
+
+
+def backoff_delay(attempt):
+    # Exponential backoff with full jitter, so failed work does not retry in lockstep
+    ceiling = min(settings.SYNC_RETRY_MAX_DELAY, settings.SYNC_RETRY_BASE_DELAY * 2 ** attempt)
+    return random.uniform(0, ceiling)
+
+
+def is_transient(exc):
+    # A rejection (4xx other than 429) fails the same way however often it is retried
+    response = getattr(exc, 'response', None)
+    if isinstance(exc, requests.HTTPError) and response is not None:
+        return response.status_code == 429 or response.status_code >= 500
+    return True
+
+
+def describe_error(exc):
+    response = getattr(exc, 'response', None)
+    detail = f': {response.text[:1000]}' if response is not None else ''
+    return f'{exc!r}{detail}'
+
+
+def dead_letter(changes, exc, attempts):
+    DeadLetter.objects.bulk_create([
+        DeadLetter(operation=operation, book_id=book_id, isbn=isbn, error=describe_error(exc), attempts=attempts)
+        for operation, book_id, isbn in changes
+    ])
+
+
+def kick_relay():
+    # One pending relay message covers every edit made before it runs; the
+    # periodic relay run picks changes up if the broker is unreachable
+    if not cache.add(RELAY_KICK_KEY, 1, settings.OUTBOX_RELAY_LOCK_TIMEOUT):
+        return
+    try:
+        relay_book_changes.delay()
+    except Exception:
+        cache.delete(RELAY_KICK_KEY)
+        logger.exception('Error queueing outbox relay')
+
 
 @shared_task
-def sync_book_to_frontend(book_id):
-    try:
-        book = Book.objects.get(id=book_id)
-        
-        # Prepare data for frontend API
-        data = {
-            'title': book.title,
-            'author': book.author,
-            'isbn': book.isbn,
-            'publisher_name': book.publisher.name,
-            'category_name': book.category.name,
-            'published_date': str(book.published_date),
-            'description': book.description,
-            'is_available': book.is_available
-        }
-        
-        # Send to frontend API
-        headers = {
-            'Authorization': f'Token {settings.INTER_SERVICE_TOKEN}',
-            'Content-Type': 'application/json'
-        }
-        
-        response = requests.post(
-            f"{settings.FRONTEND_API_URL}/api/internal/sync-book/",
-            json=data,
-            headers=headers
-        )
-        
-        return response.status_code == 201
+def relay_book_changes():
+    # While backing off after a failure only the scheduled retry may run
+    retry_at = cache.get(RELAY_RETRY_AT_KEY)
+    if retry_at is not None and time.time() < retry_at:
+        return 0
+
+    # Only one relay drains the outbox at a time so changes leave in order.
+    # The kick that queued this run is spent: clear it so the next edit queues
+    # a relay again instead of waiting for the beat
+    if not cache.add(RELAY_LOCK_KEY, 1, settings.OUTBOX_RELAY_LOCK_TIMEOUT):
+        cache.delete(RELAY_KICK_KEY)
+        return 0
+    cache.delete(RELAY_KICK_KEY)
+
+    relayed = 0
+    try:
+        while True:
+            changes = list(BookChange.objects.all()[:settings.SYNC_BATCH_SIZE])
+            if not changes:
+                break
+            relayed += _relay_batch(changes)
+        cache.delete_many([RELAY_FAILURES_KEY, RELAY_RETRY_AT_KEY])
+    except Exception:
+        logger.exception('Error relaying book changes')
+        task_metrics.record_error()
+        _schedule_relay_retry()
+    finally:
+        cache.delete(RELAY_LOCK_KEY)
+
+    return relayed
+
+
+def _relay_batch(changes):
+    # Every pending change to an ISBN in this batch, including later ones,
+    # collapses into the newest: an edit storm costs one request per book
+    pending = list(BookChange.objects.filter(isbn__in={change.isbn for change in changes}))
+    latest = {}
+    for change in pending:
+        latest[change.isbn] = change
+    latest = sorted(latest.values(), key=lambda change: change.id)
+
+    rejected = set()
+    try:
+        _send_changes(latest)
     except Exception as e:
-        print(f"Error syncing book: {e}")
-        return False
+        if is_transient(e) and (cache.get(RELAY_FAILURES_KEY) or 0) < settings.SYNC_MAX_RETRIES:
+            raise
+        rejected = _send_individually(latest)
+
+    BookChange.objects.filter(id__in=[change.id for change in pending]).delete()
+    try:
+        # Edit-to-frontend lag, whatever the change waited on: a pending kick,
+        # the beat, a held lock or the relay's own retries
+        task_metrics.record_sync_lag([change.created_at for change in pending if change.isbn not in rejected])
+    except Exception:
+        logger.exception('Error recording sync lag')
+    return len(pending)
+
+
+def _send_individually(changes):
+    # The batch was rejected, or kept failing: send the changes one by one so
+    # only those the frontend cannot take end up in the dead-letter queue.
+    # Returns the ISBNs dead-lettered
+    failures = cache.get(RELAY_FAILURES_KEY) or 0
+    rejected, sent = [], False
+    for change in changes:
+        try:
+            _send_changes([change])
+            sent = True
+        except Exception as e:
+            rejected.append((change, e))
+
+    # Transient errors only count against a change once its retries are used
+    # up and other changes got through, i.e. the frontend itself is up
+    transient = [e for _, e in rejected if is_transient(e)]
+    if transient and not (sent and failures >= settings.SYNC_MAX_RETRIES):
+        raise transient[0]
+    for change, e in rejected:
+        dead_letter([(change.operation, change.book_id, change.isbn)], e, failures + 1)
+    return {change.isbn for change, _ in rejected}
+
+
+def _schedule_relay_retry():
+    failures = cache.get(RELAY_FAILURES_KEY) or 0
+    delay = backoff_delay(failures)
+    cache.set(RELAY_FAILURES_KEY, failures + 1, None)
+    cache.set(RELAY_RETRY_AT_KEY, time.time() + delay, None)
+    try:
+        relay_book_changes.apply_async(countdown=delay)
+    except Exception:
+        logger.exception('Error scheduling outbox relay retry')
+
+
+def _send_changes(changes):
+    book_ids = [change.book_id for change in changes if change.operation == BookChange.UPSERT]
+    books = Book.objects.filter(id__in=book_ids).in_bulk()
+    payloads = dict(zip(books, book_sync_payloads(list(books.values()))))
+
+    payload = []
+    for change in changes:
+        book = books.get(change.book_id)
+        if change.operation == BookChange.UPSERT and book is not None:
+            payload.append({
+                'operation': BookChange.UPSERT,
+                'sequence': change.sequence,
+                'isbn': change.isbn,
+                'book': payloads[book.id]
+            })
+        elif change.operation == BookChange.DELETE:
+            payload.append({
+                'operation': BookChange.DELETE,
+                'sequence': change.sequence,
+                'isbn': change.isbn
+            })
+
+    if payload:
+        response = inter_service.post('/api/internal/book-changes/', json={'changes': payload})
+        response.raise_for_status()
+
+
+def _post_internal(path, data):
+    response = inter_service.post(path, json=data)
+    response.raise_for_status()
+    return response.json()
+
 
 @shared_task
-def sync_book_deletion_to_frontend(isbn):
-    try:
-        headers = {
-            'Authorization': f'Token {settings.INTER_SERVICE_TOKEN}',
-            'Content-Type': 'application/json'
-        }
-        
-        response = requests.delete(
-            f"{settings.FRONTEND_API_URL}/api/internal/sync-book/{isbn}/",
-            headers=headers
+def reconcile_catalog():
+    # Walk the ISBN prefix tree from the root, only descending into ranges
+    # whose (count, hash) differ between the two catalogs
+    try:
+        parents, leaves = [''], []
+        for length in [0] + settings.RECONCILE_PREFIX_LENGTHS:
+            if not parents:
+                break
+            local = summarize_ranges(parents, length)
+            remote = _post_internal('/api/internal/catalog-ranges/', {'parents': parents, 'length': length})['ranges']
+
+            parents = []
+            for prefix in sorted(set(local) | set(remote)):
+                local_summary = local.get(prefix, [0, None])
+                remote_summary = remote.get(prefix, [0, None])
+                if local_summary == remote_summary:
+                    continue
+                if max(local_summary[0], remote_summary[0]) <= settings.RECONCILE_LEAF_SIZE:
+                    leaves.append(prefix)
+                else:
+                    parents.append(prefix)
+
+        return _resync_ranges(leaves + parents)
+    except Exception:
+        logger.exception('Error reconciling catalog')
+        task_metrics.record_error()
+        return None
+
+
+def _resync_ranges(prefixes):
+    if not prefixes:
+        return 0
+
+    local = range_digests(prefixes)
+    remote = _post_internal('/api/internal/catalog-digests/', {'prefixes': prefixes})['digests']
+    stale = [isbn for isbn, digest in local.items() if remote.get(isbn) != digest]
+    orphaned = [isbn for isbn in remote if isbn not in local]
+
+    # Drifted books go through the outbox like any other change
+    with transaction.atomic():
+        changes = [
+            BookChange(operation=BookChange.UPSERT, book_id=book_id, isbn=isbn)
+            for book_id, isbn in Book.objects.filter(isbn__in=stale).values_list('id', 'isbn')
+        ]
+        changes += [BookChange(operation=BookChange.DELETE, book_id=0, isbn=isbn) for isbn in orphaned]
+        BookChange.objects.bulk_create(changes)
+    if changes:
+        transaction.on_commit(kick_relay)
+
+    return len(changes)
+
+
+@shared_task
+def purge_book_tombstones():
+    # The frontend keeps deleted books' tombstones for TOMBSTONE_RETENTION;
+    # it runs no scheduler, so the admin beat asks it to drop expired ones
+    try:
+        return _post_internal('/api/internal/purge-tombstones/', {})['purged']
+    except Exception:
+        logger.exception('Error purging book tombstones')
+        task_metrics.record_error()
+        return None
+
+
+@shared_task
+def sweep_overdue_loans():
+    """
+    Walk open, unnotified loans past their due date in (return_date, id) order,
+    one bounded chunk per query, and queue one notice task per chunk. The last
+    position is checkpointed so an interrupted sweep resumes where it stopped.
+    """
+    if not cache.add(OVERDUE_LOCK_KEY, 1, settings.OVERDUE_SWEEP_LOCK_TIMEOUT):
+        return 0
+
+    queued = 0
+    try:
+        checkpoint = cache.get(OVERDUE_CHECKPOINT_KEY)
+        if checkpoint is None:
+            checkpoint = {'cutoff': timezone.now().isoformat(), 'position': None}
+        cutoff = parse_datetime(checkpoint['cutoff'])
+
+        # Served by the borrow_overdue_idx partial index
+        overdue = BorrowedBook.objects.filter(
+            actual_return_date__isnull=True,
+            overdue_notified_at__isnull=True,
+            return_date__lt=cutoff
+        ).order_by('return_date', 'id')
+
+        while True:
+            chunk = overdue
+            if checkpoint['position'] is not None:
+                return_date, loan_id = checkpoint['position']
+                return_date = parse_datetime(return_date)
+                chunk = chunk.filter(
+                    Q(return_date__gt=return_date) | Q(return_date=return_date, id__gt=loan_id)
+                )
+            rows = list(chunk.values_list('id', 'return_date')[:settings.OVERDUE_SWEEP_CHUNK_SIZE])
+            if not rows:
+                break
+
+            send_overdue_notices.delay([loan_id for loan_id, _ in rows])
+            queued += len(rows)
+            checkpoint['position'] = [rows[-1][1].isoformat(), rows[-1][0]]
+            cache.set(OVERDUE_CHECKPOINT_KEY, checkpoint, None)
+
+        cache.delete(OVERDUE_CHECKPOINT_KEY)
+    except Exception:
+        logger.exception('Error sweeping overdue loans')
+        task_metrics.record_error()
+    finally:
+        cache.delete(OVERDUE_LOCK_KEY)
+
+    return queued
+
+
+def overdue_message(loan):
+    return (
+        f'Overdue: {loan.book.title}',
+        f'Dear {loan.user.first_name},\n\n'
+        f'"{loan.book.title}" was due back on {loan.return_date:%Y-%m-%d}. '
+        f'Please return it as soon as possible.\n',
+        settings.DEFAULT_FROM_EMAIL,
+        [loan.user.email],
+    )
+
+
+@shared_task
+def send_overdue_notices(loan_ids):
+    # Loans are claimed (marked) in a short transaction and mailed after it
+    # commits, so no row lock is held while talking to the mail server. A
+    # repeat never resends; a failed send unmarks them for the next sweep
+    claimed_at = timezone.now()
+    with transaction.atomic():
+        loans = list(
+            BorrowedBook.objects.select_for_update(of=('self',), skip_locked=True)
+            .filter(id__in=loan_ids, actual_return_date__isnull=True, overdue_notified_at__isnull=True)
+            .select_related('user', 'book')
         )
-        
-        return response.status_code == 204
-    except Exception as e:
-        print(f"Error syncing book deletion: {e}")
-        return False
\ No newline at end of file
+        if not loans:
+            return 0
+        BorrowedBook.objects.filter(id__in=[loan.id for loan in loans]).update(overdue_notified_at=claimed_at)
+
+    try:
+        send_mass_mail([overdue_message(loan) for loan in loans])
+    except Exception:
+        BorrowedBook.objects.filter(
+            id__in=[loan.id for loan in loans], overdue_notified_at=claimed_at
+        ).update(overdue_notified_at=None)
+        raise
+    return len(loans)
@@ -1,3 +1,842 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import os
+import tempfile
+import time
+from datetime import date, timedelta
+from unittest.mock import patch, MagicMock
+import requests
+from django.contrib.auth.models import User
+from django.db import connection
+from django.core import mail
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
+from rest_framework.test import APIClient
+from admin_api import inter_service, task_metrics
+from library_common import inter_service_keys, metrics
+from library_common.query_budget import QueryBudgetMixin
+from library_common.reconcile import row_digest
+from benchmarks import sync
+from benchmarks.data import generate_catalog, generate_loans
+from benchmarks.inter_service_client import start_stub_server
+from benchmarks.sync import CountingHandler
+from django.utils import timezone
+from .management.commands import import_books
+from .models import (
+    Book, BookChange, CatalogImport, DeadLetter, Publisher, Category, LibraryUser, BorrowedBook
+)
+from .reconcile import catalog_rows
+from .reference_cache import clear_all
+from .tasks import (
+    relay_book_changes, reconcile_catalog, sweep_overdue_loans, send_overdue_notices, kick_relay,
+    purge_book_tombstones, OVERDUE_CHECKPOINT_KEY, RELAY_LOCK_KEY, RELAY_RETRY_AT_KEY,
+)
 
-# Create your tests here.
+
+def create_books(count, publisher, category):
+    return Book.objects.bulk_create([
+        Book(
+            title=f'Book {i}',
+            author='Test Author',
+            isbn=str(1000000000000 + i),
+            publisher=publisher,
+            category=category,
+            published_date=date(2020, 1, 1)
+        )
+        for i in range(count)
+    ])
+
+
+@override_settings(SYNC_BATCH_SIZE=10, FRONTEND_API_URL='http://frontend')
+class BookSyncTaskTestCase(TestCase):
+    def setUp(self):
+        clear_all()
+        self.publisher = Publisher.objects.create(name='Wiley')
+        self.category = Category.objects.create(name='Technology')
+        self.books = create_books(25, self.publisher, self.category)
+
+    def record_changes(self, books):
+        for book in books:
+            BookChange.record(BookChange.UPSERT, book.id, book.isbn)
+
+    @patch('books.tasks.inter_service.post')
+    def test_relay_posts_one_request_per_batch(self, mock_post):
+        self.record_changes(self.books)
+        self.assertEqual(relay_book_changes(), 25)
+
+        self.assertEqual(mock_post.call_count, 3)
+        self.assertEqual(mock_post.call_args.args[0], '/api/internal/book-changes/')
+        first_batch = mock_post.call_args_list[0].kwargs['json']['changes']
+        self.assertEqual(first_batch[0]['book']['publisher_name'], 'Wiley')
+        self.assertEqual(first_batch[0]['book']['category_name'], 'Technology')
+
+    @override_settings(SYNC_BATCH_SIZE=500)
+    @patch('books.tasks.inter_service.post')
+    def test_relay_query_count_is_independent_of_batch_size(self, mock_post):
+        counts = []
+        with self.captureOnCommitCallbacks(execute=True):
+            # Publisher and category names are looked up once per process
+            self.record_changes(self.books[:1])
+            relay_book_changes()
+        for books in (self.books[:10], self.books):
+            self.record_changes(books)
+            with CaptureQueriesContext(connection) as queries:
+                relay_book_changes()
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+    @patch('books.tasks.inter_service.post')
+    def test_sync_payload_follows_renamed_publishers(self, mock_post):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.record_changes(self.books[:1])
+            relay_book_changes()
+            self.publisher.name = 'Wiley-Blackwell'
+            self.publisher.save()
+        self.record_changes(self.books[:1])
+        relay_book_changes()
+        self.assertEqual(mock_post.call_args.kwargs['json']['changes'][0]['book']['publisher_name'], 'Wiley-Blackwell')
+
+
+@override_settings(
+    FRONTEND_API_URL='http://frontend',
+    INTER_SERVICE_TOKEN='test-token',
+    INTER_SERVICE_POOL_SIZE=4,
+    INTER_SERVICE_CONNECT_TIMEOUT=1.5,
+    INTER_SERVICE_READ_TIMEOUT=10
+)
+class InterServiceClientTestCase(TestCase):
+    def setUp(self):
+        inter_service.close_session()
+        self.addCleanup(inter_service.close_session)
+
+    def test_session_is_reused_with_bounded_pool(self):
+        session = inter_service.get_session()
+        self.assertIs(inter_service.get_session(), session)
+        adapter = session.get_adapter('http://frontend/')
+        self.assertEqual(adapter._pool_maxsize, 4)
+        self.assertTrue(adapter._pool_block)
+        self.assertEqual(session.headers['Authorization'], 'Token test-token')
+
+    def test_requests_carry_configured_timeouts(self):
+        with patch('requests.Session.request') as mock_request:
+            inter_service.post('/api/internal/book-changes/', json={'changes': []})
+        mock_request.assert_called_once_with(
+            'POST', 'http://frontend/api/internal/book-changes/',
+            json={'changes': []}, timeout=(1.5, 10)
+        )
+
+    @override_settings(INTER_SERVICE_SIGN_REQUESTS=True)
+    def test_signed_session_never_sends_the_key(self):
+        session = inter_service.get_session()
+        self.assertNotIn('Authorization', session.headers)
+
+        request = session.prepare_request(
+            requests.Request('POST', 'http://frontend/api/internal/book-changes/', json={'changes': []})
+        )
+        scheme, credentials = request.headers['Authorization'].split(' ')
+        self.assertEqual(scheme, 'Signature')
+        self.assertNotIn('test-token', credentials)
+        self.assertTrue(inter_service_keys.is_valid_signature(
+            credentials, 'POST', '/api/internal/book-changes/', request.body
+        ))
+        self.assertFalse(inter_service_keys.is_valid_signature(
+            credentials, 'POST', '/api/internal/book-changes/', b'{"changes": [{}]}'
+        ))
+
+    def test_session_is_rebuilt_after_fork(self):
+        session = inter_service.get_session()
+        inter_service.reset_session()
+        self.assertIsNot(inter_service.get_session(), session)
+
+
+def http_error(status_code):
+    response = requests.Response()
+    response.status_code = status_code
+    return requests.HTTPError(f'{status_code} Error', response=response)
+
+
+@override_settings(SYNC_BATCH_SIZE=10)
+class BookOutboxTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(user=User.objects.create_user('admin', is_staff=True))
+        self.publisher = Publisher.objects.create(name='Wiley')
+        self.category = Category.objects.create(name='Technology')
+
+    def book_data(self, isbn='9780132350884'):
+        return {
+            'title': 'Clean Code',
+            'author': 'Robert C. Martin',
+            'isbn': isbn,
+            'publisher': self.publisher.id,
+            'category': self.category.id,
+            'published_date': '2008-08-01'
+        }
+
+    @patch('books.views.kick_relay')
+    def test_create_and_delete_write_outbox_rows(self, mock_kick):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/admin/books/', self.book_data())
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete(f"/api/admin/books/{response.data['id']}/")
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+        changes = list(BookChange.objects.values_list('operation', 'isbn'))
+        self.assertEqual(changes, [(BookChange.UPSERT, '9780132350884'), (BookChange.DELETE, '9780132350884')])
+        self.assertEqual(mock_kick.call_count, 2)
+
+    @patch('books.views.kick_relay')
+    def test_outbox_row_rolls_back_with_book(self, mock_kick):
+        with patch('books.models.BookChange.record', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.client.post('/api/admin/books/', self.book_data())
+        self.assertFalse(Book.objects.exists())
+        self.assertFalse(BookChange.objects.exists())
+
+    @patch('books.tasks.inter_service.post')
+    def test_relay_sends_latest_change_per_isbn_and_drains_outbox(self, mock_post):
+        books = create_books(15, self.publisher, self.category)
+        for book in books:
+            BookChange.record(BookChange.UPSERT, book.id, book.isbn)
+        deletion = BookChange.record(BookChange.DELETE, books[0].id, books[0].isbn)
+
+        self.assertEqual(relay_book_changes(), 16)
+        self.assertEqual(mock_post.call_count, 2)
+        self.assertFalse(BookChange.objects.exists())
+
+        batches = [call.kwargs['json']['changes'] for call in mock_post.call_args_list]
+        sent = [change['isbn'] for batch in batches for change in batch]
+        self.assertEqual(sorted(sent), sorted(book.isbn for book in books))
+        # The later deletion of the first book replaces its upsert in the first batch
+        self.assertEqual(batches[0][-1], {
+            'operation': BookChange.DELETE, 'sequence': deletion.sequence, 'isbn': books[0].isbn
+        })
+        for batch in batches:
+            sequences = [change['sequence'] for change in batch]
+            self.assertEqual(sequences, sorted(sequences))
+        self.assertEqual(batches[0][0]['book']['publisher_name'], 'Wiley')
+
+    @patch('books.tasks.inter_service.post')
+    def test_relay_collapses_changes_per_isbn(self, mock_post):
+        book = create_books(1, self.publisher, self.category)[0]
+        recorded = [BookChange.record(BookChange.UPSERT, book.id, book.isbn) for _ in range(3)]
+
+        relay_book_changes()
+        changes = mock_post.call_args.kwargs['json']['changes']
+        self.assertEqual(len(changes), 1)
+        self.assertEqual(changes[0]['sequence'], recorded[-1].sequence)
+
+    @override_settings(SYNC_RETRY_BASE_DELAY=2)
+    @patch('books.tasks.relay_book_changes.apply_async')
+    @patch('books.tasks.inter_service.post', side_effect=ConnectionError)
+    def test_failed_relay_keeps_changes_and_backs_off(self, mock_post, mock_retry):
+        book = create_books(1, self.publisher, self.category)[0]
+        BookChange.record(BookChange.UPSERT, book.id, book.isbn)
+
+        with self.assertLogs('books.tasks', 'ERROR') as logs:
+            self.assertEqual(relay_book_changes(), 0)
+        self.assertIn('Error relaying book changes', logs.output[0])
+        self.assertEqual(BookChange.objects.count(), 1)
+        self.assertLessEqual(mock_retry.call_args.kwargs['countdown'], 2)
+
+        # Kicks and periodic runs wait for the scheduled retry
+        self.assertEqual(relay_book_changes(), 0)
+        self.assertEqual(mock_post.call_count, 1)
+
+    @patch('books.tasks.relay_book_changes.delay')
+    def test_kicks_collapse_into_one_pending_relay(self, mock_delay):
+        for _ in range(3):
+            kick_relay()
+        self.assertEqual(mock_delay.call_count, 1)
+
+    @patch('books.tasks.relay_book_changes.delay')
+    def test_relay_finding_the_lock_held_lets_the_next_edit_kick_again(self, mock_delay):
+        kick_relay()
+        cache.add(RELAY_LOCK_KEY, 1)
+        self.assertEqual(relay_book_changes(), 0)
+        kick_relay()
+        self.assertEqual(mock_delay.call_count, 2)
+
+    @patch('books.tasks.inter_service.post')
+    def test_tombstone_purge_is_delegated_to_the_frontend(self, mock_post):
+        mock_post.return_value.json.return_value = {'purged': 3}
+        self.assertEqual(purge_book_tombstones(), 3)
+        self.assertEqual(mock_post.call_args.args[0], '/api/internal/purge-tombstones/')
+
+    def reject_isbn(self, isbn, error):
+        def post(path, json):
+            if any(change['isbn'] == isbn for change in json['changes']):
+                raise error
+            return MagicMock()
+        return post
+
+    @patch('books.tasks.inter_service.post')
+    def test_rejected_change_is_dead_lettered_and_the_rest_relayed(self, mock_post):
+        books = create_books(3, self.publisher, self.category)
+        for book in books:
+            BookChange.record(BookChange.UPSERT, book.id, book.isbn)
+        mock_post.side_effect = self.reject_isbn(books[1].isbn, http_error(400))
+
+        self.assertEqual(relay_book_changes(), 3)
+        self.assertFalse(BookChange.objects.exists())
+        # One failed batch, then each change on its own
+        self.assertEqual(mock_post.call_count, 4)
+        letter = DeadLetter.objects.get()
+        self.assertEqual((letter.operation, letter.isbn), (BookChange.UPSERT, books[1].isbn))
+        self.assertIn('400', letter.error)
+
+    @override_settings(SYNC_MAX_RETRIES=2)
+    @patch('books.tasks.relay_book_changes.apply_async')
+    @patch('books.tasks.inter_service.post')
+    def test_change_failing_past_its_retries_is_dead_lettered(self, mock_post, mock_retry):
+        books = create_books(2, self.publisher, self.category)
+        for book in books:
+            BookChange.record(BookChange.UPSERT, book.id, book.isbn)
+        mock_post.side_effect = self.reject_isbn(books[0].isbn, http_error(500))
+
+        for _ in range(2):
+            self.assertEqual(relay_book_changes(), 0)
+            cache.delete(RELAY_RETRY_AT_KEY)
+        self.assertFalse(DeadLetter.objects.exists())
+
+        self.assertEqual(relay_book_changes(), 2)
+        self.assertEqual(DeadLetter.objects.get().isbn, books[0].isbn)
+        self.assertEqual(DeadLetter.objects.get().attempts, 3)
+
+    @patch('books.management.commands.dead_letters.kick_relay')
+    def test_dead_letters_command_lists_and_replays(self, mock_kick):
+        book = create_books(1, self.publisher, self.category)[0]
+        DeadLetter.objects.create(operation=BookChange.UPSERT, book_id=book.id, isbn=book.isbn, error='400')
+
+        out = io.StringIO()
+        call_command('dead_letters', stdout=out)
+        self.assertIn(book.isbn, out.getvalue())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('dead_letters', 'replay', stdout=io.StringIO())
+        self.assertFalse(DeadLetter.objects.exists())
+        self.assertEqual(list(BookChange.objects.values_list('operation', 'isbn')), [(BookChange.UPSERT, book.isbn)])
+        mock_kick.assert_called_once()
+
+    @patch('books.management.commands.dead_letters.kick_relay')
+    def test_replay_drops_deletes_of_books_that_exist_again(self, mock_kick):
+        book = create_books(1, self.publisher, self.category)[0]
+        DeadLetter.objects.create(operation=BookChange.DELETE, book_id=0, isbn=book.isbn, error='500')
+        DeadLetter.objects.create(operation=BookChange.DELETE, book_id=0, isbn='9780000000000', error='500')
+
+        out = io.StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('dead_letters', 'replay', stdout=out)
+        self.assertIn('Dropped 1 delete(s)', out.getvalue())
+        self.assertFalse(DeadLetter.objects.exists())
+        self.assertEqual(list(BookChange.objects.values_list('operation', 'isbn')),
+                         [(BookChange.DELETE, '9780000000000')])
+
+
+@patch('books.management.commands.import_books.kick_relay')
+class ImportBooksCommandTestCase(TestCase):
+    CSV_HEADER = 'isbn,title,author,publisher_name,category_name,published_date,description\n'
+
+    def setUp(self):
+        self.wiley = Publisher.objects.create(name='Wiley')
+
+    def write_feed(self, content, suffix='.csv'):
+        fd, path = tempfile.mkstemp(suffix=suffix)
+        with os.fdopen(fd, 'w') as f:
+            f.write(content)
+        self.addCleanup(os.remove, path)
+        return path
+
+    def run_import(self, path, *args):
+        out, err = io.StringIO(), io.StringIO()
+        call_command('import_books', path, *args, stdout=out, stderr=err)
+        return out.getvalue(), err.getvalue()
+
+    def test_batch_size_must_be_positive(self, mock_kick):
+        path = self.write_feed(self.CSV_HEADER)
+        for size in ('0', '-5', 'ten'):
+            with self.subTest(size=size), self.assertRaises(CommandError):
+                self.run_import(path, '--batch-size', size)
+        self.assertFalse(CatalogImport.objects.exists())
+
+    def test_csv_import_upserts_books_and_queues_one_sync(self, mock_kick):
+        Book.objects.create(
+            title='Old title', author='Someone', isbn='9780132350884', publisher=self.wiley,
+            category=Category.objects.create(name='Technology'), published_date=date(2000, 1, 1)
+        )
+        path = self.write_feed(self.CSV_HEADER + (
+            '978-0-13-235088-4,Clean Code,Robert C. Martin,Prentice Hall,Technology,2008-08-01,\n'
+            '9780201633610,Design Patterns,Erich Gamma,Addison-Wesley,Technology,1994-10-31,Classic\n'
+            '9780262033848,Introduction to Algorithms,Thomas H. Cormen,MIT Press,Computer Science,2009-07-31,\n'
+            '9781234567897,No Date,Someone,Wiley,Fiction,,\n'
+            '9780201633610,Design Patterns,Erich Gamma,Wiley,Technology,1994-10-31,Second edition\n'
+        ))
+        out, err = self.run_import(path, '--batch-size', '2')
+
+        self.assertEqual(Book.objects.count(), 3)
+        self.assertEqual(Book.objects.get(isbn='9780132350884').title, 'Clean Code')
+        updated = Book.objects.select_related('publisher').get(isbn='9780201633610')
+        self.assertEqual((updated.publisher.name, updated.description), ('Wiley', 'Second edition'))
+        self.assertEqual(Publisher.objects.count(), 4)
+        self.assertIn('Record 4: missing published_date', err)
+        self.assertIn('Imported 4 books from 5 records', out)
+
+        self.assertEqual(BookChange.objects.filter(isbn='9780201633610').count(), 2)
+        mock_kick.assert_called_once()
+        self.assertIsNotNone(CatalogImport.objects.get().finished_at)
+
+    def test_jsonl_import_skips_broken_lines(self, mock_kick):
+        path = self.write_feed(
+            '{"isbn": "9780132350884", "title": "Clean Code", "author": "Robert C. Martin", '
+            '"publisher": "Wiley", "category": "Technology", "published_date": "2008-08-01"}\n'
+            '{not json\n',
+            suffix='.jsonl'
+        )
+        out, err = self.run_import(path, '--no-sync')
+        self.assertTrue(Book.objects.filter(isbn='9780132350884').exists())
+        self.assertIn('Record 2:', err)
+        self.assertFalse(BookChange.objects.exists())
+        mock_kick.assert_not_called()
+
+    def test_crashed_import_resumes_after_last_committed_batch(self, mock_kick):
+        path = self.write_feed(self.CSV_HEADER + ''.join(
+            f'{9780000000000 + i},Book {i},Author,Wiley,Fiction,2020-01-01,\n' for i in range(7)
+        ))
+        write_batch = import_books.Command.write_batch
+        calls = []
+
+        def crash_on_second_batch(command, *args):
+            calls.append(args)
+            if len(calls) == 2:
+                raise RuntimeError('killed')
+            return write_batch(command, *args)
+
+        with patch.object(import_books.Command, 'write_batch', crash_on_second_batch):
+            with self.assertRaises(RuntimeError):
+                self.run_import(path, '--batch-size', '3')
+        self.assertEqual(CatalogImport.objects.get().records_done, 3)
+
+        with patch('books.management.commands.import_books.clean_record', wraps=import_books.clean_record) as clean:
+            out, _ = self.run_import(path, '--batch-size', '3')
+        self.assertIn('Resuming', out)
+        self.assertEqual(clean.call_count, 4)
+        self.assertEqual(Book.objects.count(), 7)
+
+
+class FakeFrontendCatalog:
+    """Answers the reconciliation endpoints from a fixed snapshot of rows."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.paths = []
+
+    def __call__(self, path, data):
+        self.paths.append(path)
+        if path == '/api/internal/catalog-ranges/':
+            ranges = {}
+            for row in self.rows:
+                if any(row[0].startswith(parent) for parent in data['parents']):
+                    prefix = row[0][:data['length']]
+                    count, digest = ranges.get(prefix, (0, 0))
+                    ranges[prefix] = (count + 1, digest ^ row_digest(row))
+            return {'ranges': {prefix: [count, f'{digest:016x}'] for prefix, (count, digest) in ranges.items()}}
+        return {'digests': {
+            row[0]: f'{row_digest(row):016x}'
+            for row in self.rows
+            if any(row[0].startswith(prefix) for prefix in data['prefixes'])
+        }}
+
+
+@override_settings(RECONCILE_LEAF_SIZE=4, RECONCILE_PREFIX_LENGTHS=[4, 6, 8, 10, 13])
+class CatalogReconciliationTestCase(TestCase):
+    def setUp(self):
+        publisher = Publisher.objects.create(name='Wiley')
+        category = Category.objects.create(name='Technology')
+        self.books = create_books(200, publisher, category)
+        self.frontend = FakeFrontendCatalog(list(catalog_rows([''])))
+
+    @patch('books.tasks.kick_relay')
+    def test_matching_catalogs_compare_only_the_root(self, mock_kick):
+        with patch('books.tasks._post_internal', self.frontend):
+            self.assertEqual(reconcile_catalog(), 0)
+        self.assertEqual(self.frontend.paths, ['/api/internal/catalog-ranges/'])
+        self.assertFalse(BookChange.objects.exists())
+
+    @patch('books.tasks.kick_relay')
+    def test_drifted_books_are_queued_for_resync(self, mock_kick):
+        Book.objects.filter(id=self.books[17].id).update(title='Edited')
+        self.books[42].delete()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            with patch('books.tasks._post_internal', self.frontend):
+                self.assertEqual(reconcile_catalog(), 2)
+
+        changes = set(BookChange.objects.values_list('operation', 'isbn'))
+        self.assertEqual(changes, {
+            (BookChange.UPSERT, self.books[17].isbn),
+            (BookChange.DELETE, self.books[42].isbn),
+        })
+        mock_kick.assert_called_once()
+
+
+class OpenLoansMixin:
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(user=User.objects.create_user('admin', is_staff=True))
+        publisher = Publisher.objects.create(name='Wiley')
+        category = Category.objects.create(name='Technology')
+        books = create_books(30, publisher, category)
+        now = timezone.now()
+        self.users = LibraryUser.objects.bulk_create([
+            LibraryUser(email=f'user{i}@example.com', first_name='Test', last_name='User', enrollment_date=now)
+            for i in range(30)
+        ])
+        BorrowedBook.objects.bulk_create([
+            BorrowedBook(user=user, book=book, borrowed_date=now, return_date=now)
+            for user, book in zip(self.users, books)
+        ])
+
+
+@override_settings(OVERDUE_SWEEP_CHUNK_SIZE=3)
+class OverdueSweepTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        publisher = Publisher.objects.create(name='Wiley')
+        category = Category.objects.create(name='Technology')
+        books = create_books(10, publisher, category)
+        now = timezone.now()
+        self.user = LibraryUser.objects.create(
+            email='reader@example.com', first_name='Test', last_name='User', enrollment_date=now
+        )
+        # Seven overdue loans, due in reverse id order; two not due yet and one returned
+        self.loans = BorrowedBook.objects.bulk_create([
+            BorrowedBook(user=self.user, book=book, borrowed_date=now, return_date=now - timedelta(days=10 - i))
+            for i, book in enumerate(books[:7])
+        ] + [
+            BorrowedBook(user=self.user, book=book, borrowed_date=now, return_date=now + timedelta(days=7))
+            for book in books[7:9]
+        ] + [
+            BorrowedBook(user=self.user, book=books[9], borrowed_date=now, return_date=now - timedelta(days=1),
+                         actual_return_date=now)
+        ])
+        self.overdue_ids = [loan.id for loan in self.loans[:7]]
+
+    @patch('books.tasks.send_overdue_notices.delay')
+    def test_sweep_queues_overdue_loans_in_due_date_chunks(self, mock_delay):
+        self.assertEqual(sweep_overdue_loans(), 7)
+        self.assertEqual([call.args[0] for call in mock_delay.call_args_list], [
+            self.overdue_ids[0:3], self.overdue_ids[3:6], self.overdue_ids[6:7]
+        ])
+        self.assertIsNone(cache.get(OVERDUE_CHECKPOINT_KEY))
+
+    @patch('books.tasks.send_overdue_notices.delay')
+    def test_interrupted_sweep_resumes_from_checkpoint(self, mock_delay):
+        mock_delay.side_effect = [None, Exception('broker down')]
+        with self.assertLogs('books.tasks', 'ERROR'):
+            self.assertEqual(sweep_overdue_loans(), 3)
+        self.assertIsNotNone(cache.get(OVERDUE_CHECKPOINT_KEY))
+
+        mock_delay.reset_mock(side_effect=True)
+        self.assertEqual(sweep_overdue_loans(), 4)
+        self.assertEqual([call.args[0] for call in mock_delay.call_args_list], [
+            self.overdue_ids[3:6], self.overdue_ids[6:7]
+        ])
+
+    def test_notices_are_sent_once(self):
+        self.assertEqual(send_overdue_notices(self.overdue_ids[:3] + [self.loans[9].id]), 3)
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(mail.outbox[0].to, ['reader@example.com'])
+
+        self.assertEqual(send_overdue_notices(self.overdue_ids[:3]), 0)
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(BorrowedBook.objects.filter(overdue_notified_at__isnull=False).count(), 3)
+
+    @patch('books.tasks.send_mass_mail')
+    def test_loans_are_claimed_before_mail_is_sent(self, mock_send):
+        # Marked and committed before the mail server is contacted
+        mock_send.side_effect = lambda messages: self.assertEqual(
+            BorrowedBook.objects.filter(overdue_notified_at__isnull=False).count(), len(messages)
+        )
+        self.assertEqual(send_overdue_notices(self.overdue_ids[:3]), 3)
+        mock_send.assert_called_once()
+
+    @patch('books.tasks.send_mass_mail', side_effect=Exception('smtp down'))
+    def test_failed_send_leaves_loans_for_next_sweep(self, mock_send):
+        with self.assertRaises(Exception):
+            send_overdue_notices(self.overdue_ids)
+        self.assertFalse(BorrowedBook.objects.filter(overdue_notified_at__isnull=False).exists())
+
+        mock_send.side_effect = None
+        self.assertEqual(send_overdue_notices(self.overdue_ids), 7)
+
+
+class CursorPaginationTestCase(OpenLoansMixin, TestCase):
+    def walk(self, url):
+        results = []
+        response = self.client.get(url, {'pagination': 'cursor'})
+        while True:
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            results.extend(response.data['results'])
+            if not response.data['next']:
+                return results
+            response = self.client.get(response.data['next'])
+
+    def test_library_users_cursor_mode(self):
+        results = self.walk('/api/admin/users/')
+        self.assertEqual([user['id'] for user in results], [user.id for user in self.users])
+
+    def test_borrowed_books_cursor_mode_breaks_ties_by_id(self):
+        results = self.walk('/api/admin/borrowed-books/')
+        self.assertEqual([item['id'] for item in results], list(
+            BorrowedBook.objects.order_by('-id').values_list('id', flat=True)
+        ))
+
+
+@override_settings(EXPORT_CHUNK_SIZE=7)
+class StreamingExportTestCase(OpenLoansMixin, TestCase):
+    def stream(self, url, export_format):
+        with self.assertNumQueries(1):
+            response = self.client.get(url, {'export': export_format})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertTrue(response.streaming)
+            body = b''.join(response.streaming_content).decode()
+        return response, body
+
+    def test_unavailable_books_ndjson_matches_json_report(self):
+        response, body = self.stream('/api/admin/unavailable-books/', 'ndjson')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in body.splitlines()]
+        report = json.loads(self.client.get('/api/admin/unavailable-books/').content)
+        self.assertEqual(len(rows), 30)
+        self.assertEqual(rows, report)
+
+    def test_borrowed_books_csv_flattens_nested_fields(self):
+        response, body = self.stream('/api/admin/borrowed-books/', 'csv')
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        rows = list(csv.DictReader(io.StringIO(body)))
+        self.assertEqual(len(rows), 30)
+        self.assertEqual([int(row['id']) for row in rows], list(
+            BorrowedBook.objects.order_by('-id').values_list('id', flat=True)
+        ))
+        self.assertEqual(rows[0]['book_details.publisher_name'], 'Wiley')
+        self.assertIn('user_email', rows[0])
+
+class IndexUsageTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        # Mostly returned loans, so only the partial index makes the open ones cheap
+        publisher = Publisher.objects.create(name='Wiley')
+        category = Category.objects.create(name='Technology')
+        books = create_books(3000, publisher, category)
+        now = timezone.now()
+        users = LibraryUser.objects.bulk_create([
+            LibraryUser(email=f'user{i}@example.com', first_name='Test', last_name='User', enrollment_date=now)
+            for i in range(100)
+        ])
+        BorrowedBook.objects.bulk_create([
+            BorrowedBook(
+                user=users[i % len(users)], book=book, borrowed_date=now - timedelta(minutes=i),
+                return_date=now, actual_return_date=None if i % 20 == 0 else now
+            )
+            for i, book in enumerate(books)
+        ])
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def test_open_loan_reports_use_partial_index(self):
+        plan = BorrowedBook.objects.filter(
+            actual_return_date__isnull=True
+        ).order_by('-borrowed_date', '-id')[:20].explain()
+        self.assertIn('borrow_open_recent_idx', plan, plan)
+
+
+class SharedCacheMixin:
+    """A cache on disk in place of the locmem one, which task metrics refuse."""
+
+    def setUp(self):
+        super().setUp()
+        directory = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(override_settings(CACHES={
+            'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': directory}
+        }))
+
+
+@override_settings(INTER_SERVICE_TOKEN='test-token')
+class RequestMetricsTestCase(SharedCacheMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        metrics.reset()
+        self.client = APIClient()
+        self.client.force_authenticate(user=User.objects.create_user('admin', is_staff=True))
+
+    def test_report_requests_are_measured(self):
+        self.client.get('/api/admin/unavailable-books/')
+        response = self.client.get('/api/internal/metrics/', HTTP_AUTHORIZATION='Token test-token')
+        body = response.content.decode()
+        self.assertIn('http_requests_total{method="GET",status="200",view="api/admin/unavailable-books/"} 1.0', body)
+        self.assertIn('db_queries_per_request_count{method="GET",view="api/admin/unavailable-books/"} 1.0', body)
+        self.assertEqual(self.client.get('/api/internal/metrics/').status_code, 401)
+
+
+@override_settings(INTER_SERVICE_TOKEN='test-token', FRONTEND_API_URL='http://frontend', SYNC_MAX_RETRIES=0)
+class TaskMetricsTestCase(SharedCacheMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        inter_service.close_session()
+        self.addCleanup(inter_service.close_session)
+
+    def run_relay(self, queued_for, isbn='1234567890123'):
+        BookChange.record(BookChange.DELETE, 0, isbn)
+        relay_book_changes.apply(headers={'due_at': time.time() - queued_for})
+
+    @patch('books.tasks.relay_book_changes.apply_async')
+    @patch('requests.Session.request')
+    def test_runs_are_sampled_with_latency_and_outcome(self, mock_request, mock_retry):
+        mock_request.return_value = MagicMock(status_code=204)
+        self.run_relay(queued_for=5)
+        mock_request.side_effect = requests.ConnectionError('frontend down')
+        with self.assertLogs('books.tasks', 'ERROR'):
+            self.run_relay(queued_for=1)
+
+        ok, failed = task_metrics.recent_samples()
+        self.assertEqual((ok['outcome'], failed['outcome']), ('success', 'error'))
+        self.assertGreaterEqual(ok['queue'], 5)
+        self.assertGreater(ok['http'], 0)
+
+        body = APIClient().get('/api/internal/metrics/', HTTP_AUTHORIZATION='Token test-token').content.decode()
+        task = 'books.tasks.relay_book_changes'
+        self.assertIn(f'celery_task_runs_total{{outcome="error",task="{task}"}} 1.0', body)
+        self.assertIn(f'celery_task_runs_total{{outcome="success",task="{task}"}} 1.0', body)
+        self.assertIn('# TYPE celery_task_runtime_seconds histogram', body)
+        self.assertIn(f'celery_task_runtime_seconds_count{{task="{task}"}} 2.0', body)
+        # Queued for about 1s and 5s
+        self.assertIn(f'celery_task_queue_seconds_bucket{{le="1.0",task="{task}"}} 0.0', body)
+        self.assertIn(f'celery_task_queue_seconds_bucket{{le="2.5",task="{task}"}} 1.0', body)
+        self.assertIn(f'celery_task_queue_seconds_bucket{{le="10.0",task="{task}"}} 2.0', body)
+        self.assertIn(f'celery_task_queue_seconds_bucket{{le="+Inf",task="{task}"}} 2.0', body)
+        self.assertIn(f'celery_task_queue_seconds_sum{{task="{task}"}} 6.', body)
+
+    def test_queue_time_starts_at_eta(self):
+        # A retry's countdown is backoff, not time spent waiting for a worker
+        due = timezone.now() + timedelta(seconds=30)
+        headers = {'eta': due.isoformat()}
+        task_metrics.stamp_due_time(headers=headers)
+        self.assertAlmostEqual(headers['due_at'], due.timestamp(), places=3)
+
+    @patch('requests.Session.request')
+    def test_sync_lag_counts_from_outbox_write(self, mock_request):
+        mock_request.return_value = MagicMock(status_code=204)
+        for isbn in ['9780000000001', '9780000000002']:
+            BookChange.record(BookChange.DELETE, 0, isbn)
+        # Written a while before the relay got to them, e.g. across a retry backoff
+        BookChange.objects.update(created_at=timezone.now() - timedelta(seconds=20))
+        relay_book_changes.apply()
+
+        lags = task_metrics.recent_sync_lags()
+        self.assertEqual(len(lags), 2)
+        self.assertTrue(all(lag >= 20 for lag in lags))
+        body = APIClient().get('/api/internal/metrics/', HTTP_AUTHORIZATION='Token test-token').content.decode()
+        self.assertIn('book_sync_lag_seconds_bucket{le="10.0"} 0.0', body)
+        self.assertIn('book_sync_lag_seconds_bucket{le="30.0"} 2.0', body)
+        self.assertIn('book_sync_lag_seconds_count 2.0', body)
+
+    @override_settings(TASK_METRICS_SAMPLES=3)
+    @patch('requests.Session.request')
+    def test_sample_ring_is_bounded(self, mock_request):
+        mock_request.return_value = MagicMock(status_code=204)
+        for index in range(5):
+            self.run_relay(queued_for=0, isbn=f'978000000000{index}')
+        self.assertEqual(len(task_metrics.recent_samples()), 3)
+        self.assertEqual(len(task_metrics.recent_sync_lags()), 3)
+
+    @patch('requests.Session.request')
+    def test_sync_lag_command_prints_percentiles(self, mock_request):
+        out = io.StringIO()
+        call_command('sync_lag', stdout=out)
+        self.assertIn('No relayed changes recorded yet.', out.getvalue())
+
+        mock_request.return_value = MagicMock(status_code=204)
+        self.run_relay(queued_for=2)
+        out = io.StringIO()
+        call_command('sync_lag', '--task', 'relay', stdout=out)
+        lag, _, header, row = out.getvalue().splitlines()
+        self.assertTrue(lag.startswith('Sync lag over the last 1 relayed changes: p50 '))
+        self.assertIn('queue p99', header)
+        self.assertTrue(row.startswith('books.tasks.relay_book_changes  1'))
+
+    def test_process_local_cache_is_refused(self):
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}):
+            with self.assertRaises(ImproperlyConfigured):
+                APIClient().get('/api/internal/metrics/', HTTP_AUTHORIZATION='Token test-token')
+            with self.assertRaises(CommandError):
+                call_command('sync_lag', stdout=io.StringIO())
+            with self.assertRaises(SystemExit):
+                task_metrics.check_cache()
+
+
+class QueryBudgetTestCase(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(user=User.objects.create_user('admin', is_staff=True))
+        self.count = 0
+
+    def add_loans(self, size):
+        # Every loan gets its own user, publisher and category so lazy lookups would show up
+        now = timezone.now()
+        for index in range(self.count, size):
+            book = Book.objects.create(
+                title=f'Book {index}',
+                author='Test Author',
+                isbn=str(1000000000000 + index),
+                publisher=Publisher.objects.create(name=f'Publisher {index}'),
+                category=Category.objects.create(name=f'Category {index}'),
+                published_date=date(2020, 1, 1),
+                is_available=False
+            )
+            user = LibraryUser.objects.create(
+                email=f'user{index}@example.com', first_name='Test', last_name='User', enrollment_date=now
+            )
+            BorrowedBook.objects.create(user=user, book=book, borrowed_date=now, return_date=now)
+        self.count = size
+
+    def test_library_users_budget(self):
+        self.assertQueryBudget(2, lambda: self.client.get('/api/admin/users/'), self.add_loans)
+
+    def test_borrowed_books_budget(self):
+        self.assertQueryBudget(2, lambda: self.client.get('/api/admin/borrowed-books/'), self.add_loans)
+
+    def test_unavailable_books_budget(self):
+        self.assertQueryBudget(1, lambda: self.client.get('/api/admin/unavailable-books/'), self.add_loans)
+
+
+@override_settings(SYNC_BATCH_SIZE=10)
+class SyncBenchmarkTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        clear_all()
+        self.server = start_stub_server(CountingHandler)
+        self.addCleanup(self.server.shutdown)
+        generate_catalog(25, seed=7)
+        self.book_ids = list(Book.objects.order_by('id').values_list('id', flat=True))
+
+    def test_generators_match_frontend_catalog(self):
+        self.assertEqual(Book.objects.order_by('id').first().isbn, '9780000000000')
+        self.assertEqual(generate_loans(5, 20, open_ratio=0.5, seed=7),
+                         Book.objects.filter(is_available=False).count())
+        self.assertEqual(BorrowedBook.objects.filter(actual_return_date__isnull=True).count(),
+                         Book.objects.filter(is_available=False).count())
+
+    def test_sync_benchmarks_send_every_book(self):
+        with self.settings(FRONTEND_API_URL=f'http://127.0.0.1:{self.server.server_port}'):
+            self.assertEqual(sync.bulk_sync_benchmark(self.book_ids)['synced'], 25)
+            relay = sync.relay_benchmark(self.book_ids[:10], edits=3)
+        self.assertEqual((relay['changes'], relay['left_over']), (30, 0))
+        self.assertEqual(sync.payload_benchmark(self.book_ids, 10)['count'], 3)
@@ -0,0 +1,10 @@
+from django.urls import path
+from . import views
+
+urlpatterns = [
+    path('books/', views.BookCreateView.as_view(), name='book-create'),
+    path('books/<int:pk>/', views.BookDeleteView.as_view(), name='book-delete'),
+    path('users/', views.LibraryUserListView.as_view(), name='library-user-list'),
+    path('borrowed-books/', views.UserBorrowedBooksView.as_view(), name='borrowed-book-list'),
+    path('unavailable-books/', views.unavailable_books, name='unavailable-books'),
+]
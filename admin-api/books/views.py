@@ -1,11 +1,13 @@
-from rest_framework import generics, status
+from rest_framework import generics
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.response import Response
-from django.utils import timezone
-from .models import Book, LibraryUser, BorrowedBook
+from django.db import transaction
+from .models import Book, BookChange, LibraryUser, BorrowedBook
 from .serializers import BookSerializer, LibraryUserSerializer, BorrowedBookSerializer
-from .tasks import sync_book_to_frontend, sync_book_deletion_to_frontend
+from .tasks import kick_relay
+from .pagination import OptionalCursorPagination
+from .exports import EXPORT_CONTENT_TYPES, export_response
 
 class BookCreateView(generics.CreateAPIView):
     permission_classes = [IsAuthenticated, IsAdminUser]
@@ -13,9 +15,12 @@ class BookCreateView(generics.CreateAPIView):
     serializer_class = BookSerializer
     
     def perform_create(self, serializer):
-        book = serializer.save()
+        with transaction.atomic():
+            book = serializer.save()
+            # Outbox row commits (or rolls back) together with the book
+            BookChange.record(BookChange.UPSERT, book.id, book.isbn)
         # Sync to frontend API
-        sync_book_to_frontend.delay(book.id)
+        transaction.on_commit(kick_relay)
 
 class BookDeleteView(generics.DestroyAPIView):
     permission_classes = [IsAuthenticated, IsAdminUser]
@@ -24,35 +29,64 @@ class BookDeleteView(generics.DestroyAPIView):
     def perform_destroy(self, instance):
         book_id = instance.id
         isbn = instance.isbn
-        super().perform_destroy(instance)
+        with transaction.atomic():
+            super().perform_destroy(instance)
+            BookChange.record(BookChange.DELETE, book_id, isbn)
         # Sync deletion to frontend API
-        sync_book_deletion_to_frontend.delay(isbn)
+        transaction.on_commit(kick_relay)
 
 class LibraryUserListView(generics.ListAPIView):
     permission_classes = [IsAuthenticated, IsAdminUser]
     queryset = LibraryUser.objects.all()
     serializer_class = LibraryUserSerializer
+    pagination_class = OptionalCursorPagination
+    keyset_ordering = ('id',)
 
 class UserBorrowedBooksView(generics.ListAPIView):
     permission_classes = [IsAuthenticated, IsAdminUser]
     serializer_class = BorrowedBookSerializer
+    pagination_class = OptionalCursorPagination
+    keyset_ordering = ('-borrowed_date', '-id')
     
     def get_queryset(self):
-        return BorrowedBook.objects.filter(actual_return_date__isnull=True)
+        return BorrowedBook.objects.filter(
+            actual_return_date__isnull=True
+        ).select_related('user', 'book__publisher', 'book__category')
+
+    def list(self, request, *args, **kwargs):
+        export_format = request.query_params.get('export')
+        if export_format in EXPORT_CONTENT_TYPES:
+            queryset = self.filter_queryset(self.get_queryset()).order_by(*self.keyset_ordering)
+            return export_response(
+                export_format, queryset,
+                lambda chunk: self.get_serializer(chunk, many=True).data,
+                'borrowed-books',
+            )
+        return super().list(request, *args, **kwargs)
+
+def unavailable_rows(borrowed_books):
+    books = BookSerializer([borrowed.book for borrowed in borrowed_books], many=True).data
+    return [
+        {
+            'book': book,
+            'available_date': borrowed.return_date,
+            'borrowed_by': borrowed.user.email
+        }
+        for borrowed, book in zip(borrowed_books, books)
+    ]
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated, IsAdminUser])
 def unavailable_books(request):
     borrowed_books = BorrowedBook.objects.filter(
         actual_return_date__isnull=True
-    ).select_related('book')
-    
-    unavailable_data = []
-    for borrowed in borrowed_books:
-        unavailable_data.append({
-            'book': BookSerializer(borrowed.book).data,
-            'available_date': borrowed.return_date,
-            'borrowed_by': borrowed.user.email
-        })
-    
-    return Response(unavailable_data)
\ No newline at end of file
+    ).select_related('user', 'book__publisher', 'book__category').order_by('-borrowed_date', '-id')
+
+    # ?export=ndjson|csv streams the report instead of building it in memory
+    export_format = request.query_params.get('export')
+    if export_format in EXPORT_CONTENT_TYPES:
+        return export_response(
+            export_format, borrowed_books, unavailable_rows, 'unavailable-books'
+        )
+
+    return Response(unavailable_rows(list(borrowed_books)))
\ No newline at end of file
@@ -0,0 +1,7 @@
+# Read by gunicorn from the working directory, before the application is loaded
+import os
+
+# Workers share their request metrics through this directory (library_common.metrics)
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', '/tmp/admin-api-metrics')
+
+from library_common.gunicorn_hooks import child_exit, on_starting  # noqa: E402,F401
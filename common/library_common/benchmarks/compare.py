@@ -0,0 +1,69 @@
+"""
+Compare two benchmark results files and fail on regressions.
+
+Usage, from either service's directory:
+    python -m benchmarks.micro --output baseline.json    # on main
+    python -m benchmarks.micro --output current.json     # on the branch
+    python -m library_common.benchmarks.compare baseline.json current.json --threshold 0.1
+
+Every ``*_ms`` value (lower is better) and ``*_per_second`` value (higher is
+better) present in both files is compared, except maxima, which a single
+stalled run decides; the exit status is 1 when any got worse by more than the
+threshold.
+"""
+import argparse
+import json
+import sys
+
+
+def metrics(results, prefix=''):
+    """Flatten nested results to ``{'a.b.p95_ms': value}`` for the comparable keys."""
+    found = {}
+    for key, value in results.items():
+        name = f'{prefix}{key}'
+        if isinstance(value, dict):
+            found.update(metrics(value, f'{name}.'))
+        elif isinstance(value, (int, float)) and key.endswith(('_ms', '_per_second')) and key != 'max_ms':
+            found[name] = value
+    return found
+
+
+def compare(baseline, current, threshold):
+    """One row per shared metric; ``change`` is positive when it got worse."""
+    before, after = metrics(baseline['results']), metrics(current['results'])
+    rows = []
+    for name in sorted(before.keys() & after.keys()):
+        old, new = before[name], after[name]
+        if not old:
+            continue
+        change = (new - old) / old
+        if name.endswith('_per_second'):
+            change = -change
+        rows.append({'metric': name, 'baseline': old, 'current': new, 'change': change,
+                     'regression': change > threshold})
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('baseline')
+    parser.add_argument('current')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='Allowed slowdown as a fraction (default: 0.1, i.e. 10%%).')
+    args = parser.parse_args(argv)
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+
+    rows = compare(baseline, current, args.threshold)
+    for row in rows:
+        flag = 'REGRESSION' if row['regression'] else ''
+        print(f"{row['metric']:<60} {row['baseline']:>12.2f} {row['current']:>12.2f} "
+              f"{row['change']:>+8.1%} {flag}")
+    return 1 if any(row['regression'] for row in rows) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
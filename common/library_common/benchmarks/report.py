@@ -0,0 +1,70 @@
+"""
+Machine-readable benchmark results.
+
+Every benchmark of either service writes one JSON document: the run's
+metadata (commit, database, parameters) next to its results, so two runs can
+be diffed with ``python -m library_common.benchmarks.compare``. Timings are milliseconds in keys ending
+``_ms``; throughputs end ``_per_second``.
+"""
+import json
+import platform
+import subprocess
+import sys
+from datetime import datetime, timezone
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def summarize(timings):
+    """Latency summary of a list of millisecond timings."""
+    return {
+        'count': len(timings),
+        'mean_ms': sum(timings) / len(timings),
+        'p50_ms': percentile(timings, 0.5),
+        'p95_ms': percentile(timings, 0.95),
+        'p99_ms': percentile(timings, 0.99),
+        'max_ms': max(timings),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def metadata(benchmark, params):
+    from django.conf import settings
+    from django.db import connection
+
+    return {
+        'benchmark': benchmark,
+        'started_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'database': connection.vendor if settings.configured else None,
+        'params': params,
+    }
+
+
+def run_params(args, exclude=()):
+    """The command line arguments worth recording: everything but ``--output`` and ``exclude``."""
+    return {key: value for key, value in vars(args).items() if key != 'output' and key not in exclude}
+
+
+def emit(benchmark, params, results, output=None):
+    """Write the results document to ``output`` (a path), or to stdout."""
+    document = {'meta': metadata(benchmark, params), 'results': results}
+    if output:
+        with open(output, 'w') as f:
+            json.dump(document, f, indent=2)
+            f.write('\n')
+    else:
+        json.dump(document, sys.stdout, indent=2)
+        sys.stdout.write('\n')
+    return document
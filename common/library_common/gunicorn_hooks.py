@@ -0,0 +1,20 @@
+"""
+gunicorn server hooks for prometheus_client's multiprocess mode (see
+``library_common.metrics``), imported by each service's gunicorn.conf.py.
+PROMETHEUS_MULTIPROC_DIR must already be set when this is imported.
+"""
+import os
+import shutil
+
+from prometheus_client import multiprocess
+
+
+def on_starting(server):
+    # Files left by a previous master would be summed into the new counters
+    path = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path)
+
+
+def child_exit(server, worker):
+    multiprocess.mark_process_dead(worker.pid)
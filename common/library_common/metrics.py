@@ -0,0 +1,221 @@
+"""
+Per-request performance metrics for the frontend and admin services,
+exported with prometheus_client.
+
+Under gunicorn every worker is its own process. With PROMETHEUS_MULTIPROC_DIR
+set (each service's gunicorn.conf.py does it) the workers write their samples
+to files in that directory and a scrape of any worker sums them all, so the
+series cover the whole service and survive worker restarts. Without it (tests,
+runserver) the metrics are those of the current process.
+"""
+import logging
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse
+from django.utils.module_loading import import_string
+from prometheus_client import CollectorRegistry, Counter, Histogram, generate_latest, multiprocess
+from prometheus_client.exposition import CONTENT_TYPE_PLAIN_0_0_4
+from rest_framework.renderers import JSONRenderer
+
+from library_common import inter_service_keys
+
+logger = logging.getLogger(__name__)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+VIEW_LABELS = ('method', 'view')
+
+registry = CollectorRegistry()
+requests_total = Counter('http_requests_total', 'Requests served.', ('method', 'status', 'view'),
+                         registry=registry)
+request_duration = Histogram('http_request_duration_seconds', 'Wall time per request.', VIEW_LABELS,
+                             buckets=DURATION_BUCKETS, registry=registry)
+response_size = Histogram('http_response_size_bytes', 'Response body size (streaming responses excluded).',
+                          VIEW_LABELS, buckets=SIZE_BUCKETS, registry=registry)
+query_count = Histogram('db_queries_per_request', 'Database queries per request.', VIEW_LABELS,
+                        buckets=COUNT_BUCKETS, registry=registry)
+query_duration = Histogram('db_query_duration_seconds', 'Time spent in database queries per request.',
+                           VIEW_LABELS, buckets=DURATION_BUCKETS, registry=registry)
+serializer_duration = Histogram('serializer_duration_seconds', 'Time spent serializing and rendering per request.',
+                                VIEW_LABELS, buckets=DURATION_BUCKETS, registry=registry)
+cache_requests = Counter('cache_requests_total', 'Cache lookups made by views, by result.',
+                         ('method', 'result', 'view'), registry=registry)
+METRICS = (requests_total, request_duration, response_size, query_count, query_duration, serializer_duration,
+           cache_requests)
+
+_current = ContextVar('request_metrics', default=None)
+
+
+def reset():
+    """Drop every recorded series of this process (tests)."""
+    for metric in METRICS:
+        metric.clear()
+
+
+def render():
+    """The exposition text: request metrics of the whole service, then METRICS_COLLECTORS'."""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        source = CollectorRegistry()
+        multiprocess.MultiProcessCollector(source)
+    else:
+        source = registry
+    # METRICS_COLLECTORS: dotted paths of prometheus_client custom collector classes
+    extra = CollectorRegistry()
+    for path in settings.METRICS_COLLECTORS:
+        extra.register(import_string(path)())
+    return generate_latest(source) + generate_latest(extra)
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.queries = []
+        self.query_count = 0
+        self.query_time = 0.0
+        self.serializer_time = 0.0
+        self.serializing = False
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def add_query(self, sql, duration):
+        self.query_count += 1
+        self.query_time += duration
+        if len(self.queries) < settings.SLOW_REQUEST_MAX_QUERIES:
+            self.queries.append((sql, duration))
+
+
+def record_cache(hit):
+    """Count a view-level cache lookup against the current request."""
+    stats = _current.get()
+    if stats is not None:
+        if hit:
+            stats.cache_hits += 1
+        else:
+            stats.cache_misses += 1
+
+
+@contextmanager
+def serializing():
+    """
+    Count the time spent in the block as serialization of the current
+    request. Blocks may nest (a view building its data, then the renderer);
+    only the outermost one is timed.
+    """
+    stats = _current.get()
+    if stats is None or stats.serializing:
+        yield
+        return
+    stats.serializing = True
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats.serializing = False
+        stats.serializer_time += time.perf_counter() - started
+
+
+class TimedJSONRenderer(JSONRenderer):
+    """JSONRenderer counting its time as serialization (see ``serializing``)."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with serializing():
+            return super().render(data, accepted_media_type, renderer_context)
+
+
+def record_query(execute, sql, params, many, context):
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats = _current.get()
+        if stats is not None:
+            stats.add_query(sql, time.perf_counter() - started)
+
+
+def instrument_connection(connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def instrument_connections():
+    # Installed once on every connection rather than per request: async views
+    # query from other threads, and record_query finds the request through
+    # the context variable, which follows them there
+    connection_created.connect(instrument_connection, dispatch_uid='metrics-record-query')
+    for connection in connections.all(initialized_only=True):
+        instrument_connection(connection)
+
+
+class RequestMetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+        instrument_connections()
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        stats = RequestMetrics()
+        token = _current.set(stats)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.record(request, response, stats, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        stats = RequestMetrics()
+        token = _current.set(stats)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.record(request, response, stats, time.perf_counter() - started)
+        return response
+
+    def record(self, request, response, stats, duration):
+        match = request.resolver_match
+        view = {'view': match.route if match else 'unmatched', 'method': request.method}
+        requests_total.labels(status=response.status_code, **view).inc()
+        request_duration.labels(**view).observe(duration)
+        query_count.labels(**view).observe(stats.query_count)
+        query_duration.labels(**view).observe(stats.query_time)
+        serializer_duration.labels(**view).observe(stats.serializer_time)
+        if not response.streaming:
+            response_size.labels(**view).observe(len(response.content))
+        if stats.cache_hits:
+            cache_requests.labels(result='hit', **view).inc(stats.cache_hits)
+        if stats.cache_misses:
+            cache_requests.labels(result='miss', **view).inc(stats.cache_misses)
+
+        if duration >= settings.SLOW_REQUEST_THRESHOLD:
+            logger.warning(
+                'Slow request %s %s: %.3fs, %d queries in %.3fs, %.3fs serializing\n%s',
+                request.method, request.get_full_path(), duration, stats.query_count,
+                stats.query_time, stats.serializer_time,
+                '\n'.join(f'{seconds * 1000:.1f}ms {sql}' for sql, seconds in stats.queries)
+            )
+
+
+def metrics_view(request):
+    # Scraped by Prometheus with an inter-service key. Prometheus sends a fixed
+    # Authorization header and cannot sign, so INTER_SERVICE_REQUIRE_SIGNATURE
+    # does not apply here
+    if not inter_service_keys.is_authorized(request, require_signature=False):
+        return HttpResponse(status=401)
+    return HttpResponse(render(), content_type=CONTENT_TYPE_PLAIN_0_0_4)
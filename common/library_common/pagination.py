@@ -0,0 +1,91 @@
+"""
+Forward-only keyset (cursor) pagination shared by both services' list views.
+Each service's ``books.pagination`` builds its optional cursor mode on it.
+"""
+import base64
+import json
+from collections import OrderedDict
+from functools import reduce
+from operator import or_
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+def wants_cursor(request):
+    return 'cursor' in request.query_params or request.query_params.get('pagination') == 'cursor'
+
+
+def keyset_filter(ordering, position):
+    # Rows strictly after ``position`` in ``ordering``: (a, b) > (x, y) expands to
+    # a > x OR (a = x AND b > y); the leading a >= x bound keeps it an index range scan
+    clauses = []
+    for index, field in enumerate(ordering):
+        lookup = 'lt' if field.startswith('-') else 'gt'
+        clause = Q(**{f'{field.lstrip("-")}__{lookup}': position[index]})
+        for previous_field, previous_value in zip(ordering[:index], position[:index]):
+            clause &= Q(**{previous_field.lstrip('-'): previous_value})
+        clauses.append(clause)
+
+    leading = ordering[0]
+    bound = Q(**{f'{leading.lstrip("-")}__{"lte" if leading.startswith("-") else "gte"}': position[0]})
+    return bound & reduce(or_, clauses)
+
+
+class KeysetPagination(BasePagination):
+    """
+    Forward-only cursor pagination over a stable composite sort key. The view's
+    ``keyset_ordering`` must end with a unique field (normally ``id``).
+    """
+    page_size = api_settings.PAGE_SIZE
+    cursor_query_param = 'cursor'
+    ordering = ('id',)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.take_page(list(self.page_queryset(queryset, request, view)))
+
+    def page_queryset(self, queryset, request, view=None):
+        # Split from take_page so async views can fetch the rows themselves
+        self.request = request
+        self.ordering = getattr(view, 'keyset_ordering', self.ordering)
+        self.fields = [queryset.model._meta.get_field(field.lstrip('-')) for field in self.ordering]
+
+        queryset = queryset.order_by(*self.ordering)
+        position = self.decode_cursor(request)
+        if position is not None:
+            queryset = queryset.filter(keyset_filter(self.ordering, position))
+        return queryset[:self.page_size + 1]
+
+    def take_page(self, rows):
+        self.has_next = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        self.next_position = [field.value_to_string(rows[-1]) for field in self.fields] if self.has_next else None
+        return rows
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            values = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+            if len(values) != len(self.fields):
+                raise ValueError
+            return [field.to_python(value) for field, value in zip(self.fields, values)]
+        except Exception:
+            raise NotFound('Invalid cursor')
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        encoded = base64.urlsafe_b64encode(json.dumps(self.next_position).encode()).decode()
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, encoded)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
@@ -0,0 +1,33 @@
+"""Query-count assertions for both services' test suites."""
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+class QueryBudgetMixin:
+    """
+    TestCase mixin asserting that an endpoint stays within a fixed number of
+    queries however much data it returns.
+    """
+    budget_sizes = (1, 10, 40)
+
+    def assertQueryBudget(self, budget, request, populate, sizes=None):
+        """
+        For each size, ``populate(size)`` grows the data set to that size and
+        ``request()`` hits the endpoint. Every run must issue at most ``budget``
+        queries, and the count must not change with the size.
+        """
+        counts = {}
+        for size in sizes or self.budget_sizes:
+            populate(size)
+            cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                response = request()
+            self.assertLess(response.status_code, 400, response.content)
+            counts[size] = len(queries)
+            self.assertLessEqual(
+                len(queries), budget,
+                f'{len(queries)} queries at size {size} (budget {budget}):\n'
+                + '\n'.join(query['sql'] for query in queries)
+            )
+        self.assertEqual(len(set(counts.values())), 1, f'query count grows with data size: {counts}')
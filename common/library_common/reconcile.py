@@ -0,0 +1,30 @@
+"""
+The row hashing both services' catalog reconciliation agrees on: the admin's
+``reconcile_catalog`` task compares its ranges with the frontend's, so both
+sides must select the same fields and hash them the same way.
+"""
+import hashlib
+
+from django.db.models import Q
+
+# Availability is left out: the frontend owns it through circulation
+DIGEST_FIELDS = ['isbn', 'title', 'author', 'publisher__name', 'category__name',
+                 'published_date', 'description']
+
+
+def row_digest(row):
+    data = '\x1f'.join(str(value) for value in row)
+    return int.from_bytes(hashlib.blake2b(data.encode(), digest_size=8).digest(), 'big')
+
+
+def prefix_range(prefix):
+    # Digit prefixes become [prefix, prefix + 1), which any collation orders the
+    # same way and which the isbn unique index can serve as a range scan
+    if not prefix:
+        return Q()
+    if not prefix.isdigit():
+        return Q(isbn__startswith=prefix)
+    upper = str(int(prefix) + 1).zfill(len(prefix))
+    if len(upper) > len(prefix):
+        return Q(isbn__gte=prefix)
+    return Q(isbn__gte=prefix, isbn__lt=upper)
@@ -0,0 +1,197 @@
+"""
+Bounded in-process LRU of names and ids of small lookup tables (each
+service registers its Publisher and Category models in its own
+``books.reference_cache``).
+
+Those tables hold a few hundred rows that almost never change, so syncs
+resolve names without a query once a worker is warm. Saving or deleting a
+row publishes its id on the service's REFERENCE_CACHE_CHANNEL; a listener
+thread in every process drops that entry, and clears everything whenever it
+has to resubscribe, because changes published in between were missed.
+Without REFERENCE_CACHE_REDIS_URL only the local process is invalidated.
+
+Bulk ``QuerySet.update()`` calls bypass the signals: clear the caches (or
+restart the workers) after renaming rows that way.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+
+import redis
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+logger = logging.getLogger(__name__)
+
+
+class LookupCache:
+    def __init__(self, model, max_size):
+        self.model = model
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        self.names = OrderedDict()  # id -> name, least recently used first
+        self.ids = {}  # name -> id for the same entries
+        # Bumped by every invalidation; rows read before one are not stored
+        self.generation = 0
+
+    def _get(self, pk):
+        name = self.names.get(pk)
+        if name is not None:
+            self.names.move_to_end(pk)
+        return name
+
+    def _store(self, rows, generation):
+        # Rows read inside a transaction only become shareable once it commits
+        def store():
+            with self.lock:
+                if generation != self.generation:
+                    return
+                for pk, name in rows:
+                    self._discard(pk)
+                    self.names[pk] = name
+                    self.ids[name] = pk
+                while len(self.names) > self.max_size:
+                    _, name = self.names.popitem(last=False)
+                    self.ids.pop(name, None)
+        transaction.on_commit(store)
+
+    def _discard(self, pk):
+        name = self.names.pop(pk, None)
+        if name is not None:
+            self.ids.pop(name, None)
+
+    def names_for(self, ids):
+        """Map every id in ``ids`` to its name, querying only for the ones not cached."""
+        ensure_listening()
+        with self.lock:
+            found = {pk: self._get(pk) for pk in ids}
+            generation = self.generation
+        missing = [pk for pk, name in found.items() if name is None]
+        if missing:
+            rows = list(self.model.objects.filter(id__in=missing).values_list('id', 'name'))
+            self._store(rows, generation)
+            found.update(rows)
+        return {pk: name for pk, name in found.items() if name is not None}
+
+    def ids_for(self, names, create=False):
+        """Map every name in ``names`` to its id; with ``create``, insert the unknown ones first."""
+        ensure_listening()
+        names = set(names)
+        with self.lock:
+            found = {name: self.ids[name] for name in names if name in self.ids}
+            for pk in found.values():
+                self.names.move_to_end(pk)
+            generation = self.generation
+        missing = names - found.keys()
+        if missing:
+            if create:
+                self.model.objects.bulk_create([self.model(name=name) for name in missing], ignore_conflicts=True)
+            rows = list(self.model.objects.filter(name__in=missing).values_list('id', 'name'))
+            self._store(rows, generation)
+            found.update((name, pk) for pk, name in rows)
+        return found
+
+    def name_for(self, pk):
+        return self.names_for([pk]).get(pk)
+
+    def id_for(self, name, create=False):
+        return self.ids_for([name], create=create).get(name)
+
+    def forget(self, pk):
+        with self.lock:
+            self.generation += 1
+            self._discard(pk)
+
+    def clear(self):
+        with self.lock:
+            self.generation += 1
+            self.names.clear()
+            self.ids.clear()
+
+
+# Model name (as published in invalidations) -> LookupCache
+CACHES = {}
+
+
+def register(model):
+    """The LookupCache of ``model``, whose saves and deletes invalidate it in every process."""
+    table = model._meta.model_name
+    CACHES[table] = LookupCache(model, settings.REFERENCE_CACHE_SIZE)
+    post_save.connect(invalidate, sender=model, dispatch_uid=f'reference-cache-{table}-save')
+    post_delete.connect(invalidate, sender=model, dispatch_uid=f'reference-cache-{table}-delete')
+    return CACHES[table]
+
+
+def clear_all():
+    for lookup in CACHES.values():
+        lookup.clear()
+
+
+def apply_invalidation(data):
+    message = json.loads(data)
+    CACHES[message['table']].forget(message['id'])
+
+
+@lru_cache(maxsize=None)
+def redis_client(url):
+    return redis.Redis.from_url(url)
+
+
+def listen(url):
+    client = redis_client(url)
+    while True:
+        try:
+            pubsub = client.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(settings.REFERENCE_CACHE_CHANNEL)
+            clear_all()
+            for message in pubsub.listen():
+                apply_invalidation(message['data'])
+        except Exception as e:
+            logger.warning('Reference cache subscription lost: %s', e)
+            time.sleep(1)
+
+
+_listener_pid = None
+_listener_lock = threading.Lock()
+
+
+def ensure_listening():
+    # One listener per process, started on first use so forked workers get their own
+    global _listener_pid
+    url = settings.REFERENCE_CACHE_REDIS_URL
+    if not url or _listener_pid == os.getpid():
+        return
+    with _listener_lock:
+        if _listener_pid == os.getpid():
+            return
+        clear_all()
+        threading.Thread(target=listen, args=(url,), name='reference-cache', daemon=True).start()
+        _listener_pid = os.getpid()
+
+
+def publish_invalidation(table, pk):
+    url = settings.REFERENCE_CACHE_REDIS_URL
+    if not url:
+        return
+    try:
+        redis_client(url).publish(settings.REFERENCE_CACHE_CHANNEL, json.dumps({'table': table, 'id': pk}))
+    except Exception as e:
+        logger.warning('Could not publish reference cache invalidation: %s', e)
+
+
+def invalidate(sender, instance, **kwargs):
+    table, pk = sender._meta.model_name, instance.pk
+    CACHES[table].forget(pk)
+
+    # Again once the change is visible, in case the old row was read back
+    # meanwhile, and in every other process
+    def after_commit():
+        CACHES[table].forget(pk)
+        publish_invalidation(table, pk)
+    transaction.on_commit(after_commit)
+
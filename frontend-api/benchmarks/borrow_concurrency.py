@@ -0,0 +1,120 @@
+"""
+Hammer single books from many threads through the borrow path and report
+correctness (exactly one winner per book) and borrows/second.
+
+Usage (point DATABASE_URL at a PostgreSQL database; it will be filled):
+    python -m benchmarks.borrow_concurrency --threads 32 --rounds 200
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+from datetime import timedelta
+
+import django
+
+from library_common.benchmarks.report import emit, run_params
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'frontend_api.settings')
+
+
+def hammer(book_id, users):
+    """Let every user try to borrow ``book_id`` at the same moment; return the winners' ids."""
+    from django.db import OperationalError, connection
+    from django.utils import timezone
+    from books.models import BorrowedBook, BookNotAvailable
+
+    barrier = threading.Barrier(len(users))
+    winners, errors = [], []
+
+    def borrow(user):
+        try:
+            barrier.wait()
+            while True:
+                try:
+                    BorrowedBook.objects.create(
+                        user=user, book_id=book_id, return_date=timezone.now() + timedelta(days=7)
+                    )
+                    winners.append(user.id)
+                    return
+                except OperationalError as e:
+                    # SQLite's shared-cache test database reports a held write lock
+                    # instead of waiting for it; retry as its busy timeout would
+                    if 'locked' not in str(e):
+                        raise
+                    time.sleep(0.001)
+        except BookNotAvailable:
+            pass
+        except Exception as e:
+            errors.append(repr(e))
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=borrow, args=(user,)) for user in users]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return winners, errors
+
+
+def ensure_users(count):
+    from django.contrib.auth import get_user_model
+
+    User = get_user_model()
+    User.objects.bulk_create([
+        User(username=f'bench{i}@example.com', email=f'bench{i}@example.com',
+             first_name='Bench', last_name='User')
+        for i in range(count)
+    ], ignore_conflicts=True)
+    return list(User.objects.filter(username__startswith='bench').order_by('id')[:count])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--rounds', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='Write the results here instead of to stdout.')
+    args = parser.parse_args(argv)
+
+    django.setup()
+    from benchmarks.data import generate_catalog
+    from books.models import Book, BorrowedBook, CatalogBook
+
+    generate_catalog(args.rounds, seed=args.seed)
+    users = ensure_users(args.threads)
+    book_ids = list(Book.objects.order_by('id').values_list('id', flat=True)[:args.rounds])
+    BorrowedBook.objects.filter(book_id__in=book_ids).delete()
+    Book.objects.filter(id__in=book_ids).update(is_available=True)
+    CatalogBook.objects.filter(book_id__in=book_ids).update(is_available=True)
+
+    double_borrows, empty_rounds, attempts, errors = 0, 0, 0, []
+    started = time.perf_counter()
+    for book_id in book_ids:
+        winners, round_errors = hammer(book_id, users)
+        attempts += len(users)
+        errors += round_errors
+        double_borrows += len(winners) > 1
+        empty_rounds += not winners
+    elapsed = time.perf_counter() - started
+
+    results = {
+        'rounds': len(book_ids),
+        'double_borrows': double_borrows,
+        'rounds_without_winner': empty_rounds,
+        'open_loans_per_book_max': max(
+            BorrowedBook.objects.filter(book_id=book_id, actual_return_date__isnull=True).count()
+            for book_id in book_ids
+        ),
+        'errors': len(errors),
+        'borrow_attempts_per_second': attempts / elapsed,
+        'borrows_per_second': (len(book_ids) - empty_rounds) / elapsed,
+    }
+    emit('borrow_concurrency', run_params(args), results, args.output)
+    return 0 if double_borrows == 0 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,113 @@
+"""Deterministic synthetic catalog data for benchmarks."""
+import random
+from datetime import date, timedelta
+
+WORDS = [
+    'python', 'django', 'data', 'systems', 'design', 'patterns', 'history', 'science',
+    'garden', 'ocean', 'river', 'mountain', 'night', 'shadow', 'light', 'journey',
+    'kingdom', 'secret', 'empire', 'machine', 'learning', 'network', 'cloud', 'security',
+    'practical', 'modern', 'advanced', 'complete', 'guide', 'handbook', 'introduction',
+    'theory', 'music', 'painting', 'cooking', 'travel', 'economics', 'philosophy',
+    'physics', 'chemistry', 'biology', 'poetry', 'letters', 'winter', 'summer', 'silver',
+]
+FIRST_NAMES = ['Ada', 'Alan', 'Grace', 'Linus', 'Barbara', 'Ken', 'Margaret', 'Dennis',
+               'Edsger', 'Donald', 'Frances', 'John', 'Radia', 'Tim', 'Sophie', 'Guido']
+LAST_NAMES = ['Lovelace', 'Turing', 'Hopper', 'Torvalds', 'Liskov', 'Thompson', 'Hamilton',
+              'Ritchie', 'Dijkstra', 'Knuth', 'Allen', 'McCarthy', 'Perlman', 'Berners-Lee',
+              'Wilson', 'van Rossum']
+
+
+def isbn_for(index):
+    return f'978{index:010d}'
+
+
+def book_fields(index, rng):
+    return {
+        'title': ' '.join(rng.choice(WORDS) for _ in range(rng.randint(2, 5))).title(),
+        'author': f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}',
+        'isbn': isbn_for(index),
+        'published_date': date(1950, 1, 1) + timedelta(days=rng.randint(0, 27000)),
+        'description': ' '.join(rng.choice(WORDS) for _ in range(rng.randint(5, 20))),
+    }
+
+
+def generate_catalog(books, publishers=200, categories=50, seed=42, batch_size=5000):
+    """Create (or top up) a catalog of ``books`` rows; the same seed always yields the same data."""
+    from books.models import Book, CatalogBook, Category, Publisher
+
+    Publisher.objects.bulk_create(
+        [Publisher(name=f'Publisher {i:04d}') for i in range(publishers)], ignore_conflicts=True
+    )
+    Category.objects.bulk_create(
+        [Category(name=f'Category {i:03d}') for i in range(categories)], ignore_conflicts=True
+    )
+    publisher_ids = list(Publisher.objects.order_by('name').values_list('id', flat=True))
+    category_ids = list(Category.objects.order_by('name').values_list('id', flat=True))
+
+    existing = Book.objects.count()
+    for start in range(existing, books, batch_size):
+        rows = []
+        for index in range(start, min(start + batch_size, books)):
+            rng = random.Random(seed * 1000003 + index)
+            rows.append(Book(
+                publisher_id=publisher_ids[index % len(publisher_ids)],
+                category_id=category_ids[index % len(category_ids)],
+                **book_fields(index, rng)
+            ))
+        Book.objects.bulk_create(rows, ignore_conflicts=True)
+        CatalogBook.refresh(Book.objects.filter(isbn__in=[row.isbn for row in rows]))
+    return Book.objects.count()
+
+
+def generate_users(users, password=None, batch_size=5000):
+    """
+    Create (or top up) ``users`` readers named ``reader<i>@example.com`` and
+    return their ids. With ``password`` they can log in, e.g. for load tests;
+    the password is hashed once and shared.
+    """
+    from django.contrib.auth import get_user_model
+    from django.contrib.auth.hashers import make_password
+
+    User = get_user_model()
+    hashed = make_password(password)
+    for start in range(0, users, batch_size):
+        User.objects.bulk_create([
+            User(username=f'reader{i}@example.com', email=f'reader{i}@example.com', password=hashed,
+                 first_name=FIRST_NAMES[i % len(FIRST_NAMES)], last_name=LAST_NAMES[i % len(LAST_NAMES)])
+            for i in range(start, min(start + batch_size, users))
+        ], ignore_conflicts=True)
+    if password is not None:
+        User.objects.filter(username__startswith='reader').update(password=hashed)
+    return list(User.objects.filter(username__startswith='reader').order_by('id').values_list('id', flat=True))
+
+
+def generate_loans(users, loans, open_ratio=0.1, seed=42, batch_size=5000):
+    """
+    Create ``users`` readers and one loan for each of the first ``loans``
+    books, of which roughly ``open_ratio`` are still out. Expects a catalog of
+    at least ``loans`` books with no loans yet; returns the number of open loans.
+    """
+    from django.utils import timezone
+    from books.models import Book, BorrowedBook, CatalogBook
+
+    user_ids = generate_users(users)
+    book_ids = list(Book.objects.order_by('id').values_list('id', flat=True)[:loans])
+
+    rng = random.Random(seed)
+    now = timezone.now()
+    open_loans = 0
+    for offset in range(0, len(book_ids), batch_size):
+        rows, open_book_ids = [], []
+        for book_id in book_ids[offset:offset + batch_size]:
+            returned = None if rng.random() < open_ratio else now - timedelta(days=rng.randint(1, 365))
+            if returned is None:
+                open_book_ids.append(book_id)
+            rows.append(BorrowedBook(
+                user_id=rng.choice(user_ids), book_id=book_id,
+                return_date=now + timedelta(days=14), actual_return_date=returned,
+            ))
+        BorrowedBook.objects.bulk_create(rows)
+        Book.objects.filter(id__in=open_book_ids).update(is_available=False)
+        CatalogBook.objects.filter(book_id__in=open_book_ids).update(is_available=False)
+        open_loans += len(open_book_ids)
+    return open_loans
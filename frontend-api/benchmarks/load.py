@@ -0,0 +1,265 @@
+"""
+Locust-style HTTP load test of a running frontend API: simulated readers log
+in and loop over a weighted mix of tasks until the time is up.
+
+Usage (fill the server's database once, start it, then run a scenario):
+    python -m benchmarks.load prepare --books 1000000 --users 1000 --password secret
+    gunicorn frontend_api.wsgi:application -w 4 --bind 0.0.0.0:8000
+    python -m benchmarks.load run --url http://localhost:8000 --scenario mixed \
+        --users 64 --duration 60 --password secret --output load.json
+
+The read scenario is the one to run against both serving modes (WSGI, and
+SERVER_MODE=asgi under uvicorn workers) at the same worker count; the README
+records the runs made so far. The sync scenarios need the server's
+INTER_SERVICE_TOKEN.
+"""
+import argparse
+import os
+import random
+import threading
+import time
+from collections import Counter, defaultdict
+from itertools import count
+
+import requests
+
+from benchmarks.data import FIRST_NAMES, LAST_NAMES, WORDS, book_fields
+from library_common.benchmarks.report import emit, run_params, summarize
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'frontend_api.settings')
+
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.timings = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+
+    def record(self, name, elapsed, status):
+        with self.lock:
+            self.timings[name].append(elapsed)
+            self.statuses[name][status] += 1
+
+    def results(self, wall):
+        tasks = {}
+        for name, timings in sorted(self.timings.items()):
+            tasks[name] = summarize(timings)
+            tasks[name]['requests_per_second'] = len(timings) / wall
+            tasks[name]['statuses'] = dict(self.statuses[name])
+        total = sum(len(timings) for timings in self.timings.values())
+        errors = sum(count for statuses in self.statuses.values() for status, count in statuses.items()
+                     if status == 'error' or status >= 500)
+        return {'requests': total, 'errors': errors, 'requests_per_second': total / wall, 'tasks': tasks}
+
+
+class VirtualUser:
+    def __init__(self, options, index, stats):
+        self.options = options
+        self.stats = stats
+        self.rng = random.Random(options.seed * 1000003 + index)
+        self.email = f'reader{index % options.accounts}@example.com'
+        self.session = requests.Session()
+        # Book ids seen in list responses, for the tasks that need one
+        self.book_ids = []
+
+    def request(self, name, method, path, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = self.session.request(method, self.options.url + path, timeout=30, **kwargs)
+            status = response.status_code
+        except requests.RequestException:
+            response, status = None, 'error'
+        self.stats.record(name, (time.perf_counter() - started) * 1000, status)
+        return response
+
+    def login(self):
+        response = requests.post(f'{self.options.url}/api/token/',
+                                 json={'email': self.email, 'password': self.options.password})
+        response.raise_for_status()
+        self.session.headers['Authorization'] = f"Bearer {response.json()['access']}"
+        browse(self)
+
+    def pick_book(self):
+        return self.rng.choice(self.book_ids) if self.book_ids else 1
+
+    def run(self, deadline, weights):
+        tasks, counts = list(weights), list(weights.values())
+        while time.monotonic() < deadline:
+            TASKS[self.rng.choices(tasks, counts)[0]](self)
+            if self.options.wait:
+                time.sleep(self.rng.uniform(0, self.options.wait))
+
+
+def remember_books(user, response):
+    if response is not None and response.status_code == 200:
+        user.book_ids = [book['id'] for book in response.json()['results']] or user.book_ids
+
+
+def browse(user):
+    remember_books(user, user.request('list', 'GET', '/api/books/'))
+
+
+def deep_page(user):
+    remember_books(user, user.request('list_deep_page', 'GET', '/api/books/', params={'page': user.rng.randint(2, 50)}))
+
+
+def search(user):
+    term = user.rng.choice([user.rng.choice(WORDS), user.rng.choice(LAST_NAMES), user.rng.choice(FIRST_NAMES)])
+    user.request('search', 'GET', '/api/books/', params={'search': term})
+
+
+def detail(user):
+    user.request('detail', 'GET', f'/api/books/{user.pick_book()}/')
+
+
+def my_borrowed(user):
+    user.request('my_borrowed', 'GET', '/api/books/my-borrowed/')
+
+
+def borrow_and_return(user):
+    # Losing the book to another reader (400) is part of the workload
+    book_id = user.pick_book()
+    response = user.request('borrow', 'POST', '/api/books/borrow/', json={'book_id': book_id, 'days': 14})
+    if response is not None and response.status_code == 201:
+        user.request('bulk_return', 'POST', '/api/books/bulk-return/', json={'book_ids': [book_id]})
+
+
+def bulk_borrow_and_return(user):
+    book_ids = user.rng.sample(user.book_ids, min(5, len(user.book_ids))) or [1]
+    response = user.request('bulk_borrow', 'POST', '/api/books/bulk-borrow/', json={'book_ids': book_ids, 'days': 14})
+    if response is not None and response.status_code == 200:
+        borrowed = [item['book_id'] for item in response.json()['results'] if item['status'] == 'ok']
+        if borrowed:
+            user.request('bulk_return', 'POST', '/api/books/bulk-return/', json={'book_ids': borrowed})
+
+
+def sync_payload(index, seed):
+    # The generated catalog's own values, so repeated syncs leave it unchanged
+    fields = book_fields(index, random.Random(seed * 1000003 + index))
+    return dict(fields, published_date=fields['published_date'].isoformat(),
+                publisher_name=f'Publisher {index % 200:04d}', category_name=f'Category {index % 50:03d}')
+
+
+# The frontend skips changes older than the last one applied to a book, so
+# every run continues above the sequences of earlier ones (microseconds since
+# the epoch; the prepared catalog is only ever written by these benchmarks)
+sequences = count(time.time_ns() // 1000)
+
+
+def book_changes(payloads):
+    return {'changes': [
+        {'operation': 'upsert', 'sequence': next(sequences), 'isbn': payload['isbn'], 'book': payload}
+        for payload in payloads
+    ]}
+
+
+def sync_book(user):
+    payload = sync_payload(user.rng.randrange(user.options.books), user.options.seed)
+    user.request('sync_book', 'POST', '/api/internal/book-changes/', json=book_changes([payload]),
+                 headers={'Authorization': f'Token {user.options.inter_service_token}'})
+
+
+def sync_books(user):
+    start = user.rng.randrange(max(1, user.options.books - 100))
+    payloads = [sync_payload(index, user.options.seed) for index in range(start, min(start + 100, user.options.books))]
+    user.request('sync_books', 'POST', '/api/internal/book-changes/', json=book_changes(payloads),
+                 headers={'Authorization': f'Token {user.options.inter_service_token}'})
+
+
+TASKS = {
+    'browse': browse,
+    'deep_page': deep_page,
+    'search': search,
+    'detail': detail,
+    'my_borrowed': my_borrowed,
+    'borrow_and_return': borrow_and_return,
+    'bulk_borrow_and_return': bulk_borrow_and_return,
+    'sync_book': sync_book,
+    'sync_books': sync_books,
+}
+
+# Task weights per scenario
+SCENARIOS = {
+    'read': {'browse': 40, 'search': 30, 'deep_page': 20, 'my_borrowed': 10},
+    'circulation': {'borrow_and_return': 50, 'bulk_borrow_and_return': 20, 'my_borrowed': 30},
+    'sync': {'sync_book': 70, 'sync_books': 30},
+    'mixed': {'browse': 30, 'search': 20, 'deep_page': 10, 'detail': 10, 'my_borrowed': 10,
+              'borrow_and_return': 12, 'bulk_borrow_and_return': 3, 'sync_book': 4, 'sync_books': 1},
+}
+
+
+def run(options, duration):
+    # Logging in, and the first page each reader loads, is not measured
+    users = [VirtualUser(options, index, Stats()) for index in range(options.users)]
+    for user in users:
+        user.login()
+    stats = Stats()
+    for user in users:
+        user.stats = stats
+
+    deadline = time.monotonic() + duration
+    threads = [threading.Thread(target=user.run, args=(deadline, SCENARIOS[options.scenario])) for user in users]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return stats.results(time.perf_counter() - started)
+
+
+def prepare(options):
+    import django
+
+    django.setup()
+    from django.db import connection
+    from benchmarks.data import generate_catalog, generate_loans, generate_users
+    from books.models import BorrowedBook
+
+    generate_catalog(options.books, seed=options.seed)
+    if not BorrowedBook.objects.exists():
+        generate_loans(options.users, min(options.loans, options.books), seed=options.seed)
+    generate_users(options.users, password=options.password)
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    prepare_parser = commands.add_parser('prepare', help='Fill the database the server uses.')
+    prepare_parser.add_argument('--books', type=int, default=100_000)
+    prepare_parser.add_argument('--users', type=int, default=1000)
+    prepare_parser.add_argument('--loans', type=int, default=20_000)
+    prepare_parser.add_argument('--password', required=True)
+    prepare_parser.add_argument('--seed', type=int, default=42)
+
+    run_parser = commands.add_parser('run', help='Run a scenario against a running server.')
+    run_parser.add_argument('--url', default='http://localhost:8000')
+    run_parser.add_argument('--scenario', choices=sorted(SCENARIOS), default='mixed')
+    run_parser.add_argument('--users', type=int, default=64, help='Concurrent simulated readers.')
+    run_parser.add_argument('--accounts', type=int, default=1000, help='Reader accounts from prepare to log in as.')
+    run_parser.add_argument('--password', required=True)
+    run_parser.add_argument('--duration', type=float, default=60, help='Seconds to measure.')
+    run_parser.add_argument('--warmup', type=float, default=5, help='Unmeasured seconds first.')
+    run_parser.add_argument('--wait', type=float, default=0, help='Think time between tasks, up to this many seconds.')
+    run_parser.add_argument('--books', type=int, default=100_000, help='Catalog size from prepare, for sync tasks.')
+    run_parser.add_argument('--inter-service-token', default=os.environ.get('INTER_SERVICE_TOKEN', ''))
+    run_parser.add_argument('--seed', type=int, default=42)
+    run_parser.add_argument('--output', help='Write the results here instead of to stdout.')
+    args = parser.parse_args(argv)
+
+    if args.command == 'prepare':
+        prepare(args)
+        return
+
+    # The warm-up opens connections and fills caches on the server
+    if args.warmup:
+        run(args, args.warmup)
+    params = run_params(args, exclude=('command', 'password', 'inter_service_token'))
+    emit('load', params, run(args, args.duration), args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,242 @@
+"""
+Time the catalog querysets, the serializers and the hot views in-process
+(no HTTP), over a deterministic synthetic catalog.
+
+Usage (point DATABASE_URL at a PostgreSQL database; it will be filled):
+    python -m benchmarks.micro --books 1000000 --users 10000 --loans 200000 \
+        --output micro.json
+"""
+import argparse
+import os
+import random
+import time
+from itertools import count, cycle
+
+import django
+
+from library_common.benchmarks.report import emit, run_params, summarize
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'frontend_api.settings')
+
+
+def measure(call, repeat, setup=None):
+    """Run ``call`` ``repeat`` times and summarize its timings; ``setup`` runs untimed before each call."""
+    timings = []
+    for i in range(repeat):
+        argument = setup(i) if setup else i
+        started = time.perf_counter()
+        call(argument)
+        timings.append((time.perf_counter() - started) * 1000)
+    return summarize(timings)
+
+
+def per_row(summary, rows):
+    """Add the mean cost of one row to a summary of calls that each handled ``rows`` rows."""
+    summary['per_row_ms'] = summary['mean_ms'] / max(rows, 1)
+    return summary
+
+
+def list_view(params, user):
+    """The BookListView the request ``params`` would get, for its filtered queryset."""
+    from rest_framework.request import Request
+    from rest_framework.test import APIRequestFactory
+    from books.views import BookListView
+
+    request = Request(APIRequestFactory().get('/api/books/', params))
+    request.user = user
+    view = BookListView(request=request, format_kwarg=None)
+    return view.filter_queryset(view.get_queryset())
+
+
+def queryset_benchmarks(rng, user, book_ids, repeat, page_size):
+    from benchmarks.data import LAST_NAMES, WORDS
+    from books.models import CatalogBook
+    from books.views import open_loans
+
+    available = CatalogBook.objects.filter(is_available=True).order_by('book_id')
+    middle = book_ids[len(book_ids) // 2]
+    terms = [rng.choice(WORDS + LAST_NAMES) for _ in range(repeat)]
+    publishers = [f'Publisher {rng.randrange(200):04d}' for _ in range(repeat)]
+    details = [rng.choice(book_ids) for _ in range(repeat)]
+
+    return {
+        'catalog_first_page': measure(lambda i: list(available[:page_size]), repeat),
+        'catalog_deep_page': measure(lambda i: list(available.filter(book_id__gt=middle)[:page_size]), repeat),
+        'catalog_count': measure(lambda i: available.count(), repeat),
+        'catalog_publisher_name': measure(
+            lambda i: list(list_view({'publisher_name': publishers[i]}, user)[:page_size]), repeat
+        ),
+        'catalog_search': measure(lambda i: list(list_view({'search': terms[i]}, user)[:page_size]), repeat),
+        'catalog_detail': measure(lambda i: CatalogBook.objects.get(pk=details[i]), repeat),
+        'my_borrowed': measure(lambda i: list(open_loans(user)), repeat),
+    }
+
+
+def serializer_benchmarks(user, repeat, page_size):
+    from rest_framework.renderers import JSONRenderer
+    from books.fast_serializers import borrowed_book_data, borrowed_rows, catalog_book_data, catalog_rows
+    from books.models import Book, CatalogBook
+    from books.renderers import ORJSONRenderer
+    from books.serializers import (BookSerializer, BookSyncSerializer, BorrowedBookSerializer,
+                                   CatalogBookSerializer)
+    from books.views import open_loans
+
+    catalog_page = list(CatalogBook.objects.order_by('book_id')[:page_size])
+    catalog_page_rows = list(catalog_rows(CatalogBook.objects.order_by('book_id')[:page_size]))
+    book_page = list(Book.objects.select_related('publisher', 'category').order_by('id')[:page_size])
+    loans = list(open_loans(user)[:page_size])
+    loan_rows = list(borrowed_rows(open_loans(user)[:page_size]))
+    drf, fast = JSONRenderer(), ORJSONRenderer()
+    payloads = [
+        {'title': book.title, 'author': book.author, 'isbn': book.isbn, 'publisher_name': book.publisher_name,
+         'category_name': book.category_name, 'published_date': book.published_date.isoformat(),
+         'description': book.description}
+        for book in catalog_page
+    ]
+
+    return {
+        'catalog_book_page': measure(lambda i: CatalogBookSerializer(catalog_page, many=True).data, repeat),
+        'book_page': measure(lambda i: BookSerializer(book_page, many=True).data, repeat),
+        'borrowed_books': measure(lambda i: BorrowedBookSerializer(loans, many=True).data, repeat),
+        # Serialized and rendered, as the hot endpoints do it: before and after the fast path
+        'catalog_page_drf': per_row(measure(
+            lambda i: drf.render(CatalogBookSerializer(catalog_page, many=True).data), repeat
+        ), len(catalog_page)),
+        'catalog_page_fast': per_row(measure(
+            lambda i: fast.render(catalog_book_data(catalog_page_rows)), repeat
+        ), len(catalog_page_rows)),
+        'borrowed_books_drf': per_row(measure(
+            lambda i: drf.render(BorrowedBookSerializer(loans, many=True).data), repeat
+        ), len(loans)),
+        'borrowed_books_fast': per_row(measure(
+            lambda i: fast.render(borrowed_book_data(loan_rows)), repeat
+        ), len(loan_rows)),
+        'book_sync_validation': measure(
+            lambda i: BookSyncSerializer(data=payloads, many=True).is_valid(raise_exception=True), repeat
+        ),
+    }
+
+
+def view_benchmarks(user, repeat, page_size):
+    from django.conf import settings
+    from django.core.cache import cache
+    from rest_framework.test import APIRequestFactory, force_authenticate
+    from django.db.models import Max
+    from books.models import Book, BookTombstone, BorrowedBook, CatalogBook
+    from books.views import BookListView, apply_book_changes, borrow_book
+
+    # Paginated responses build absolute links, so the host has to be allowed
+    factory = APIRequestFactory(SERVER_NAME=settings.ALLOWED_HOSTS[0])
+    list_books = BookListView.as_view()
+
+    def authenticated(request):
+        force_authenticate(request, user=user)
+        return request
+
+    def fetch_cold_list(i):
+        # Time the database path, not a cached page
+        cache.clear()
+        return authenticated(factory.get('/api/books/', {'page': i % 10 + 1}))
+
+    # Borrow books nobody has, handing each back untimed before the next run
+    candidates = cycle(CatalogBook.objects.filter(is_available=True).order_by('-book_id')
+                       .values_list('book_id', flat=True)[:repeat])
+    borrowed = []
+
+    def hand_back():
+        BorrowedBook.return_many(borrowed, user=user)
+        borrowed.clear()
+
+    def next_borrow(i):
+        hand_back()
+        borrowed.append(next(candidates))
+        return authenticated(factory.post('/api/books/borrow/', {'book_id': borrowed[0], 'days': 7}, format='json'))
+
+    # Re-sending unchanged books times the update path of a sync. Every change
+    # gets a fresh sequence, above any applied so far, so none is skipped as stale
+    catalog_page = list(CatalogBook.objects.order_by('book_id')[:page_size])
+    payloads = [
+        {'title': book.title, 'author': book.author, 'isbn': book.isbn, 'publisher_name': book.publisher_name,
+         'category_name': book.category_name, 'published_date': book.published_date.isoformat(),
+         'description': book.description, 'is_available': book.is_available}
+        for book in catalog_page
+    ]
+    token = {'HTTP_AUTHORIZATION': f'Token {settings.INTER_SERVICE_TOKEN}'}
+    applied = max(Book.objects.aggregate(sequence=Max('sync_sequence'))['sequence'] or 0,
+                  BookTombstone.objects.aggregate(sequence=Max('sync_sequence'))['sequence'] or 0)
+    sequences = count(applied + 1)
+
+    def changes(books):
+        return [{'operation': 'upsert', 'sequence': next(sequences), 'isbn': book['isbn'], 'book': book}
+                for book in books]
+
+    def sync_one(i):
+        book = payloads[i % len(payloads)]
+        return factory.post('/api/internal/book-changes/', {'changes': changes([book])}, format='json', **token)
+
+    def sync_batch(i):
+        return factory.post('/api/internal/book-changes/', {'changes': changes(payloads)}, format='json', **token)
+
+    def check(view):
+        def call(request):
+            response = view(request)
+            assert response.status_code < 300, response.data
+        return call
+
+    results = {
+        'book_list_uncached': measure(check(list_books), repeat, fetch_cold_list),
+        'borrow_book': measure(check(borrow_book), repeat, next_borrow),
+        'apply_book_change': measure(check(apply_book_changes), repeat, sync_one),
+        'apply_book_changes_batch': measure(check(apply_book_changes), repeat, sync_batch),
+    }
+    results['apply_book_changes_batch']['books_per_second'] = (
+        len(payloads) * 1000 / results['apply_book_changes_batch']['mean_ms']
+    )
+    hand_back()
+    return results
+
+
+def run(books, users, loans, repeat, page_size, seed):
+    from django.contrib.auth import get_user_model
+    from django.db import connection
+    from benchmarks.data import generate_catalog, generate_loans, generate_users
+    from books.models import Book, BorrowedBook
+
+    generate_catalog(books, seed=seed)
+    if not BorrowedBook.objects.exists():
+        generate_loans(users, min(loans, books), seed=seed)
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    # A reader with open loans, so my-borrowed has rows to serialize
+    loan = BorrowedBook.objects.filter(actual_return_date__isnull=True).select_related('user').first()
+    user = loan.user if loan else get_user_model().objects.get(id=generate_users(1)[0])
+    book_ids = list(Book.objects.order_by('id').values_list('id', flat=True))
+    rng = random.Random(seed)
+    return {
+        'querysets': queryset_benchmarks(rng, user, book_ids, repeat, page_size),
+        'serializers': serializer_benchmarks(user, repeat, page_size),
+        'views': view_benchmarks(user, repeat, page_size),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--books', type=int, default=100_000)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--loans', type=int, default=20_000)
+    parser.add_argument('--repeat', type=int, default=200)
+    parser.add_argument('--page-size', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='Write the results here instead of to stdout.')
+    args = parser.parse_args(argv)
+
+    django.setup()
+
+    results = run(args.books, args.users, args.loans, args.repeat, args.page_size, args.seed)
+    emit('micro', run_params(args), results, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""
+Compare the legacy OR'ed icontains search with the search backend behind
+BookListView, over a synthetic catalog.
+
+Usage (point DATABASE_URL at a PostgreSQL database; it will be filled):
+    python -m benchmarks.search --books 1000000 --runs 200
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+import django
+
+from library_common.benchmarks.report import emit, percentile, run_params
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'frontend_api.settings')
+
+
+def sample_terms(runs, books, seed):
+    from benchmarks.data import WORDS, LAST_NAMES, isbn_for
+
+    rng = random.Random(seed)
+    terms = []
+    for i in range(runs):
+        kind = i % 4
+        if kind == 0:
+            terms.append(rng.choice(WORDS))
+        elif kind == 1:
+            terms.append(f'{rng.choice(WORDS)} {rng.choice(WORDS)}')
+        elif kind == 2:
+            terms.append(rng.choice(LAST_NAMES))
+        else:
+            terms.append(isbn_for(rng.randrange(books)))
+    return terms
+
+
+def measure(search, terms, page_size):
+    timings = []
+    for term in terms:
+        started = time.perf_counter()
+        list(search(term)[:page_size])
+        timings.append((time.perf_counter() - started) * 1000)
+    return {
+        'p50_ms': statistics.median(timings),
+        'p95_ms': percentile(timings, 0.95),
+        'max_ms': max(timings),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--books', type=int, default=1_000_000)
+    parser.add_argument('--runs', type=int, default=200)
+    parser.add_argument('--page-size', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='Write the results here instead of to stdout.')
+    args = parser.parse_args(argv)
+
+    django.setup()
+    from django.db import connection
+    from django.db.models import Q
+    from benchmarks.data import generate_catalog
+    from books.models import CatalogBook
+    from books.search import normalize_isbn, ranked_search
+
+    if connection.vendor != 'postgresql':
+        print('warning: not running on PostgreSQL, the search backend falls back to icontains',
+              file=sys.stderr)
+
+    generate_catalog(args.books, seed=args.seed)
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE books_catalogbook')
+
+    available = CatalogBook.objects.filter(is_available=True)
+
+    def legacy(term):
+        return available.filter(Q(title__icontains=term) | Q(author__icontains=term) | Q(isbn__icontains=term))
+
+    def backend(term):
+        isbn = normalize_isbn(term)
+        if isbn:
+            return available.filter(isbn=isbn)
+        if connection.vendor != 'postgresql':
+            return legacy(term)
+        return ranked_search(available, term)
+
+    terms = sample_terms(args.runs, args.books, args.seed)
+    results = {
+        'legacy': measure(legacy, terms, args.page_size),
+        'search_backend': measure(backend, terms, args.page_size),
+    }
+    results['p95_speedup'] = results['legacy']['p95_ms'] / results['search_backend']['p95_ms']
+
+    emit('search', run_params(args), results, args.output)
+
+
+if __name__ == '__main__':
+    main()
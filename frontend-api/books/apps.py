@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class BooksConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'books'
+
+    def ready(self):
+        # Connects the reference cache and token user state invalidation signals
+        from . import authentication, reference_cache  # noqa: F401
@@ -0,0 +1,113 @@
+"""
+Async versions of the catalog read endpoints and my-borrowed, routed in
+place of the DRF views when ASYNC_READ_VIEWS is set (the ASGI deployment).
+
+DRF's views are synchronous, so these reuse its pieces directly (Request,
+filters, paginators, the fast serializers and renderer) and return the same JSON,
+but wait on the database and the cache without holding a worker thread.
+"""
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from rest_framework import exceptions, status
+from rest_framework.request import Request
+from library_common import metrics
+from library_common.pagination import KeysetPagination, wants_cursor
+from .authentication import AsyncCatalogJWTAuthentication, AsyncJWTAuthentication
+from .cache import list_cache_key
+from .conditional import book_etag, list_etag, not_modified, set_validators
+from .fast_serializers import borrowed_book_data, borrowed_rows, catalog_book_data, catalog_rows
+from .models import CatalogBook
+from .pagination import OptionalCursorPagination
+from .renderers import ORJSONRenderer
+from .views import BookListView, open_loans
+
+authenticator = AsyncJWTAuthentication()
+catalog_authenticator = AsyncCatalogJWTAuthentication()
+
+
+def render(data, status_code=status.HTTP_200_OK, headers=None):
+    return HttpResponse(ORJSONRenderer().render(data), status=status_code,
+                        content_type='application/json', headers=headers)
+
+
+def async_api_view(authenticator):
+    """GET-only, IsAuthenticated through ``authenticator``, and DRF exceptions answered the way APIView answers them."""
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            request = Request(request)
+            try:
+                credentials = await authenticator.aauthenticate(request)
+                if credentials is None:
+                    raise exceptions.NotAuthenticated()
+                request.user, request.auth = credentials
+                if request.method not in ('GET', 'HEAD'):
+                    raise exceptions.MethodNotAllowed(request.method)
+                return await view(request, *args, **kwargs)
+            except exceptions.APIException as exc:
+                headers = {}
+                if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+                    exc.status_code = status.HTTP_401_UNAUTHORIZED
+                    headers['WWW-Authenticate'] = authenticator.authenticate_header(request)
+                data = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+                return render(data, exc.status_code, headers)
+        return wrapper
+    return decorator
+
+
+@async_api_view(catalog_authenticator)
+async def book_list(request):
+    key = await sync_to_async(list_cache_key, thread_sensitive=False)(request.query_params)
+    etag = list_etag(key, ORJSONRenderer.format)
+    response = not_modified(request, etag)
+    if response is None:
+        response = await cached_page(request, key)
+    return set_validators(response, etag)
+
+
+async def cached_page(request, key):
+    # Cached without links, as BookListView.cached_page does
+    cached = await cache.aget(key)
+    metrics.record_cache(cached is not None)
+    paginator = OptionalCursorPagination()
+    if cached is not None:
+        paginator.restore_page(request, cached['page'])
+        return render(paginator.get_paginated_response(cached['results']).data)
+
+    view = BookListView(request=request, format_kwarg=None)
+    # django-filter validates ?publisher= and ?category= with a query of its own
+    queryset = await sync_to_async(view.filter_queryset)(view.get_queryset())
+    page = await paginator.apaginate_queryset(catalog_rows(queryset), request, view)
+    with metrics.serializing():
+        results = catalog_book_data(page)
+        data = paginator.get_paginated_response(results).data
+    await cache.aset(key, {'results': results, 'page': paginator.page_state()}, settings.BOOK_LIST_CACHE_TIMEOUT)
+    return render(data)
+
+
+@async_api_view(catalog_authenticator)
+async def book_detail(request, pk):
+    try:
+        book = await catalog_rows(CatalogBook.objects.all(), 'updated_at').aget(pk=pk)
+    except CatalogBook.DoesNotExist:
+        raise exceptions.NotFound()
+    etag = book_etag(book.book_id, book.updated_at, ORJSONRenderer.format)
+    response = not_modified(request, etag, book.updated_at)
+    if response is None:
+        response = render(catalog_book_data([book])[0])
+    return set_validators(response, etag, book.updated_at)
+
+
+@async_api_view(authenticator)
+async def my_borrowed_books(request):
+    borrowed_books = borrowed_rows(open_loans(request.user))
+    if wants_cursor(request):
+        paginator = KeysetPagination()
+        paginator.ordering = ('-borrowed_date', '-id')
+        page = paginator.take_page([loan async for loan in paginator.page_queryset(borrowed_books, request)])
+        return render(paginator.get_paginated_response(borrowed_book_data(page)).data)
+    return render(borrowed_book_data([loan async for loan in borrowed_books]))
@@ -1,17 +1,123 @@
+import time
+
+from asgiref.sync import sync_to_async
 from rest_framework.authentication import BaseAuthentication
 from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
 from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from library_common import inter_service_keys
+
+User = get_user_model()
+
+USER_STATE_KEY = 'auth:user-active:{}'
+REVOKED_KEY = 'auth:tokens-revoked:{}'
 
 class InterServiceAuthentication(BaseAuthentication):
+    """An active inter-service key, or an HMAC signature made with one; see inter_service_keys."""
+
     def authenticate(self, request):
-        auth_header = request.META.get('HTTP_AUTHORIZATION')
-        
-        if not auth_header or not auth_header.startswith('Token '):
+        scheme = request.META.get('HTTP_AUTHORIZATION', '').partition(' ')[0]
+        if scheme not in ('Token', 'Signature'):
             return None
-        
-        token = auth_header.split(' ')[1]
-        
-        if token != settings.INTER_SERVICE_TOKEN:
+
+        # Signatures cover the raw body, which DRF parses afterwards from the same bytes
+        if not inter_service_keys.is_authorized(request._request):
             raise AuthenticationFailed('Invalid token')
-        
-        return (None, None)
\ No newline at end of file
+
+        return (None, None)
+
+
+class AsyncJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication for the async views: same checks, and the user lookup never blocks the event loop."""
+
+    async def aauthenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+
+        # Signature and expiry checks are pure CPU; only the user lookup touches the database
+        validated_token = self.get_validated_token(raw_token)
+        user = await sync_to_async(self.get_user)(validated_token)
+        return user, validated_token
+
+
+def check_token_user(user_id, issued_at):
+    """
+    Raise AuthenticationFailed unless ``user_id`` exists, is active and has
+    not had its tokens revoked since ``issued_at`` (the token's iat claim).
+    One cache round trip when warm; the database only on a miss.
+    """
+    state_key, revoked_key = USER_STATE_KEY.format(user_id), REVOKED_KEY.format(user_id)
+    found = cache.get_many([state_key, revoked_key])
+
+    # iat has one-second resolution, so tokens from the revoking second go too
+    revoked_at = found.get(revoked_key)
+    if revoked_at is not None and issued_at <= revoked_at:
+        raise AuthenticationFailed('Token has been revoked', code='token_revoked')
+
+    is_active = found.get(state_key)
+    if is_active is None:
+        is_active = User.objects.filter(pk=user_id).values_list('is_active', flat=True).first()
+        if is_active is None:
+            raise AuthenticationFailed('User not found', code='user_not_found')
+        cache.set(state_key, is_active, settings.TOKEN_USER_STATE_TIMEOUT)
+    if not is_active:
+        raise AuthenticationFailed('User is inactive', code='user_inactive')
+
+
+def revoke_tokens(user_id):
+    # Only needs to outlive the tokens it revokes
+    timeout = int(api_settings.ACCESS_TOKEN_LIFETIME.total_seconds())
+    cache.set(REVOKED_KEY.format(user_id), int(time.time()), timeout)
+
+
+def forget_user_state(sender, instance, created=False, **kwargs):
+    user_id = instance.pk
+    # A new password, a deactivation or a deletion ends every token issued so far
+    revoke = kwargs['signal'] is post_delete or not instance.is_active or (
+        not created and getattr(instance, '_password', None) is not None
+    )
+    cache.delete(USER_STATE_KEY.format(user_id))
+
+    def after_commit():
+        if revoke:
+            revoke_tokens(user_id)
+        cache.delete(USER_STATE_KEY.format(user_id))
+    transaction.on_commit(after_commit)
+
+
+post_save.connect(forget_user_state, sender=User, dispatch_uid='token-user-state-save')
+post_delete.connect(forget_user_state, sender=User, dispatch_uid='token-user-state-delete')
+
+
+class CatalogJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication for the catalog reads. The user is a TokenUser built
+    from the verified claims, checked against the cached account state
+    instead of loaded from the database. Endpoints that act on the user's
+    own rows (borrowing, my-borrowed) keep JWTAuthentication.
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken('Token contained no recognizable user identification')
+
+        check_token_user(user_id, validated_token.get('iat', 0))
+        return TokenUser(validated_token)
+
+
+class AsyncCatalogJWTAuthentication(AsyncJWTAuthentication, CatalogJWTAuthentication):
+    """CatalogJWTAuthentication for the async views."""
@@ -0,0 +1,90 @@
+import hashlib
+import time
+from urllib.parse import urlencode
+
+from django.core.cache import cache
+from django.db import transaction
+
+GENERATION_PREFIX = 'books:gen:'
+LIST_PREFIX = 'books:list:'
+AVAILABILITY_GENERATION = GENERATION_PREFIX + 'availability'
+
+# These filters match case-insensitively, so their values are folded into one key
+CASE_INSENSITIVE_PARAMS = {'search', 'publisher_name', 'category_name'}
+
+
+def publisher_generation(publisher_id):
+    return f'{GENERATION_PREFIX}publisher:{publisher_id}'
+
+
+def category_generation(category_id):
+    return f'{GENERATION_PREFIX}category:{category_id}'
+
+
+def normalize_params(query_params):
+    params = []
+    for name, values in query_params.lists():
+        for value in values:
+            value = value.strip()
+            if value:
+                params.append((name, value.lower() if name in CASE_INSENSITIVE_PARAMS else value))
+    return sorted(params)
+
+
+def filter_pk(query_params, name):
+    # The id django-filter will filter on: it reads the last value and casts it
+    # as the primary key lookup does ('01', ' 1' and '+1' are all 1); None when
+    # the filter is empty or invalid (an invalid one is answered with a 400)
+    value = query_params.get(name)
+    if value in (None, ''):
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        return None
+
+
+def list_generations(query_params):
+    # A page filtered to one publisher/category only changes with that publisher/category;
+    # anything else (name filters, search, the full list) follows the whole catalog
+    keys = []
+    publisher_id = filter_pk(query_params, 'publisher')
+    if publisher_id is not None:
+        keys.append(publisher_generation(publisher_id))
+    category_id = filter_pk(query_params, 'category')
+    if category_id is not None:
+        keys.append(category_generation(category_id))
+    return keys or [AVAILABILITY_GENERATION]
+
+
+def get_generations(keys):
+    generations = cache.get_many(keys)
+    missing = [key for key in keys if key not in generations]
+    if missing:
+        # Seed evicted or new counters with a fresh value so an old page is never reused
+        for key in missing:
+            cache.add(key, time.time_ns(), timeout=None)
+        generations.update(cache.get_many(missing))
+    return [generations.get(key, 0) for key in keys]
+
+
+def list_cache_key(query_params):
+    params = normalize_params(query_params)
+    generations = get_generations(list_generations(query_params))
+    digest = hashlib.sha1(urlencode(params).encode()).hexdigest()
+    return LIST_PREFIX + digest + ':' + '.'.join(str(generation) for generation in generations)
+
+
+def bump_generations(keys):
+    for key in keys:
+        cache.add(key, time.time_ns(), timeout=None)
+        cache.incr(key)
+
+
+def invalidate_books(publisher_ids=(), category_ids=()):
+    keys = [AVAILABILITY_GENERATION]
+    keys += [publisher_generation(publisher_id) for publisher_id in set(publisher_ids)]
+    keys += [category_generation(category_id) for category_id in set(category_ids)]
+    # Bump only once the change is visible, so a page rebuilt under the new
+    # generation can never be built from the old rows
+    transaction.on_commit(lambda: bump_generations(keys))
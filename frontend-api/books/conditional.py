@@ -0,0 +1,40 @@
+"""
+ETag and Last-Modified validators for the catalog reads, so clients that
+poll them get 304 Not Modified instead of the same body again.
+
+A book's validators come from its catalog row's ``updated_at``, read by the
+same primary key lookup that serves the body. A list page has no row to
+date (a deleted book never raises a max(updated_at)), so its ETag is taken
+from the list cache key, which already changes with every generation the
+page depends on; deciding a 304 costs no query at all. The page's links are
+built from each request's own URL, so its body only differs between URLs,
+which clients key their caches on anyway.
+"""
+import hashlib
+
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+
+def list_etag(cache_key, renderer_format):
+    return '"' + hashlib.sha1(f'{cache_key}:{renderer_format}'.encode()).hexdigest() + '"'
+
+
+def book_etag(book_id, updated_at, renderer_format):
+    return f'"book-{book_id}-{updated_at.timestamp():.6f}-{renderer_format}"'
+
+
+def not_modified(request, etag, last_modified=None):
+    """The 304 (or 412) answer to a conditional request these validators satisfy, or None."""
+    return get_conditional_response(
+        request, etag=etag, last_modified=int(last_modified.timestamp()) if last_modified else None
+    )
+
+
+def set_validators(response, etag, last_modified=None):
+    response.headers['ETag'] = etag
+    if last_modified:
+        response.headers['Last-Modified'] = http_date(last_modified.timestamp())
+    # Clients may keep the body but must revalidate before reusing it
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
@@ -0,0 +1,85 @@
+"""
+Hand-written equivalents of CatalogBookSerializer (itself BookSerializer's
+output) and BorrowedBookSerializer for the hot read endpoints.
+
+They build the response dicts straight from ``values_list(..., named=True)``
+rows, skipping model instances and DRF's per-field machinery. Dates and
+datetimes still go through DRF's own fields, so formatting (time zone, the
+trailing ``Z``) cannot drift. BookSerializerParityTestCase checks that the
+rendered bytes match the declarative serializers exactly; change both
+together.
+"""
+from rest_framework import serializers
+
+# Named rows so KeysetPagination can read its ordering fields off them
+CATALOG_COLUMNS = ('book_id', 'title', 'author', 'isbn', 'publisher_id', 'publisher_name', 'category_id',
+                   'category_name', 'published_date', 'description', 'is_available')
+
+BORROWED_COLUMNS = ('id', 'book_id', 'book__title', 'book__author', 'book__isbn', 'book__publisher',
+                    'book__publisher__name', 'book__category', 'book__category__name',
+                    'book__published_date', 'book__description', 'book__is_available',
+                    'borrowed_date', 'return_date', 'actual_return_date')
+
+date_field = serializers.DateField()
+datetime_field = serializers.DateTimeField()
+
+
+def catalog_rows(queryset, *extra):
+    # ``extra`` columns go after CATALOG_COLUMNS, where catalog_book_data ignores them
+    return queryset.values_list(*CATALOG_COLUMNS, *extra, named=True)
+
+
+def borrowed_rows(queryset):
+    return queryset.values_list(*BORROWED_COLUMNS, named=True)
+
+
+def catalog_book_data(rows):
+    """CatalogBookSerializer(many=True).data for ``catalog_rows`` rows (extra columns are left out)."""
+    to_date = date_field.to_representation
+    return [
+        {
+            'id': book_id,
+            'title': title,
+            'author': author,
+            'isbn': isbn,
+            'publisher': publisher_id,
+            'publisher_name': publisher_name,
+            'category': category_id,
+            'category_name': category_name,
+            'published_date': to_date(published_date),
+            'description': description,
+            'is_available': is_available,
+        }
+        for (book_id, title, author, isbn, publisher_id, publisher_name, category_id, category_name,
+             published_date, description, is_available, *_) in rows
+    ]
+
+
+def borrowed_book_data(rows):
+    """BorrowedBookSerializer(many=True).data for ``borrowed_rows`` rows."""
+    to_date = date_field.to_representation
+    to_datetime = datetime_field.to_representation
+    return [
+        {
+            'id': loan_id,
+            'book': book_id,
+            'book_details': {
+                'id': book_id,
+                'title': title,
+                'author': author,
+                'isbn': isbn,
+                'publisher': publisher_id,
+                'publisher_name': publisher_name,
+                'category': category_id,
+                'category_name': category_name,
+                'published_date': to_date(published_date),
+                'description': description,
+                'is_available': is_available,
+            },
+            'borrowed_date': to_datetime(borrowed_date),
+            'return_date': to_datetime(return_date),
+            'actual_return_date': to_datetime(actual_return_date),
+        }
+        for (loan_id, book_id, title, author, isbn, publisher_id, publisher_name, category_id, category_name,
+             published_date, description, is_available, borrowed_date, return_date, actual_return_date) in rows
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 4.2.7 on 2026-10-18 03:59
+
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+# PostgreSQL only: other backends keep the plain icontains search
+FORWARD_SQL = [
+    """
+    CREATE TRIGGER books_book_search_vector_update
+    BEFORE INSERT OR UPDATE OF title, author, isbn ON books_book
+    FOR EACH ROW EXECUTE FUNCTION
+    tsvector_update_trigger(search_vector, 'pg_catalog.simple', title, author, isbn)
+    """,
+    """
+    UPDATE books_book SET search_vector = to_tsvector(
+        'pg_catalog.simple', coalesce(title, '') || ' ' || coalesce(author, '') || ' ' || coalesce(isbn, '')
+    )
+    """,
+    'CREATE INDEX books_book_search_vector_gin ON books_book USING gin (search_vector)',
+    'CREATE INDEX books_book_title_trgm ON books_book USING gin (title gin_trgm_ops)',
+    'CREATE INDEX books_book_author_trgm ON books_book USING gin (author gin_trgm_ops)',
+]
+
+REVERSE_SQL = [
+    'DROP INDEX IF EXISTS books_book_author_trgm',
+    'DROP INDEX IF EXISTS books_book_title_trgm',
+    'DROP INDEX IF EXISTS books_book_search_vector_gin',
+    'DROP TRIGGER IF EXISTS books_book_search_vector_update ON books_book',
+]
+
+
+def run_postgres_sql(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0002_initial'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='book',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(run_postgres_sql(FORWARD_SQL), run_postgres_sql(REVERSE_SQL)),
+    ]
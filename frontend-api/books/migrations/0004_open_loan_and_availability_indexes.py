@@ -0,0 +1,37 @@
+# Generated by Django 4.2.7 on 2026-10-18 04:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0003_book_search'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='borrowedbook',
+            name='borrow_user_recent_idx',
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(condition=models.Q(('is_available', True)), fields=['id'], name='book_available_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(condition=models.Q(('is_available', True)), fields=['publisher', 'id'], name='book_available_publisher_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(condition=models.Q(('is_available', True)), fields=['category', 'id'], name='book_available_category_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='borrowedbook',
+            index=models.Index(condition=models.Q(('actual_return_date__isnull', True)), fields=['user', '-borrowed_date', '-id'], name='borrow_open_user_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='borrowedbook',
+            index=models.Index(condition=models.Q(('actual_return_date__isnull', True)), fields=['book'], name='borrow_open_book_idx'),
+        ),
+    ]
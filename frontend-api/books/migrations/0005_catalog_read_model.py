@@ -0,0 +1,144 @@
+# Generated by Django 4.2.7 on 2026-10-18 04:20
+
+import django.contrib.postgres.search
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+# The search vector, its trigger and the trigram indexes move from books_book
+# to the catalog table; PostgreSQL only, as in migration 0003
+CATALOG_SEARCH_SQL = [
+    """
+    CREATE TRIGGER books_catalogbook_search_vector_update
+    BEFORE INSERT OR UPDATE OF title, author, isbn ON books_catalogbook
+    FOR EACH ROW EXECUTE FUNCTION
+    tsvector_update_trigger(search_vector, 'pg_catalog.simple', title, author, isbn)
+    """,
+    'CREATE INDEX books_catalogbook_search_vector_gin ON books_catalogbook USING gin (search_vector)',
+    'CREATE INDEX books_catalogbook_title_trgm ON books_catalogbook USING gin (title gin_trgm_ops)',
+    'CREATE INDEX books_catalogbook_author_trgm ON books_catalogbook USING gin (author gin_trgm_ops)',
+]
+
+DROP_CATALOG_SEARCH_SQL = [
+    'DROP INDEX IF EXISTS books_catalogbook_author_trgm',
+    'DROP INDEX IF EXISTS books_catalogbook_title_trgm',
+    'DROP INDEX IF EXISTS books_catalogbook_search_vector_gin',
+    'DROP TRIGGER IF EXISTS books_catalogbook_search_vector_update ON books_catalogbook',
+]
+
+BOOK_SEARCH_SQL = [
+    """
+    CREATE TRIGGER books_book_search_vector_update
+    BEFORE INSERT OR UPDATE OF title, author, isbn ON books_book
+    FOR EACH ROW EXECUTE FUNCTION
+    tsvector_update_trigger(search_vector, 'pg_catalog.simple', title, author, isbn)
+    """,
+    """
+    UPDATE books_book SET search_vector = to_tsvector(
+        'pg_catalog.simple', coalesce(title, '') || ' ' || coalesce(author, '') || ' ' || coalesce(isbn, '')
+    )
+    """,
+    'CREATE INDEX books_book_search_vector_gin ON books_book USING gin (search_vector)',
+    'CREATE INDEX books_book_title_trgm ON books_book USING gin (title gin_trgm_ops)',
+    'CREATE INDEX books_book_author_trgm ON books_book USING gin (author gin_trgm_ops)',
+]
+
+DROP_BOOK_SEARCH_SQL = [
+    'DROP INDEX IF EXISTS books_book_author_trgm',
+    'DROP INDEX IF EXISTS books_book_title_trgm',
+    'DROP INDEX IF EXISTS books_book_search_vector_gin',
+    'DROP TRIGGER IF EXISTS books_book_search_vector_update ON books_book',
+]
+
+# Runs after the trigger exists, so PostgreSQL fills in the search vectors as well
+BACKFILL_SQL = """
+    INSERT INTO books_catalogbook (
+        book_id, title, author, isbn, publisher_id, publisher_name, category_id, category_name,
+        published_date, description, is_available, created_at, updated_at
+    )
+    SELECT b.id, b.title, b.author, b.isbn, b.publisher_id, p.name, b.category_id, c.name,
+           b.published_date, b.description, b.is_available, b.created_at, b.updated_at
+    FROM books_book b
+    JOIN books_publisher p ON p.id = b.publisher_id
+    JOIN books_category c ON c.id = b.category_id
+"""
+
+
+def run_postgres_sql(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0004_open_loan_and_availability_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogBook',
+            fields=[
+                ('book', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='catalog_entry', serialize=False, to='books.book')),
+                ('title', models.CharField(max_length=200)),
+                ('author', models.CharField(max_length=100)),
+                ('isbn', models.CharField(db_index=True, max_length=13)),
+                ('publisher_name', models.CharField(max_length=100)),
+                ('category_name', models.CharField(max_length=50)),
+                ('published_date', models.DateField()),
+                ('description', models.TextField(blank=True)),
+                ('is_available', models.BooleanField(default=True)),
+                ('search_vector', django.contrib.postgres.search.SearchVectorField(editable=False, null=True)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+            ],
+            options={
+                'ordering': ['pk'],
+            },
+        ),
+        migrations.AddField(
+            model_name='catalogbook',
+            name='category',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='books.category'),
+        ),
+        migrations.AddField(
+            model_name='catalogbook',
+            name='publisher',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='books.publisher'),
+        ),
+        migrations.RunPython(run_postgres_sql(CATALOG_SEARCH_SQL), run_postgres_sql(DROP_CATALOG_SEARCH_SQL)),
+        migrations.RunSQL(BACKFILL_SQL, migrations.RunSQL.noop),
+        migrations.AddIndex(
+            model_name='catalogbook',
+            index=models.Index(condition=models.Q(('is_available', True)), fields=['book'], name='catalog_available_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='catalogbook',
+            index=models.Index(condition=models.Q(('is_available', True)), fields=['publisher', 'book'], name='catalog_publisher_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='catalogbook',
+            index=models.Index(condition=models.Q(('is_available', True)), fields=['category', 'book'], name='catalog_category_idx'),
+        ),
+        migrations.RunPython(run_postgres_sql(DROP_BOOK_SEARCH_SQL), run_postgres_sql(BOOK_SEARCH_SQL)),
+        migrations.RemoveIndex(
+            model_name='book',
+            name='book_available_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='book',
+            name='book_available_publisher_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='book',
+            name='book_available_category_idx',
+        ),
+        migrations.RemoveField(
+            model_name='book',
+            name='search_vector',
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.7 on 2026-10-18 05:33
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0006_book_tombstone'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='booktombstone',
+            name='deleted_at',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now),
+        ),
+    ]
@@ -1,10 +1,14 @@
-from django.db import models
+from django.contrib.postgres.search import SearchVectorField
+from django.db import models, transaction
 from django.contrib.auth import get_user_model
 from django.utils import timezone
-from datetime import timedelta
+from .cache import invalidate_books
 
 User = get_user_model()
 
+class BookNotAvailable(Exception):
+    pass
+
 class Publisher(models.Model):
     name = models.CharField(max_length=100, unique=True)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -33,12 +37,110 @@ class Book(models.Model):
     published_date = models.DateField()
     description = models.TextField(blank=True)
     is_available = models.BooleanField(default=True)
+    # Outbox sequence of the last admin change applied to this row
+    sync_sequence = models.BigIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.title
 
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            CatalogBook.refresh(Book.objects.filter(pk=self.pk))
+
+class BookTombstone(models.Model):
+    """
+    Outbox sequence of the delete that removed a book, kept after the row is
+    gone so an older upsert of the same ISBN, retried or reordered, cannot
+    bring it back. Purged after TOMBSTONE_RETENTION: the admin relay sends an
+    ISBN's changes in order and drops the older ones with each send, so only
+    requests still in flight can arrive out of order.
+    """
+    isbn = models.CharField(max_length=13, primary_key=True)
+    sync_sequence = models.BigIntegerField()
+    deleted_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return f'{self.isbn} deleted at {self.sync_sequence}'
+
+class CatalogBook(models.Model):
+    """
+    Read model behind the catalog endpoints: one row per book with the
+    publisher and category names and the search vector already in place, so
+    listing, filtering and searching never join. Written only alongside Book
+    (sync endpoints, borrowing and returning); deleted with it.
+    """
+    COPIED_FIELDS = ['title', 'author', 'isbn', 'publisher', 'publisher_name', 'category', 'category_name',
+                     'published_date', 'description', 'is_available', 'created_at', 'updated_at']
+
+    book = models.OneToOneField(Book, on_delete=models.CASCADE, primary_key=True, related_name='catalog_entry')
+    title = models.CharField(max_length=200)
+    author = models.CharField(max_length=100)
+    isbn = models.CharField(max_length=13, db_index=True)
+    # Ids only, for the ?publisher= and ?category= filters; no constraint to check on write
+    publisher = models.ForeignKey(Publisher, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    publisher_name = models.CharField(max_length=100)
+    category = models.ForeignKey(Category, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    category_name = models.CharField(max_length=50)
+    published_date = models.DateField()
+    description = models.TextField(blank=True)
+    is_available = models.BooleanField(default=True)
+    # Maintained by a database trigger on PostgreSQL (see migration 0005)
+    search_vector = SearchVectorField(null=True, editable=False)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+
+    class Meta:
+        ordering = ['pk']
+        indexes = [
+            # The catalog only lists available books, paged by id and optionally
+            # narrowed to one publisher or category
+            models.Index(fields=['book'], condition=models.Q(is_available=True), name='catalog_available_idx'),
+            models.Index(fields=['publisher', 'book'], condition=models.Q(is_available=True),
+                         name='catalog_publisher_idx'),
+            models.Index(fields=['category', 'book'], condition=models.Q(is_available=True),
+                         name='catalog_category_idx'),
+        ]
+
+    def __str__(self):
+        return self.title
+
+    @classmethod
+    def refresh(cls, books):
+        """Rewrite the catalog rows of ``books`` (a Book queryset); names come from the lookup caches."""
+        from .reference_cache import categories, publishers
+
+        books = list(books)
+        publisher_names = publishers.names_for({book.publisher_id for book in books})
+        category_names = categories.names_for({book.category_id for book in books})
+        rows = [
+            cls(
+                book_id=book.id,
+                title=book.title,
+                author=book.author,
+                isbn=book.isbn,
+                publisher_id=book.publisher_id,
+                publisher_name=publisher_names[book.publisher_id],
+                category_id=book.category_id,
+                category_name=category_names[book.category_id],
+                published_date=book.published_date,
+                description=book.description,
+                is_available=book.is_available,
+                created_at=book.created_at,
+                updated_at=book.updated_at,
+            )
+            for book in books
+        ]
+        if rows:
+            cls.objects.bulk_create(rows, update_conflicts=True, unique_fields=['book'],
+                                    update_fields=cls.COPIED_FIELDS)
+
+    @classmethod
+    def set_available(cls, book_ids, is_available, updated_at):
+        cls.objects.filter(book_id__in=book_ids).update(is_available=is_available, updated_at=updated_at)
+
 class BorrowedBook(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='borrowed_books')
     book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='borrowings')
@@ -49,18 +151,105 @@ class BorrowedBook(models.Model):
     class Meta:
         ordering = ['-borrowed_date']
         unique_together = ['user', 'book', 'actual_return_date']
+        indexes = [
+            # A user's open loans, newest first (also the keyset pagination order)
+            models.Index(fields=['user', '-borrowed_date', '-id'], condition=models.Q(actual_return_date__isnull=True),
+                         name='borrow_open_user_idx'),
+            # Open loan of a book, looked up on every return
+            models.Index(fields=['book'], condition=models.Q(actual_return_date__isnull=True),
+                         name='borrow_open_book_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.email} - {self.book.title}"
 
     def save(self, *args, **kwargs):
         if not self.pk:  # New borrowing
+            with transaction.atomic():
+                self.claim_book()
+                super().save(*args, **kwargs)
+            if not BorrowedBook.book.is_cached(self):
+                self.book = Book.objects.select_related('publisher', 'category').get(pk=self.book_id)
             self.book.is_available = False
-            self.book.save()
+            invalidate_books(publisher_ids=[self.book.publisher_id], category_ids=[self.book.category_id])
+            return
         super().save(*args, **kwargs)
 
+    def claim_book(self):
+        # A single conditional UPDATE: of any number of concurrent borrowers
+        # exactly one sees a matched row, with no read-then-write window
+        now = timezone.now()
+        claimed = Book.objects.filter(pk=self.book_id, is_available=True).update(
+            is_available=False, updated_at=now
+        )
+        if not claimed:
+            raise BookNotAvailable(self.book_id)
+        CatalogBook.set_available([self.book_id], False, now)
+
     def return_book(self):
         self.actual_return_date = timezone.now()
+        with transaction.atomic():
+            Book.objects.filter(pk=self.book_id).update(is_available=True, updated_at=self.actual_return_date)
+            CatalogBook.set_available([self.book_id], True, self.actual_return_date)
+            self.save(update_fields=['actual_return_date'])
         self.book.is_available = True
-        self.book.save()
-        self.save()
\ No newline at end of file
+        invalidate_books(publisher_ids=[self.book.publisher_id], category_ids=[self.book.category_id])
+
+    @classmethod
+    def borrow_many(cls, user, book_ids, return_date):
+        """
+        Borrow every available book in ``book_ids`` for ``user`` with a fixed
+        number of statements. Returns the new loans and the ids that could not
+        be borrowed.
+        """
+        with transaction.atomic():
+            books = list(
+                Book.objects.select_for_update(of=('self',))
+                .filter(id__in=book_ids, is_available=True)
+                .select_related('publisher', 'category')
+            )
+            now = timezone.now()
+            Book.objects.filter(id__in=[book.id for book in books]).update(is_available=False, updated_at=now)
+            CatalogBook.set_available([book.id for book in books], False, now)
+            loans = cls.objects.bulk_create([
+                cls(user=user, book=book, return_date=return_date) for book in books
+            ])
+        for book in books:
+            book.is_available = False
+        invalidate_books(
+            publisher_ids=[book.publisher_id for book in books],
+            category_ids=[book.category_id for book in books]
+        )
+        claimed = {book.id for book in books}
+        return loans, [book_id for book_id in book_ids if book_id not in claimed]
+
+    @classmethod
+    def return_many(cls, book_ids, user=None):
+        """
+        Close the open loans on ``book_ids`` (only ``user``'s when given) with a
+        fixed number of statements. Returns the closed loans and the ids that
+        had no open loan.
+        """
+        now = timezone.now()
+        loans = cls.objects.select_for_update(of=('self',)).filter(
+            book_id__in=book_ids, actual_return_date__isnull=True
+        ).select_related('book__publisher', 'book__category')
+        if user is not None:
+            loans = loans.filter(user=user)
+
+        with transaction.atomic():
+            loans = list(loans)
+            cls.objects.filter(id__in=[loan.id for loan in loans]).update(actual_return_date=now)
+            Book.objects.filter(id__in=[loan.book_id for loan in loans]).update(
+                is_available=True, updated_at=now
+            )
+            CatalogBook.set_available([loan.book_id for loan in loans], True, now)
+        for loan in loans:
+            loan.actual_return_date = now
+            loan.book.is_available = True
+        invalidate_books(
+            publisher_ids=[loan.book.publisher_id for loan in loans],
+            category_ids=[loan.book.category_id for loan in loans]
+        )
+        returned = {loan.book_id for loan in loans}
+        return loans, [book_id for book_id in book_ids if book_id not in returned]
@@ -0,0 +1,69 @@
+from django.core.paginator import InvalidPage
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.settings import api_settings
+
+from library_common.pagination import KeysetPagination, wants_cursor
+
+
+class OptionalCursorPagination(PageNumberPagination):
+    """Page numbers by default; keyset pages when the client sends ?pagination=cursor."""
+
+    def keyset_for(self, request):
+        if not wants_cursor(request):
+            return None
+        # Keyset pages are ordered by the view's keyset_ordering, which would
+        # throw away the rank order search results come back in
+        if request.query_params.get(api_settings.SEARCH_PARAM, '').strip():
+            raise ValidationError({'pagination': ['Cursor pagination cannot be combined with search.']})
+        return KeysetPagination()
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = self.keyset_for(request)
+        if self.keyset is not None:
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """paginate_queryset for async views: the same pages, read with the async ORM."""
+        self.keyset = self.keyset_for(request)
+        if self.keyset is not None:
+            page = self.keyset.page_queryset(queryset, request, view)
+            return self.keyset.take_page([row async for row in page])
+
+        paginator = self.django_paginator_class(queryset, self.get_page_size(request))
+        # Counted here so the paginator never runs its blocking count()
+        paginator.count = await queryset.acount()
+        page_number = self.get_page_number(request, paginator)
+        try:
+            self.page = paginator.page(page_number)
+        except InvalidPage as exc:
+            raise NotFound(self.invalid_page_message.format(page_number=page_number, message=str(exc)))
+        self.request = request
+        self.page.object_list = [row async for row in self.page.object_list]
+        return self.page.object_list
+
+    def page_state(self):
+        """What the current page's links are built from, to cache along with its results."""
+        if self.keyset is not None:
+            return {'cursor': self.keyset.next_position}
+        return {'number': self.page.number, 'size': self.page.paginator.per_page, 'count': self.page.paginator.count}
+
+    def restore_page(self, request, state):
+        """Undo ``page_state`` for ``request``, whose URL the links are then built from."""
+        self.request = request
+        if 'cursor' in state:
+            self.keyset = KeysetPagination()
+            self.keyset.request = request
+            self.keyset.has_next = state['cursor'] is not None
+            self.keyset.next_position = state['cursor']
+            return
+        self.keyset = None
+        paginator = self.django_paginator_class([], state['size'])
+        paginator.count = state['count']
+        self.page = paginator.page(state['number'])
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
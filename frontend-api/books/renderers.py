@@ -0,0 +1,29 @@
+import orjson
+from library_common import metrics
+
+# orjson would format these its own way; passed through to ``default``, which
+# there is none of, they raise and fall back to the stock renderer instead
+ORJSON_OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+
+
+class ORJSONRenderer(metrics.TimedJSONRenderer):
+    """
+    JSONRenderer encoding with orjson. For str, int, bool, None, lists and
+    dicts (what the fast serializers produce) the bytes are the same as
+    JSONRenderer's; anything else orjson cannot encode falls back to it, as
+    do pretty-printed responses. Floats are not guaranteed to match, so this
+    is only used by views that render none.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        with metrics.serializing():
+            if self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+                return super().render(data, accepted_media_type, renderer_context)
+            try:
+                ret = orjson.dumps(data, option=ORJSON_OPTIONS)
+            except orjson.JSONEncodeError:
+                return super().render(data, accepted_media_type, renderer_context)
+            # JSONRenderer escapes these two so the output is also valid JavaScript
+            return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
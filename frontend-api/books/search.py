@@ -0,0 +1,54 @@
+import re
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramSimilarity
+from django.db import connection
+from django.db.models import F, Q
+from rest_framework import filters
+
+ISBN_RE = re.compile(r'^(?:\d{9}[\dX]|\d{13})$')
+WORD_RE = re.compile(r'\w+')
+
+
+def normalize_isbn(term):
+    compact = re.sub(r'[\s-]', '', term).upper()
+    return compact if ISBN_RE.match(compact) else None
+
+
+def prefix_query(term):
+    # Every word must match as a word prefix, close to what icontains users expect
+    words = WORD_RE.findall(term.lower())
+    if not words:
+        return None
+    return SearchQuery(' & '.join(f'{word}:*' for word in words), search_type='raw', config='simple')
+
+
+def ranked_search(queryset, term):
+    # tsvector prefix match for whole words, trigram similarity for typos and
+    # fragments; both are served by GIN indexes (migration 0005)
+    query = prefix_query(term)
+    matches = Q(title__trigram_similar=term) | Q(author__trigram_similar=term)
+    rank = TrigramSimilarity('title', term) + TrigramSimilarity('author', term)
+    if query is not None:
+        matches |= Q(search_vector=query)
+        rank = rank + SearchRank(F('search_vector'), query)
+    return queryset.filter(matches).annotate(search_rank=rank).order_by('-search_rank', 'pk')
+
+
+class BookSearchFilter(filters.SearchFilter):
+    """
+    Exact-ISBN fast path everywhere, ranked full-text/trigram search on
+    PostgreSQL, and the stock SearchFilter over ``search_fields`` elsewhere.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        term = request.query_params.get(self.search_param, '').strip()
+        if not term:
+            return queryset
+
+        isbn = normalize_isbn(term)
+        if isbn:
+            return queryset.filter(isbn=isbn)
+
+        if connection.vendor != 'postgresql':
+            return super().filter_queryset(request, queryset, view)
+        return ranked_search(queryset, term)
@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import Book, Publisher, Category, BorrowedBook
+from .models import Book, CatalogBook, Publisher, Category, BorrowedBook, BookNotAvailable, User
 from datetime import timedelta
 from django.utils import timezone
 
@@ -23,34 +23,74 @@ class BookSerializer(serializers.ModelSerializer):
                   'category', 'category_name', 'published_date', 'description', 
                   'is_available']
 
+class CatalogBookSerializer(serializers.ModelSerializer):
+    # Same output as BookSerializer, read from the denormalized catalog table
+    id = serializers.IntegerField(source='book_id', read_only=True)
+
+    class Meta:
+        model = CatalogBook
+        fields = BookSerializer.Meta.fields
+
 class BorrowBookSerializer(serializers.Serializer):
     book_id = serializers.IntegerField()
     days = serializers.IntegerField(min_value=1, max_value=30)
     
-    def validate_book_id(self, value):
-        try:
-            book = Book.objects.get(id=value)
-            if not book.is_available:
-                raise serializers.ValidationError("This book is not available for borrowing.")
-        except Book.DoesNotExist:
-            raise serializers.ValidationError("Book not found.")
-        return value
-    
     def create(self, validated_data):
-        book = Book.objects.get(id=validated_data['book_id'])
+        # Availability is checked by the claiming UPDATE itself, not read up front
         return_date = timezone.now() + timedelta(days=validated_data['days'])
-        
-        borrowed_book = BorrowedBook.objects.create(
-            user=self.context['request'].user,
-            book=book,
-            return_date=return_date
-        )
+        try:
+            borrowed_book = BorrowedBook.objects.create(
+                user=self.context['request'].user,
+                book_id=validated_data['book_id'],
+                return_date=return_date
+            )
+        except BookNotAvailable:
+            if Book.objects.filter(id=validated_data['book_id']).exists():
+                raise serializers.ValidationError({'book_id': ["This book is not available for borrowing."]})
+            raise serializers.ValidationError({'book_id': ["Book not found."]})
         return borrowed_book
 
+# Largest stack a circulation desk can scan in one request
+MAX_BULK_BOOKS = 100
+
+class BulkBorrowSerializer(serializers.Serializer):
+    book_ids = serializers.ListField(child=serializers.IntegerField(), min_length=1, max_length=MAX_BULK_BOOKS)
+    days = serializers.IntegerField(min_value=1, max_value=30)
+    # Staff only: the patron to borrow for (the caller by default)
+    user_id = serializers.PrimaryKeyRelatedField(
+        queryset=User.objects.filter(is_active=True), required=False, source='patron'
+    )
+
+class BulkReturnSerializer(serializers.Serializer):
+    book_ids = serializers.ListField(child=serializers.IntegerField(), min_length=1, max_length=MAX_BULK_BOOKS)
+
 class BorrowedBookSerializer(serializers.ModelSerializer):
     book_details = BookSerializer(source='book', read_only=True)
     
     class Meta:
         model = BorrowedBook
         fields = ['id', 'book', 'book_details', 'borrowed_date', 
-                  'return_date', 'actual_return_date']
\ No newline at end of file
+                  'return_date', 'actual_return_date']
+
+class BookSyncSerializer(serializers.Serializer):
+    title = serializers.CharField(max_length=200)
+    author = serializers.CharField(max_length=100)
+    isbn = serializers.CharField(max_length=13)
+    publisher_name = serializers.CharField(max_length=100)
+    category_name = serializers.CharField(max_length=50)
+    published_date = serializers.DateField()
+    description = serializers.CharField(allow_blank=True, required=False, default='')
+    is_available = serializers.BooleanField(required=False, default=True)
+
+
+
+class BookChangeSerializer(serializers.Serializer):
+    operation = serializers.ChoiceField(choices=['upsert', 'delete'])
+    sequence = serializers.IntegerField(min_value=1)
+    isbn = serializers.CharField(max_length=13)
+    book = BookSyncSerializer(required=False)
+
+    def validate(self, attrs):
+        if attrs['operation'] == 'upsert' and 'book' not in attrs:
+            raise serializers.ValidationError("Upserts must include the book.")
+        return attrs
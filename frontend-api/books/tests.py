@@ -1,39 +1,89 @@
-from django.test import TestCase
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from unittest.mock import MagicMock, patch
+
+import requests
+
+from django.core.cache import cache
+from django.db import connection
+from asgiref.sync import async_to_sync
+from django.test import AsyncRequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth import get_user_model
 from rest_framework.test import APIClient
 from rest_framework import status
-from .models import Book, Publisher, Category, BorrowedBook
+from rest_framework.renderers import JSONRenderer
+from rest_framework_simplejwt.tokens import AccessToken
+from . import async_views
+from .fast_serializers import borrowed_book_data, borrowed_rows, catalog_book_data, catalog_rows
+from .models import Book, BookTombstone, CatalogBook, Publisher, Category, BorrowedBook
+from .reference_cache import LookupCache, apply_invalidation, clear_all, publishers
+from .renderers import ORJSONRenderer
+from .serializers import BookSerializer, BorrowedBookSerializer, CatalogBookSerializer
+from benchmarks import micro
+from benchmarks.borrow_concurrency import hammer
+from library_common.benchmarks.compare import compare
+from benchmarks.data import generate_catalog, generate_loans
+from benchmarks.load import sync_payload
+from library_common import metrics
+from library_common import inter_service_keys
+from library_common.inter_service_keys import SignatureAuth
+from library_common.query_budget import QueryBudgetMixin
 from datetime import date, timedelta
 from django.utils import timezone
 
 User = get_user_model()
 
+
+def create_reader(email='reader@example.com', **fields):
+    return User.objects.create_user(username=email, email=email, password='testpass123', **fields)
+
+
+def create_book(publisher, category, **fields):
+    return Book.objects.create(**{
+        'title': 'Test Book',
+        'author': 'Test Author',
+        'isbn': '1234567890123',
+        'publisher': publisher,
+        'category': category,
+        'published_date': date.today(),
+        **fields
+    })
+
+
+def create_books(count, publisher, category):
+    # bulk_create skips Book.save, so the catalog rows are written here
+    books = Book.objects.bulk_create([
+        Book(
+            title=f'Book {i}',
+            author='Test Author',
+            isbn=str(1000000000000 + i),
+            publisher=publisher,
+            category=category,
+            published_date=date.today()
+        )
+        for i in range(count)
+    ])
+    CatalogBook.refresh(Book.objects.filter(id__in=[book.id for book in books]))
+    return books
+
+
 class BookAPITestCase(TestCase):
     def setUp(self):
+        cache.clear()
         self.client = APIClient()
         
         # Create test user
-        self.user = User.objects.create_user(
-            username='testuser@example.com',
-            email='testuser@example.com',
-            password='testpass123',
-            first_name='Test',
-            last_name='User'
-        )
+        self.user = create_reader('testuser@example.com', first_name='Test', last_name='User')
         
         # Create test data
         self.publisher = Publisher.objects.create(name='Test Publisher')
         self.category = Category.objects.create(name='Fiction')
-        
-        self.book = Book.objects.create(
-            title='Test Book',
-            author='Test Author',
-            isbn='1234567890123',
-            publisher=self.publisher,
-            category=self.category,
-            published_date=date.today(),
-            description='Test description'
-        )
+        self.book = create_book(self.publisher, self.category, description='Test description')
         
         # Authenticate client
         self.client.force_authenticate(user=self.user)
@@ -59,6 +109,18 @@ class BookAPITestCase(TestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(len(response.data['results']), 1)
     
+    def test_search_books(self):
+        response = self.client.get('/api/books/', {'search': 'test book'})
+        self.assertEqual(len(response.data['results']), 1)
+        response = self.client.get('/api/books/', {'search': 'missing'})
+        self.assertEqual(len(response.data['results']), 0)
+
+    def test_search_by_exact_isbn_uses_isbn_lookup(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/books/', {'search': '123-4567-890-123'})
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertNotIn('LIKE', ' '.join(query['sql'] for query in queries))
+
     def test_borrow_book(self):
         data = {
             'book_id': self.book.id,
@@ -81,6 +143,21 @@ class BookAPITestCase(TestCase):
             delta=60  # 1 minute tolerance
         )
     
+    def test_borrow_claims_book_with_minimal_statements(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post('/api/books/borrow/', {'book_id': self.book.id, 'days': 7})
+        statements = [q['sql'] for q in queries if 'SAVEPOINT' not in q['sql']]
+        # Claim, mirror availability into the catalog, insert the loan, load the book
+        self.assertEqual(len(statements), 4)
+        self.assertTrue(statements[0].startswith('UPDATE'))
+        self.assertIn('books_catalogbook', statements[1])
+        self.assertTrue(statements[2].startswith('INSERT'))
+
+    def test_cannot_borrow_missing_book(self):
+        response = self.client.post('/api/books/borrow/', {'book_id': self.book.id + 100, 'days': 7})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['book_id'], ['Book not found.'])
+
     def test_cannot_borrow_unavailable_book(self):
         # Make book unavailable
         self.book.is_available = False
@@ -106,6 +183,509 @@ class BookAPITestCase(TestCase):
         self.assertEqual(len(response.data), 1)
         self.assertEqual(response.data[0]['book'], self.book.id)
 
+class BookListCacheTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = create_reader()
+        self.client.force_authenticate(user=self.user)
+        self.wiley = Publisher.objects.create(name='Wiley')
+        self.manning = Publisher.objects.create(name='Manning')
+        self.category = Category.objects.create(name='Technology')
+        self.book = self.create_book('1234567890123', self.wiley)
+
+    def create_book(self, isbn, publisher):
+        return create_book(publisher, self.category, title=f'Book {isbn}', isbn=isbn)
+
+    def test_repeated_list_is_served_from_cache(self):
+        first = self.client.get('/api/books/', {'search': 'Book'})
+        with self.assertNumQueries(0):
+            second = self.client.get('/api/books/', {'search': ' BOOK '})
+        self.assertEqual(first.data, second.data)
+
+    @override_settings(ALLOWED_HOSTS=['one.example', 'two.example'])
+    def test_cached_pages_link_to_each_requesters_url(self):
+        for i in range(25):
+            self.create_book(str(2000000000000 + i), self.wiley)
+        first = self.client.get('/api/books/', {'search': 'Book'}, HTTP_HOST='one.example')
+        with self.assertNumQueries(0):
+            second = self.client.get('/api/books/', {'search': ' BOOK '}, HTTP_HOST='two.example')
+        self.assertEqual(first.data['results'], second.data['results'])
+        self.assertEqual(first.data['next'], 'http://one.example/api/books/?page=2&search=Book')
+        self.assertEqual(second.data['next'], 'http://two.example/api/books/?page=2&search=+BOOK+')
+
+    def test_borrow_invalidates_cached_pages(self):
+        self.assertEqual(self.client.get('/api/books/').data['count'], 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/books/borrow/', {'book_id': self.book.id, 'days': 7})
+        self.assertEqual(self.client.get('/api/books/').data['count'], 0)
+
+    def test_return_invalidates_cached_pages(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            borrowed = BorrowedBook.objects.create(
+                user=self.user,
+                book=self.book,
+                return_date=timezone.now() + timedelta(days=7)
+            )
+        self.assertEqual(self.client.get('/api/books/').data['count'], 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            borrowed.return_book()
+        self.assertEqual(self.client.get('/api/books/').data['count'], 1)
+
+    @override_settings(INTER_SERVICE_TOKEN='test-token')
+    def test_sync_invalidates_cached_pages(self):
+        self.assertEqual(self.client.get('/api/books/').data['count'], 1)
+        sync_client = APIClient()
+        sync_client.credentials(HTTP_AUTHORIZATION='Token test-token')
+        change = {'operation': 'delete', 'sequence': 1, 'isbn': self.book.isbn}
+        with self.captureOnCommitCallbacks(execute=True):
+            sync_client.post('/api/internal/book-changes/', {'changes': [change]}, format='json')
+        self.assertEqual(self.client.get('/api/books/').data['count'], 0)
+
+    def test_publisher_pages_follow_the_filter_django_filter_applies(self):
+        spellings = [{'publisher': f'0{self.wiley.id}'}, {'publisher': f'+{self.wiley.id}'},
+                     # The last value wins, so this is the unfiltered catalog
+                     {'publisher': [self.manning.id, '']}]
+        for params in spellings:
+            self.assertEqual(self.client.get('/api/books/', params).data['count'], 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            BorrowedBook.objects.create(user=self.user, book=self.book, return_date=timezone.now())
+        for params in spellings:
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get('/api/books/', params).data['count'], 0)
+
+    def test_publisher_page_survives_changes_to_other_publishers(self):
+        self.client.get('/api/books/', {'publisher': self.wiley.id})
+        other = self.create_book('9780132350884', self.manning)
+        with self.captureOnCommitCallbacks(execute=True):
+            BorrowedBook.objects.create(user=self.user, book=other, return_date=timezone.now())
+        with self.assertNumQueries(0):
+            self.client.get('/api/books/', {'publisher': self.wiley.id})
+
+class ConditionalRequestTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = create_reader()
+        self.client.force_authenticate(user=self.user)
+        self.book = create_book(
+            Publisher.objects.create(name='Prentice Hall'), Category.objects.create(name='Technology'),
+            title='Clean Code', author='Robert Martin', isbn='9780132350884'
+        )
+        self.detail_url = f'/api/books/{self.book.id}/'
+
+    def test_unchanged_book_is_not_modified(self):
+        response = self.client.get(self.detail_url)
+        self.assertEqual(response['Cache-Control'], 'private, no-cache')
+
+        with self.assertNumQueries(1):
+            not_modified = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(not_modified.content, b'')
+        self.assertEqual(not_modified['ETag'], response['ETag'])
+
+        not_modified = self.client.get(self.detail_url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_changed_book_is_sent_again(self):
+        etag = self.client.get(self.detail_url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            BorrowedBook.objects.create(user=self.user, book=self.book, return_date=timezone.now())
+
+        response = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(response.data['is_available'])
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_unchanged_list_is_not_modified_without_a_query(self):
+        etag = self.client.get('/api/books/')['ETag']
+        self.assertNotEqual(self.client.get('/api/books/', {'search': 'clean'})['ETag'], etag)
+
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/books/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_catalog_change_invalidates_list_etag(self):
+        etag = self.client.get('/api/books/')['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/books/borrow/', {'book_id': self.book.id, 'days': 7})
+
+        response = self.client.get('/api/books/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 0)
+
+    def test_async_views_send_the_same_validators(self):
+        factory = AsyncRequestFactory()
+        headers = {'authorization': f'Bearer {AccessToken.for_user(self.user)}'}
+        for view, path, kwargs in [(async_views.book_list, '/api/books/', {}),
+                                   (async_views.book_detail, self.detail_url, {'pk': self.book.id})]:
+            with self.subTest(path=path):
+                etag = self.client.get(path)['ETag']
+                response = async_to_sync(view)(factory.get(path, headers=headers), **kwargs)
+                self.assertEqual(response['ETag'], etag)
+                request = factory.get(path, headers=dict(headers, if_none_match=etag))
+                self.assertEqual(async_to_sync(view)(request, **kwargs).status_code,
+                                 status.HTTP_304_NOT_MODIFIED)
+
+
+@override_settings(INTER_SERVICE_TOKEN='test-token')
+class RequestMetricsTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        metrics.reset()
+        self.client = APIClient()
+        self.client.force_authenticate(user=create_reader())
+        create_book(Publisher.objects.create(name='Wiley'), Category.objects.create(name='Technology'))
+
+    def scrape(self, **credentials):
+        return self.client.get('/api/internal/metrics/', **credentials)
+
+    def test_list_requests_are_measured(self):
+        self.client.get('/api/books/')
+        self.client.get('/api/books/')
+        body = self.scrape(HTTP_AUTHORIZATION='Token test-token').content.decode()
+
+        view = 'method="GET",view="api/books/"'
+        self.assertIn('http_requests_total{method="GET",status="200",view="api/books/"} 2.0', body)
+        self.assertIn('cache_requests_total{method="GET",result="hit",view="api/books/"} 1.0', body)
+        self.assertIn('cache_requests_total{method="GET",result="miss",view="api/books/"} 1.0', body)
+        self.assertIn(f'http_request_duration_seconds_count{{{view}}} 2.0', body)
+        self.assertIn(f'serializer_duration_seconds_count{{{view}}} 2.0', body)
+        # The cache miss runs the count and page queries, the hit runs none
+        self.assertIn(f'db_queries_per_request_sum{{{view}}} 2.0', body)
+        self.assertIn('# TYPE http_response_size_bytes histogram', body)
+
+    def test_metrics_require_the_inter_service_token(self):
+        self.assertEqual(self.scrape().status_code, 401)
+        self.assertEqual(self.scrape(HTTP_AUTHORIZATION='Token wrong').status_code, 401)
+
+    def test_worker_processes_are_summed_in_multiprocess_mode(self):
+        # What gunicorn.conf.py sets up: each worker writes to the directory,
+        # and whichever one is scraped reports them all
+        worker = ('import django; django.setup(); from library_common import metrics; '
+                  'metrics.requests_total.labels(method="GET", status="200", view="api/books/").inc()')
+        with tempfile.TemporaryDirectory() as directory:
+            env = dict(os.environ, PROMETHEUS_MULTIPROC_DIR=directory,
+                       DJANGO_SETTINGS_MODULE='frontend_api.settings')
+            for _ in range(2):
+                subprocess.run([sys.executable, '-c', worker], env=env, check=True)
+            with patch.dict(os.environ, PROMETHEUS_MULTIPROC_DIR=directory):
+                body = self.scrape(HTTP_AUTHORIZATION='Token test-token').content.decode()
+        self.assertIn('http_requests_total{method="GET",status="200",view="api/books/"} 2.0', body)
+
+    @override_settings(SLOW_REQUEST_THRESHOLD=0)
+    def test_slow_requests_are_logged_with_their_sql(self):
+        with self.assertLogs('library_common.metrics', 'WARNING') as logs:
+            self.client.get('/api/books/')
+        self.assertIn('GET /api/books/', logs.output[0])
+        self.assertIn('SELECT', logs.output[0])
+
+
+class AsyncReadViewsTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = create_reader()
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.factory = AsyncRequestFactory()
+        self.token = str(AccessToken.for_user(self.user))
+        self.wiley = Publisher.objects.create(name='Wiley')
+        apress = Publisher.objects.create(name='Apress')
+        category = Category.objects.create(name='Technology')
+        self.books = [
+            create_book(self.wiley if i % 2 else apress, category, title=f'Book {i}', isbn=str(1000000000000 + i))
+            for i in range(25)
+        ]
+        BorrowedBook.borrow_many(self.user, [book.id for book in self.books[:3]], timezone.now())
+
+    def call(self, view, path, params=None, token=None, host=None, **kwargs):
+        token = self.token if token is None else token
+        headers = {'authorization': f'Bearer {token}'} if token else {}
+        request = self.factory.get(path, params or {}, headers=headers)
+        if host:
+            request.META['HTTP_HOST'] = host
+        return async_to_sync(view)(request, **kwargs)
+
+    def test_responses_match_the_drf_views(self):
+        book_id = self.books[5].id
+        cases = [
+            (async_views.book_list, '/api/books/', {}, {}),
+            (async_views.book_list, '/api/books/', {'page': 2}, {}),
+            (async_views.book_list, '/api/books/', {'pagination': 'cursor'}, {}),
+            (async_views.book_list, '/api/books/', {'publisher': self.wiley.id}, {}),
+            (async_views.book_list, '/api/books/', {'publisher_name': 'apr', 'search': 'book'}, {}),
+            (async_views.book_detail, f'/api/books/{book_id}/', {}, {'pk': book_id}),
+            (async_views.my_borrowed_books, '/api/books/my-borrowed/', {}, {}),
+            (async_views.my_borrowed_books, '/api/books/my-borrowed/', {'pagination': 'cursor'}, {}),
+        ]
+        for view, path, params, kwargs in cases:
+            with self.subTest(path=path, params=params):
+                expected = self.client.get(path, params)
+                cache.clear()
+                response = self.call(view, path, params, **kwargs)
+                self.assertEqual(response.status_code, expected.status_code)
+                self.assertEqual(json.loads(response.content), expected.json())
+
+    @override_settings(ALLOWED_HOSTS=['one.example', 'two.example'])
+    def test_cached_pages_link_to_each_requesters_url(self):
+        for params, link in (({}, '?page=2'), ({'pagination': 'cursor'}, '?cursor=')):
+            with self.subTest(params=params):
+                self.call(async_views.book_list, '/api/books/', params, host='one.example')
+                page = json.loads(self.call(async_views.book_list, '/api/books/', params, host='two.example').content)
+                self.assertTrue(page['next'].startswith('http://two.example/api/books/' + link), page['next'])
+
+    def test_errors_match_the_drf_views(self):
+        response = self.call(async_views.book_list, '/api/books/', token='')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(response['WWW-Authenticate'], 'Bearer realm="api"')
+        self.assertEqual(self.call(async_views.book_list, '/api/books/', token='garbage').status_code, 401)
+        self.assertEqual(self.call(async_views.book_detail, '/api/books/0/', pk=0).status_code, 404)
+        self.assertEqual(self.call(async_views.book_list, '/api/books/', {'page': 9}).status_code, 404)
+        self.assertEqual(self.call(async_views.book_list, '/api/books/', {'publisher': 999999}).status_code, 400)
+        self.assertEqual(self.call(async_views.book_list, '/api/books/', {'pagination': 'cursor', 'search': 'book'})
+                         .status_code, 400)
+
+    def test_metrics_middleware_measures_async_views(self):
+        metrics.reset()
+
+        async def view(request):
+            return async_views.render({'count': await CatalogBook.objects.acount()})
+
+        middleware = metrics.RequestMetricsMiddleware(view)
+        async_to_sync(middleware)(self.factory.get('/api/books/'))
+        body = metrics.render().decode()
+        self.assertIn('http_requests_total{method="GET",status="200",view="unmatched"} 1.0', body)
+        self.assertIn('db_queries_per_request_sum{method="GET",view="unmatched"} 1.0', body)
+
+
+class CatalogAuthenticationTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = create_reader()
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+        book = create_book(
+            Publisher.objects.create(name='Prentice Hall'), Category.objects.create(name='Technology'),
+            title='Clean Code', author='Robert Martin', isbn='9780132350884', published_date=date(2008, 8, 1)
+        )
+        self.detail_url = f'/api/books/{book.id}/'
+
+    def user_queries(self, path):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(path)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [query['sql'] for query in queries if 'users_libraryuser' in query['sql']]
+
+    def test_catalog_reads_use_cached_user_state(self):
+        self.assertEqual(len(self.user_queries(self.detail_url)), 1)
+        self.assertEqual(self.user_queries(self.detail_url), [])
+        self.assertEqual(self.user_queries('/api/books/'), [])
+        # Endpoints working on the user's own rows still load the user
+        self.assertEqual(len(self.user_queries('/api/books/my-borrowed/')), 1)
+
+    def test_deactivation_takes_effect_immediately(self):
+        self.client.get(self.detail_url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+        self.assertEqual(self.client.get(self.detail_url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_password_change_revokes_earlier_tokens(self):
+        # Tokens issued in the revoking second are rejected too, so space them out
+        old_token = AccessToken.for_user(self.user)
+        old_token.set_iat(at_time=timezone.now() - timedelta(seconds=10))
+        with patch('time.time', return_value=time.time() - 5), self.captureOnCommitCallbacks(execute=True):
+            self.user.set_password('newpass456')
+            self.user.save()
+
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {old_token}')
+        self.assertEqual(self.client.get(self.detail_url).status_code, status.HTTP_401_UNAUTHORIZED)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+        self.assertEqual(self.client.get(self.detail_url).status_code, status.HTTP_200_OK)
+
+    def test_deleted_users_are_rejected(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.delete()
+        self.assertEqual(self.client.get('/api/books/').status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class QueryBudgetTestCase(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_reader()
+        self.client.force_authenticate(user=self.user)
+        self.books = []
+
+    def add_books(self, size, borrow=False):
+        # Each book gets its own publisher and category so lazy lookups would show up
+        for index in range(len(self.books), size):
+            book = create_book(
+                Publisher.objects.create(name=f'Publisher {index}'),
+                Category.objects.create(name=f'Category {index}'),
+                title=f'Book {index}',
+                isbn=str(1000000000000 + index)
+            )
+            if borrow:
+                BorrowedBook.objects.create(user=self.user, book=book, return_date=timezone.now())
+            self.books.append(book)
+
+    def test_book_list_budget(self):
+        self.assertQueryBudget(2, lambda: self.client.get('/api/books/'), self.add_books)
+
+    def test_book_list_cursor_budget(self):
+        self.assertQueryBudget(1, lambda: self.client.get('/api/books/', {'pagination': 'cursor'}), self.add_books)
+
+    def test_book_detail_budget(self):
+        self.assertQueryBudget(1, lambda: self.client.get(f'/api/books/{self.books[-1].id}/'), self.add_books)
+
+    def test_my_borrowed_books_budget(self):
+        self.assertQueryBudget(
+            1,
+            lambda: self.client.get('/api/books/my-borrowed/'),
+            lambda size: self.add_books(size, borrow=True)
+        )
+
+class IndexUsageTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        generate_catalog(3000, publishers=20, categories=10)
+        generate_loans(300, 2000, open_ratio=0.05)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        cls.user_id = BorrowedBook.objects.filter(actual_return_date__isnull=True).values_list('user_id', flat=True)[0]
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = queryset.explain()
+        self.assertIn(index_name, plan, plan)
+
+    def test_open_loans_of_a_user(self):
+        self.assertUsesIndex(
+            BorrowedBook.objects.filter(user_id=self.user_id, actual_return_date__isnull=True)
+            .order_by('-borrowed_date', '-id'),
+            'borrow_open_user_idx'
+        )
+
+    def test_open_loan_of_a_book(self):
+        book_id = BorrowedBook.objects.filter(actual_return_date__isnull=True).values_list('book_id', flat=True)[0]
+        self.assertUsesIndex(
+            BorrowedBook.objects.filter(book_id=book_id, actual_return_date__isnull=True),
+            'borrow_open_book_idx'
+        )
+
+    def test_available_books_by_category(self):
+        category = Category.objects.order_by('id').first()
+        self.assertUsesIndex(
+            CatalogBook.objects.filter(is_available=True, category=category).order_by('book_id'),
+            'catalog_category_idx'
+        )
+
+
+class ConcurrentBorrowTestCase(TransactionTestCase):
+    def setUp(self):
+        self.users = [create_reader(f'reader{i}@example.com') for i in range(8)]
+        self.book = create_book(
+            Publisher.objects.create(name='Wiley'), Category.objects.create(name='Fiction'), title='Popular Book'
+        )
+
+    def test_only_one_concurrent_borrower_wins(self):
+        winners, errors = hammer(self.book.id, self.users)
+        self.assertEqual(errors, [])
+        self.assertEqual(len(winners), 1)
+        self.assertEqual(BorrowedBook.objects.filter(book=self.book).count(), 1)
+        self.book.refresh_from_db()
+        self.assertFalse(self.book.is_available)
+
+class BulkCirculationTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_reader()
+        self.client.force_authenticate(user=self.user)
+        self.publisher = Publisher.objects.create(name='Wiley')
+        self.category = Category.objects.create(name='Fiction')
+        self.books = create_books(60, self.publisher, self.category)
+
+    def test_bulk_borrow_reports_per_item_results(self):
+        Book.objects.filter(id=self.books[1].id).update(is_available=False)
+        book_ids = [self.books[0].id, self.books[1].id, 999999]
+        response = self.client.post('/api/books/bulk-borrow/', {'book_ids': book_ids, 'days': 7}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['borrowed'], 1)
+        self.assertEqual(response.data['failed'], 2)
+        results = response.data['results']
+        self.assertEqual([result['status'] for result in results], ['ok', 'failed', 'failed'])
+        self.assertEqual(results[0]['borrowing']['book_details']['publisher_name'], 'Wiley')
+        self.assertEqual(results[1]['error'], 'This book is not available for borrowing.')
+        self.assertEqual(results[2]['error'], 'Book not found.')
+        self.assertFalse(Book.objects.get(id=self.books[0].id).is_available)
+
+    def test_bulk_borrow_query_count_is_constant(self):
+        counts = []
+        for books in (self.books[:5], self.books[5:55]):
+            with CaptureQueriesContext(connection) as queries:
+                self.client.post(
+                    '/api/books/bulk-borrow/', {'book_ids': [book.id for book in books], 'days': 7}, format='json'
+                )
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+        self.assertEqual(BorrowedBook.objects.count(), 55)
+
+    def test_staff_bulk_borrow_for_a_patron(self):
+        patron = create_reader('patron@example.com')
+        self.user.is_staff = True
+        self.user.save()
+        response = self.client.post(
+            '/api/books/bulk-borrow/', {'book_ids': [self.books[0].id], 'days': 7, 'user_id': patron.id}, format='json'
+        )
+        self.assertEqual(response.data['borrowed'], 1)
+        self.assertEqual(BorrowedBook.objects.get().user, patron)
+
+        response = self.client.post(
+            '/api/books/bulk-borrow/', {'book_ids': [self.books[1].id], 'days': 7, 'user_id': 999999}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_patrons_cannot_bulk_borrow_for_others(self):
+        other = create_reader('other@example.com')
+        response = self.client.post(
+            '/api/books/bulk-borrow/', {'book_ids': [self.books[0].id], 'days': 7, 'user_id': other.id}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertFalse(BorrowedBook.objects.exists())
+
+    def test_bulk_borrow_rejects_oversized_batches(self):
+        response = self.client.post('/api/books/bulk-borrow/', {'book_ids': list(range(101)), 'days': 7}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_bulk_return_closes_own_loans(self):
+        other = create_reader('other@example.com')
+        BorrowedBook.borrow_many(self.user, [self.books[0].id, self.books[1].id], timezone.now())
+        BorrowedBook.borrow_many(other, [self.books[2].id], timezone.now())
+
+        book_ids = [self.books[0].id, self.books[1].id, self.books[2].id]
+        response = self.client.post('/api/books/bulk-return/', {'book_ids': book_ids}, format='json')
+
+        self.assertEqual(response.data['returned'], 2)
+        self.assertEqual(response.data['results'][2]['error'], 'No open borrowing for this book.')
+        self.assertEqual(BorrowedBook.objects.filter(actual_return_date__isnull=True).count(), 1)
+        self.assertEqual(Book.objects.filter(is_available=False).count(), 1)
+
+    def test_staff_bulk_return_closes_any_loan(self):
+        other = create_reader('other@example.com')
+        BorrowedBook.borrow_many(other, [book.id for book in self.books[:40]], timezone.now())
+        self.user.is_staff = True
+        self.user.save()
+
+        with CaptureQueriesContext(connection) as small:
+            self.client.post('/api/books/bulk-return/', {'book_ids': [self.books[0].id]}, format='json')
+        with CaptureQueriesContext(connection) as large:
+            response = self.client.post(
+                '/api/books/bulk-return/', {'book_ids': [book.id for book in self.books[1:40]]}, format='json'
+            )
+        self.assertEqual(response.data['returned'], 39)
+        self.assertEqual(len(small), len(large))
+        self.assertFalse(Book.objects.filter(is_available=False).exists())
+
 class UserRegistrationTestCase(TestCase):
     def setUp(self):
         self.client = APIClient()
@@ -137,4 +717,463 @@ class UserRegistrationTestCase(TestCase):
             'password_confirm': 'differentpass123'
         }
         response = self.client.post('/api/users/register/', data)
-        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+@override_settings(INTER_SERVICE_TOKEN='test-token')
+class BookSyncAPITestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION='Token test-token')
+        self.publisher = Publisher.objects.create(name='Wiley')
+
+    def book_payload(self, isbn, **overrides):
+        data = {
+            'title': f'Book {isbn}',
+            'author': 'Test Author',
+            'isbn': isbn,
+            'publisher_name': 'Wiley',
+            'category_name': 'Technology',
+            'published_date': '2020-01-01',
+            'description': '',
+            'is_available': True
+        }
+        data.update(overrides)
+        return data
+
+    def change(self, sequence, isbn='1234567890123', operation='upsert', **overrides):
+        data = {'operation': operation, 'sequence': sequence, 'isbn': isbn}
+        if operation == 'upsert':
+            data['book'] = self.book_payload(isbn, **overrides)
+        return data
+
+    def test_apply_changes_creates_books(self):
+        changes = [self.change(i + 1, isbn=str(1000000000000 + i)) for i in range(25)]
+        response = self.client.post('/api/internal/book-changes/', {'changes': changes}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {'applied': 25, 'skipped': 0})
+        self.assertEqual(Book.objects.count(), 25)
+        self.assertEqual(Publisher.objects.count(), 1)
+        self.assertEqual(Category.objects.get().name, 'Technology')
+
+    def test_apply_changes_updates_existing_books(self):
+        create_book(self.publisher, Category.objects.create(name='Fiction'), title='Old Title')
+        changes = [self.change(1, title='New Title', category_name='Science')]
+        response = self.client.post('/api/internal/book-changes/', {'changes': changes}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        book = Book.objects.get(isbn='1234567890123')
+        self.assertEqual(book.title, 'New Title')
+        self.assertEqual(book.category.name, 'Science')
+
+    def test_apply_changes_query_count_is_independent_of_batch_size(self):
+        query_counts = []
+        for size in (5, 50):
+            changes = [self.change(i + 1, isbn=str(2000000000000 + size * 1000 + i)) for i in range(size)]
+            with CaptureQueriesContext(connection) as queries:
+                self.client.post('/api/internal/book-changes/', {'changes': changes}, format='json')
+            query_counts.append(len(queries))
+        self.assertEqual(query_counts[0], query_counts[1])
+
+    def test_apply_changes_rejects_invalid_rows(self):
+        changes = [self.change(1, published_date='not-a-date')]
+        response = self.client.post('/api/internal/book-changes/', {'changes': changes}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Book.objects.count(), 0)
+
+    def test_apply_changes_requires_inter_service_token(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Token wrong-token')
+        response = self.client.post('/api/internal/book-changes/', {'changes': []}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_unsequenced_sync_endpoints_are_gone(self):
+        # Only sequenced changes may write the catalog, so a stale write cannot win
+        for url in ('/api/internal/sync-books/', '/api/internal/sync-book/', '/api/internal/sync-book/1234567890123/'):
+            self.assertEqual(self.client.post(url, {}, format='json').status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_apply_changes_upserts_and_records_sequence(self):
+        changes = [self.change(5, title='First'), self.change(7, title='Second')]
+        response = self.client.post('/api/internal/book-changes/', {'changes': changes}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        book = Book.objects.get(isbn='1234567890123')
+        self.assertEqual(book.title, 'Second')
+        self.assertEqual(book.sync_sequence, 7)
+
+    def test_apply_changes_skips_stale_versions(self):
+        self.client.post('/api/internal/book-changes/', {'changes': [self.change(7, title='New')]}, format='json')
+        response = self.client.post(
+            '/api/internal/book-changes/',
+            {'changes': [self.change(5, title='Old'), self.change(6, operation='delete')]},
+            format='json'
+        )
+        self.assertEqual(response.data, {'applied': 0, 'skipped': 2})
+        self.assertEqual(Book.objects.get(isbn='1234567890123').title, 'New')
+
+    def test_apply_changes_is_idempotent(self):
+        changes = [self.change(3), self.change(4, isbn='9780132350884', operation='delete')]
+        for _ in range(2):
+            response = self.client.post('/api/internal/book-changes/', {'changes': changes}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(Book.objects.count(), 1)
+
+    def test_apply_changes_deletes_newer_versions(self):
+        self.client.post('/api/internal/book-changes/', {'changes': [self.change(3)]}, format='json')
+        self.client.post('/api/internal/book-changes/', {'changes': [self.change(4, operation='delete')]}, format='json')
+        self.assertFalse(Book.objects.filter(isbn='1234567890123').exists())
+
+    def test_apply_changes_keeps_deleted_books_deleted(self):
+        self.client.post('/api/internal/book-changes/', {'changes': [self.change(4, operation='delete')]}, format='json')
+        # The older upsert arrives late (retried or reordered)
+        response = self.client.post('/api/internal/book-changes/', {'changes': [self.change(3)]}, format='json')
+        self.assertEqual(response.data, {'applied': 0, 'skipped': 1})
+        self.assertFalse(Book.objects.filter(isbn='1234567890123').exists())
+
+        self.client.post('/api/internal/book-changes/', {'changes': [self.change(5)]}, format='json')
+        self.assertEqual(Book.objects.get(isbn='1234567890123').sync_sequence, 5)
+        self.assertFalse(BookTombstone.objects.exists())
+
+    @override_settings(TOMBSTONE_RETENTION=3600)
+    def test_expired_tombstones_are_purged(self):
+        changes = [self.change(1, isbn=isbn, operation='delete') for isbn in ('9780000000001', '9780000000002')]
+        self.client.post('/api/internal/book-changes/', {'changes': changes}, format='json')
+        BookTombstone.objects.filter(isbn='9780000000001').update(deleted_at=timezone.now() - timedelta(hours=2))
+
+        response = self.client.post('/api/internal/purge-tombstones/', {}, format='json')
+        self.assertEqual(response.data, {'purged': 1})
+        self.assertEqual(list(BookTombstone.objects.values_list('isbn', flat=True)), ['9780000000002'])
+
+    def test_apply_changes_keep_borrowed_books_unavailable(self):
+        self.client.post('/api/internal/book-changes/', {'changes': [self.change(1)]}, format='json')
+        book = Book.objects.get(isbn='1234567890123')
+        reader = create_reader()
+        BorrowedBook.objects.create(user=reader, book=book, return_date=timezone.now() + timedelta(days=14))
+
+        self.client.post('/api/internal/book-changes/', {'changes': [self.change(2, title='Renamed')]},
+                         format='json')
+        book.refresh_from_db()
+        self.assertEqual(book.title, 'Renamed')
+        self.assertFalse(book.is_available)
+        self.assertFalse(CatalogBook.objects.get(pk=book.pk).is_available)
+
+    def test_catalog_ranges_and_digests(self):
+        changes = [self.change(1, isbn=isbn) for isbn in ('9780000000001', '9780000000002', '9790000000001')]
+        self.client.post('/api/internal/book-changes/', {'changes': changes}, format='json')
+
+        response = self.client.post('/api/internal/catalog-ranges/', {'parents': [''], 'length': 0}, format='json')
+        self.assertEqual(response.data['ranges'][''][0], 3)
+
+        response = self.client.post('/api/internal/catalog-ranges/', {'parents': ['978'], 'length': 4}, format='json')
+        self.assertEqual(list(response.data['ranges']), ['9780'])
+        self.assertEqual(response.data['ranges']['9780'][0], 2)
+
+        response = self.client.post('/api/internal/catalog-digests/', {'prefixes': ['979']}, format='json')
+        self.assertEqual(list(response.data['digests']), ['9790000000001'])
+
+
+@override_settings(INTER_SERVICE_TOKEN='test-token', INTER_SERVICE_ACCEPTED_TOKENS=['next-token'],
+                   INTER_SERVICE_KEYS_REDIS_URL=None)
+class InterServiceAuthenticationTestCase(TestCase):
+    url = '/api/internal/book-changes/'
+
+    def post(self, authorization, body=b'{"changes": []}'):
+        return self.client.post(self.url, body, content_type='application/json', HTTP_AUTHORIZATION=authorization)
+
+    def signed(self, key, body=b'{"changes": []}'):
+        request = requests.Request('POST', f'http://frontend{self.url}', data=body).prepare()
+        return SignatureAuth(key)(request).headers['Authorization']
+
+    def test_every_active_key_is_accepted(self):
+        self.assertEqual(self.post('Token test-token').status_code, status.HTTP_200_OK)
+        self.assertEqual(self.post('Token next-token').status_code, status.HTTP_200_OK)
+        self.assertEqual(self.post('Token retired-token').status_code, status.HTTP_403_FORBIDDEN)
+
+    @override_settings(INTER_SERVICE_KEYS_REDIS_URL='redis://keys', INTER_SERVICE_KEYS_REFRESH=60)
+    def test_keys_are_loaded_from_redis_and_cached(self):
+        client = MagicMock()
+        client.smembers.return_value = {b'redis-token'}
+        with patch.object(inter_service_keys, '_loaded_at', None), \
+                patch.object(inter_service_keys, 'redis_client', return_value=client):
+            self.assertEqual(self.post('Token redis-token').status_code, status.HTTP_200_OK)
+            self.assertEqual(self.post('Token redis-token').status_code, status.HTTP_200_OK)
+        client.smembers.assert_called_once_with('inter-service:keys')
+
+    def test_signed_requests_cover_the_body(self):
+        self.assertEqual(self.post(self.signed('next-token')).status_code, status.HTTP_200_OK)
+        tampered = self.post(self.signed('next-token'), body=b'{"changes": [{}]}')
+        self.assertEqual(tampered.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(self.post(self.signed('retired-token')).status_code, status.HTTP_403_FORBIDDEN)
+
+        with patch('time.time', return_value=time.time() - 3600):
+            stale = self.signed('test-token')
+        self.assertEqual(self.post(stale).status_code, status.HTTP_403_FORBIDDEN)
+
+    @override_settings(INTER_SERVICE_REQUIRE_SIGNATURE=True)
+    def test_bare_tokens_can_be_refused(self):
+        self.assertEqual(self.post('Token test-token').status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(self.post(self.signed('test-token')).status_code, status.HTTP_200_OK)
+        # Prometheus cannot sign its scrapes, so /metrics still takes the bare key
+        metrics_url = '/api/internal/metrics/'
+        self.assertEqual(self.client.get(metrics_url, HTTP_AUTHORIZATION='Token test-token').status_code, 200)
+        self.assertEqual(self.client.get(metrics_url, HTTP_AUTHORIZATION='Token retired-token').status_code, 401)
+
+
+@override_settings(INTER_SERVICE_TOKEN='test-token')
+class CatalogReadModelTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.sync_client = APIClient()
+        self.sync_client.credentials(HTTP_AUTHORIZATION='Token test-token')
+        self.client = APIClient()
+        self.user = create_reader()
+        self.client.force_authenticate(user=self.user)
+        self.sequence = 0
+
+    def send(self, change):
+        self.sequence += 1
+        change['sequence'] = self.sequence
+        self.sync_client.post('/api/internal/book-changes/', {'changes': [change]}, format='json')
+
+    def sync(self, isbn, **overrides):
+        book = {
+            'title': f'Book {isbn}',
+            'author': 'Test Author',
+            'isbn': isbn,
+            'publisher_name': 'Wiley',
+            'category_name': 'Technology',
+            'published_date': '2020-01-01',
+        }
+        book.update(overrides)
+        self.send({'operation': 'upsert', 'isbn': isbn, 'book': book})
+        return CatalogBook.objects.get(isbn=isbn)
+
+    def test_sync_writes_denormalized_rows(self):
+        entry = self.sync('1234567890123')
+        self.assertEqual((entry.publisher_name, entry.category_name), ('Wiley', 'Technology'))
+
+        entry = self.sync('1234567890123', title='Renamed', category_name='Science')
+        self.assertEqual((entry.title, entry.category_name), ('Renamed', 'Science'))
+        self.assertEqual(entry.category_id, Category.objects.get(name='Science').id)
+
+    def test_book_list_reads_without_joins(self):
+        self.sync('1234567890123')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/books/', {'publisher_name': 'wil', 'category_name': 'tech'})
+        self.assertEqual(response.data['results'][0]['publisher_name'], 'Wiley')
+        self.assertEqual(response.data['results'][0]['id'], Book.objects.get().id)
+        self.assertNotIn('JOIN', ' '.join(query['sql'] for query in queries).upper())
+
+    def test_circulation_updates_availability(self):
+        book_id = self.sync('1234567890123').book_id
+        loan = BorrowedBook.objects.create(user=self.user, book_id=book_id, return_date=timezone.now())
+        self.assertFalse(CatalogBook.objects.get(pk=book_id).is_available)
+        loan.return_book()
+        self.assertTrue(CatalogBook.objects.get(pk=book_id).is_available)
+
+        BorrowedBook.borrow_many(self.user, [book_id], timezone.now())
+        self.assertFalse(CatalogBook.objects.get(pk=book_id).is_available)
+        BorrowedBook.return_many([book_id])
+        self.assertTrue(CatalogBook.objects.get(pk=book_id).is_available)
+
+    def test_deleted_books_leave_the_catalog(self):
+        self.sync('1234567890123')
+        self.send({'operation': 'delete', 'isbn': '1234567890123'})
+        self.assertFalse(CatalogBook.objects.exists())
+
+
+class ReferenceCacheTestCase(TestCase):
+    def setUp(self):
+        clear_all()
+        self.wiley = Publisher.objects.create(name='Wiley')
+        self.apress = Publisher.objects.create(name='Apress')
+
+    def test_lookups_are_served_from_memory_once_committed(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(publishers.ids_for(['Wiley', 'Apress']), {'Wiley': self.wiley.id, 'Apress': self.apress.id})
+        with self.assertNumQueries(0):
+            self.assertEqual(publishers.name_for(self.wiley.id), 'Wiley')
+            self.assertEqual(publishers.id_for('Apress'), self.apress.id)
+
+    def test_uncommitted_rows_are_not_cached(self):
+        publishers.id_for('Manning', create=True)
+        with self.assertNumQueries(1):
+            self.assertIsNotNone(publishers.id_for('Manning'))
+
+    def test_saving_a_row_invalidates_it(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            publishers.name_for(self.wiley.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.wiley.name = 'Wiley-Blackwell'
+            self.wiley.save()
+        self.assertEqual(publishers.name_for(self.wiley.id), 'Wiley-Blackwell')
+        self.assertIsNone(publishers.id_for('Wiley'))
+
+    def test_invalidation_messages_from_other_workers(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            publishers.name_for(self.wiley.id)
+        apply_invalidation(json.dumps({'table': 'publisher', 'id': self.wiley.id}))
+        with self.assertNumQueries(1):
+            publishers.name_for(self.wiley.id)
+
+    def test_least_recently_used_entries_are_evicted(self):
+        lookup = LookupCache(Publisher, 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            lookup.name_for(self.wiley.id)
+            lookup.name_for(self.apress.id)
+        with self.assertNumQueries(0):
+            lookup.name_for(self.apress.id)
+        with self.assertNumQueries(1):
+            lookup.name_for(self.wiley.id)
+
+
+class CursorPaginationTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = create_reader()
+        self.client.force_authenticate(user=self.user)
+        publisher = Publisher.objects.create(name='Wiley')
+        self.books = create_books(45, publisher, Category.objects.create(name='Technology'))
+
+    def walk(self, url, params=None):
+        results, pages = [], 0
+        response = self.client.get(url, params)
+        while True:
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            results.extend(response.data['results'])
+            pages += 1
+            if not response.data['next']:
+                return results, pages
+            response = self.client.get(response.data['next'])
+
+    def test_book_list_cursor_mode_walks_whole_catalog(self):
+        results, pages = self.walk('/api/books/', {'pagination': 'cursor'})
+        self.assertEqual(pages, 3)
+        self.assertEqual([book['id'] for book in results], sorted(book.id for book in self.books))
+        self.assertNotIn('count', self.client.get('/api/books/', {'pagination': 'cursor'}).data)
+
+    def test_book_list_cursor_pages_skip_count_and_offset(self):
+        first = self.client.get('/api/books/', {'pagination': 'cursor'})
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(first.data['next'])
+        sql = ' '.join(query['sql'] for query in queries).upper()
+        self.assertNotIn('COUNT(', sql)
+        self.assertNotIn('OFFSET', sql)
+
+    def test_book_list_defaults_to_page_numbers(self):
+        response = self.client.get('/api/books/')
+        self.assertEqual(response.data['count'], 45)
+
+    def test_search_cannot_be_cursor_paged(self):
+        response = self.client.get('/api/books/', {'pagination': 'cursor', 'search': 'book'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('pagination', response.data)
+        self.assertEqual(self.client.get('/api/books/', {'search': 'book'}).data['count'], 45)
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get('/api/books/', {'cursor': 'garbage'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_my_borrowed_books_cursor_mode(self):
+        borrowed_date = timezone.now()
+        for book in self.books[:25]:
+            BorrowedBook.objects.create(
+                user=self.user,
+                book=book,
+                return_date=borrowed_date + timedelta(days=7)
+            )
+        # Ties on borrowed_date are broken by id
+        BorrowedBook.objects.update(borrowed_date=borrowed_date)
+
+        results, pages = self.walk('/api/books/my-borrowed/', {'pagination': 'cursor'})
+        self.assertEqual(pages, 2)
+        self.assertEqual([item['id'] for item in results], list(
+            BorrowedBook.objects.order_by('-id').values_list('id', flat=True)
+        ))
+
+
+class BookSerializerParityTestCase(TestCase):
+    # The fast serializers and renderer must send exactly what the DRF ones would
+    def setUp(self):
+        cache.clear()
+        self.user = create_reader()
+        publisher = Publisher.objects.create(name='Éditions "Gallimard"')
+        category = Category.objects.create(name='Poésie')
+        Book.objects.bulk_create([
+            Book(title='Les Fleurs du mal', author='Charles Baudelaire', isbn='9782070000001',
+                 publisher=publisher, category=category, published_date=date(1857, 6, 25),
+                 description='Spleen et idéal \u2028 \u2029 "quoted" \\ \t 📚'),
+            Book(title='Alcools', author='Guillaume Apollinaire', isbn='9782070000002',
+                 publisher=publisher, category=category, published_date=date(1913, 4, 20),
+                 description='', is_available=False),
+        ])
+        CatalogBook.refresh(Book.objects.all())
+        books = list(Book.objects.order_by('id'))
+        now = timezone.now()
+        BorrowedBook.objects.bulk_create([
+            BorrowedBook(user=self.user, book=books[0], return_date=now + timedelta(days=7)),
+            BorrowedBook(user=self.user, book=books[1], return_date=(now + timedelta(days=7)).replace(microsecond=0),
+                         actual_return_date=now),
+        ])
+
+    def assertSameBytes(self, expected, actual):
+        self.assertEqual(ORJSONRenderer().render(actual), JSONRenderer().render(expected))
+
+    def test_catalog_rows_match_book_and_catalog_serializers(self):
+        books = Book.objects.select_related('publisher', 'category').order_by('id')
+        catalog = CatalogBook.objects.order_by('book_id')
+        fast = catalog_book_data(catalog_rows(catalog))
+
+        self.assertSameBytes(BookSerializer(books, many=True).data, fast)
+        self.assertSameBytes(CatalogBookSerializer(catalog, many=True).data, fast)
+        # Columns selected for the view's own use stay out of the body
+        self.assertEqual(catalog_book_data(catalog_rows(catalog, 'updated_at', 'created_at')), fast)
+
+    def test_borrowed_rows_match_borrowed_book_serializer(self):
+        loans = BorrowedBook.objects.select_related('book__publisher', 'book__category').order_by('id')
+        self.assertSameBytes(BorrowedBookSerializer(loans, many=True).data, borrowed_book_data(borrowed_rows(loans)))
+
+    def test_endpoints_send_serializer_bytes(self):
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        book = CatalogBook.objects.get(isbn='9782070000001')
+        loans = BorrowedBook.objects.filter(actual_return_date__isnull=True)
+
+        response = client.get(f'/api/books/{book.pk}/')
+        self.assertEqual(response.content, JSONRenderer().render(CatalogBookSerializer(book).data))
+        response = client.get('/api/books/my-borrowed/')
+        self.assertEqual(response.content, JSONRenderer().render(BorrowedBookSerializer(loans, many=True).data))
+
+    def test_renderer_falls_back_for_values_orjson_formats_differently(self):
+        data = {'at': timezone.now(), 'results': [{'id': 1}]}
+        self.assertEqual(ORJSONRenderer().render(data), JSONRenderer().render(data))
+        self.assertEqual(ORJSONRenderer().render(data, 'application/json; indent=4'),
+                         JSONRenderer().render(data, 'application/json; indent=4'))
+
+
+@override_settings(INTER_SERVICE_TOKEN='test-token')
+class BenchmarkSuiteTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        clear_all()
+
+    def test_micro_benchmarks_cover_querysets_serializers_and_views(self):
+        results = micro.run(books=30, users=3, loans=10, repeat=2, page_size=5, seed=1)
+
+        self.assertEqual(set(results), {'querysets', 'serializers', 'views'})
+        self.assertIn('borrow_book', results['views'])
+        self.assertTrue(all(summary['count'] == 2 for section in results.values() for summary in section.values()))
+        # Every book the benchmark borrowed went back
+        self.assertEqual(CatalogBook.objects.filter(is_available=False).count(),
+                         BorrowedBook.objects.filter(actual_return_date__isnull=True).count())
+
+    def test_generated_catalog_is_deterministic(self):
+        generate_catalog(5, seed=7)
+        generated = CatalogBook.objects.values_list('title', flat=True)
+        self.assertEqual(list(generated), [sync_payload(index, 7)['title'] for index in range(5)])
+
+    def test_compare_flags_regressions_only(self):
+        baseline = {'results': {'list': {'p95_ms': 10.0, 'max_ms': 10.0, 'requests_per_second': 100.0}}}
+        current = {'results': {'list': {'p95_ms': 10.5, 'max_ms': 50.0, 'requests_per_second': 80.0}}}
+        rows = {row['metric']: row for row in compare(baseline, current, threshold=0.1)}
+
+        self.assertEqual(set(rows), {'list.p95_ms', 'list.requests_per_second'})
+        self.assertFalse(rows['list.p95_ms']['regression'])
+        self.assertTrue(rows['list.requests_per_second']['regression'])
@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.urls import path
+from . import async_views, views
+
+# ASGI deployments serve the read endpoints from async views
+if settings.ASYNC_READ_VIEWS:
+    book_list, book_detail, my_borrowed_books = (
+        async_views.book_list, async_views.book_detail, async_views.my_borrowed_books
+    )
+else:
+    book_list, book_detail, my_borrowed_books = (
+        views.BookListView.as_view(), views.BookDetailView.as_view(), views.my_borrowed_books
+    )
+
+urlpatterns = [
+    path('books/', book_list, name='book-list'),
+    path('books/<int:pk>/', book_detail, name='book-detail'),
+    path('books/borrow/', views.borrow_book, name='borrow-book'),
+    path('books/bulk-borrow/', views.bulk_borrow_books, name='bulk-borrow-books'),
+    path('books/bulk-return/', views.bulk_return_books, name='bulk-return-books'),
+    path('books/my-borrowed/', my_borrowed_books, name='my-borrowed-books'),
+    path('internal/book-changes/', views.apply_book_changes, name='apply-book-changes'),
+    path('internal/purge-tombstones/', views.purge_tombstones, name='purge-tombstones'),
+    path('internal/catalog-ranges/', views.catalog_ranges, name='catalog-ranges'),
+    path('internal/catalog-digests/', views.catalog_digests, name='catalog-digests'),
+]
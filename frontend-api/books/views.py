@@ -1,40 +1,104 @@
-from rest_framework import generics, status, filters
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework import generics, status
+from rest_framework.decorators import api_view, authentication_classes, permission_classes, renderer_classes
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.renderers import BrowsableAPIRenderer
 from rest_framework.response import Response
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from datetime import timedelta
 from django_filters.rest_framework import DjangoFilterBackend
-from .models import Book, BorrowedBook
-from .serializers import BookSerializer, BorrowBookSerializer, BorrowedBookSerializer
-from rest_framework.decorators import authentication_classes, permission_classes
-from .authentication import InterServiceAuthentication
+from library_common import metrics
+from library_common.pagination import KeysetPagination, wants_cursor
+from .models import Book, BookTombstone, BorrowedBook, CatalogBook
+from .serializers import (CatalogBookSerializer, BorrowBookSerializer, BorrowedBookSerializer,
+                          BookChangeSerializer, BulkBorrowSerializer, BulkReturnSerializer)
+from .authentication import CatalogJWTAuthentication, InterServiceAuthentication
+from .reconcile import summarize_ranges, range_digests
+from .reference_cache import publishers, categories
+from .cache import list_cache_key, invalidate_books
+from .conditional import book_etag, list_etag, not_modified, set_validators
+from .fast_serializers import borrowed_book_data, borrowed_rows, catalog_book_data, catalog_rows
+from .renderers import ORJSONRenderer
+from .pagination import OptionalCursorPagination
+from .search import BookSearchFilter
+
+# The hot reads render rows built by fast_serializers, so orjson output matches JSONRenderer's
+FAST_RENDERERS = [ORJSONRenderer, BrowsableAPIRenderer]
 
 
 class BookListView(generics.ListAPIView):
+    authentication_classes = [CatalogJWTAuthentication]
     permission_classes = [IsAuthenticated]
-    serializer_class = BookSerializer
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter]
+    renderer_classes = FAST_RENDERERS
+    serializer_class = CatalogBookSerializer
+    filter_backends = [DjangoFilterBackend, BookSearchFilter]
     filterset_fields = ['publisher', 'category']
     search_fields = ['title', 'author', 'isbn']
+    pagination_class = OptionalCursorPagination
+    keyset_ordering = ('book_id',)
     
     def get_queryset(self):
-        queryset = Book.objects.filter(is_available=True)
+        # The catalog table carries the names, so neither filter needs a join
+        queryset = CatalogBook.objects.filter(is_available=True)
         
         # Filter by publisher name
         publisher_name = self.request.query_params.get('publisher_name', None)
         if publisher_name:
-            queryset = queryset.filter(publisher__name__icontains=publisher_name)
+            queryset = queryset.filter(publisher_name__icontains=publisher_name)
         
         # Filter by category name
         category_name = self.request.query_params.get('category_name', None)
         if category_name:
-            queryset = queryset.filter(category__name__icontains=category_name)
+            queryset = queryset.filter(category_name__icontains=category_name)
         
         return queryset
 
+    def list(self, request, *args, **kwargs):
+        # Pages are shared by every user and keyed on the generations they depend on,
+        # and so is their ETag: a client holding the current page gets a 304
+        key = list_cache_key(request.query_params)
+        etag = list_etag(key, request.accepted_renderer.format)
+        response = not_modified(request, etag)
+        if response is None:
+            response = self.cached_page(request, key)
+        return set_validators(response, etag)
+
+    def cached_page(self, request, key):
+        # Cached without its links: they are absolute, so each request builds
+        # them from its own URL rather than reusing the first requester's
+        cached = cache.get(key)
+        metrics.record_cache(cached is not None)
+        if cached is not None:
+            self.paginator.restore_page(request, cached['page'])
+            return self.get_paginated_response(cached['results'])
+
+        # CatalogBookSerializer's output, built from rows rather than instances
+        queryset = catalog_rows(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(queryset)
+        with metrics.serializing():
+            results = catalog_book_data(page)
+            response = self.get_paginated_response(results)
+        cache.set(key, {'results': results, 'page': self.paginator.page_state()}, settings.BOOK_LIST_CACHE_TIMEOUT)
+        return response
+
 class BookDetailView(generics.RetrieveAPIView):
+    authentication_classes = [CatalogJWTAuthentication]
     permission_classes = [IsAuthenticated]
-    queryset = Book.objects.all()
-    serializer_class = BookSerializer
+    renderer_classes = FAST_RENDERERS
+    serializer_class = CatalogBookSerializer
+
+    def get_queryset(self):
+        return catalog_rows(CatalogBook.objects.all(), 'updated_at')
+
+    def retrieve(self, request, *args, **kwargs):
+        book = self.get_object()
+        etag = book_etag(book.book_id, book.updated_at, request.accepted_renderer.format)
+        response = not_modified(request, etag, book.updated_at)
+        if response is None:
+            response = Response(catalog_book_data([book])[0])
+        return set_validators(response, etag, book.updated_at)
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
@@ -46,56 +110,200 @@ def borrow_book(request):
         return Response(response_serializer.data, status=status.HTTP_201_CREATED)
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+def circulation_results(book_ids, loans, failures):
+    borrowings = dict(zip([loan.book_id for loan in loans], BorrowedBookSerializer(loans, many=True).data))
+    results = []
+    for book_id in book_ids:
+        if book_id in borrowings:
+            results.append({'book_id': book_id, 'status': 'ok', 'borrowing': borrowings[book_id]})
+        else:
+            results.append({'book_id': book_id, 'status': 'failed', 'error': failures[book_id]})
+    return results
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def bulk_borrow_books(request):
+    # Desk staff can check books out to any patron; patrons only to themselves
+    if 'user_id' in request.data and not request.user.is_staff:
+        return Response({'detail': 'Only staff can borrow books for another patron.'},
+                        status=status.HTTP_403_FORBIDDEN)
+    serializer = BulkBorrowSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    book_ids = list(dict.fromkeys(serializer.validated_data['book_ids']))
+    return_date = timezone.now() + timedelta(days=serializer.validated_data['days'])
+    patron = serializer.validated_data.get('patron', request.user)
+    loans, rejected = BorrowedBook.borrow_many(patron, book_ids, return_date)
+
+    existing = set(Book.objects.filter(id__in=rejected).values_list('id', flat=True)) if rejected else set()
+    failures = {
+        book_id: "This book is not available for borrowing." if book_id in existing else "Book not found."
+        for book_id in rejected
+    }
+    return Response({
+        'borrowed': len(loans),
+        'failed': len(rejected),
+        'results': circulation_results(book_ids, loans, failures)
+    })
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def bulk_return_books(request):
+    serializer = BulkReturnSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    # Desk staff can close anyone's loan; patrons only their own
+    book_ids = list(dict.fromkeys(serializer.validated_data['book_ids']))
+    user = None if request.user.is_staff else request.user
+    loans, rejected = BorrowedBook.return_many(book_ids, user=user)
+
+    failures = {book_id: "No open borrowing for this book." for book_id in rejected}
+    return Response({
+        'returned': len(loans),
+        'failed': len(rejected),
+        'results': circulation_results(book_ids, loans, failures)
+    })
+
+def open_loans(user):
+    return BorrowedBook.objects.filter(
+        user=user,
+        actual_return_date__isnull=True
+    ).select_related('book__publisher', 'book__category')
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@renderer_classes(FAST_RENDERERS)
 def my_borrowed_books(request):
-    borrowed_books = BorrowedBook.objects.filter(
-        user=request.user,
-        actual_return_date__isnull=True
+    # BorrowedBookSerializer's output, built from rows rather than instances
+    borrowed_books = borrowed_rows(open_loans(request.user))
+    if wants_cursor(request):
+        paginator = KeysetPagination()
+        paginator.ordering = ('-borrowed_date', '-id')
+        page = paginator.paginate_queryset(borrowed_books, request)
+        return paginator.get_paginated_response(borrowed_book_data(page))
+    return Response(borrowed_book_data(borrowed_books))
+
+
+# Availability is owned by circulation here: an admin upsert sets it on insert
+# only, so a resync or replay cannot reopen a book that is out on loan
+SYNC_UPDATE_FIELDS = ['title', 'author', 'publisher', 'category', 'published_date',
+                      'description', 'sync_sequence', 'updated_at']
+
+
+def upsert_books(books):
+    # books maps isbn -> validated BookSyncSerializer data plus the change's sync_sequence
+    publisher_ids = publishers.ids_for({item['publisher_name'] for item in books.values()}, create=True)
+    category_ids = categories.ids_for({item['category_name'] for item in books.values()}, create=True)
+    previous = list(Book.objects.filter(isbn__in=books.keys()).values_list('publisher_id', 'category_id'))
+
+    rows = [
+        Book(
+            title=item['title'],
+            author=item['author'],
+            isbn=item['isbn'],
+            publisher_id=publisher_ids[item['publisher_name']],
+            category_id=category_ids[item['category_name']],
+            published_date=item['published_date'],
+            description=item['description'],
+            is_available=item['is_available'],
+            sync_sequence=item['sync_sequence'],
+        )
+        for item in books.values()
+    ]
+    Book.objects.bulk_create(
+        rows,
+        update_conflicts=True,
+        unique_fields=['isbn'],
+        update_fields=SYNC_UPDATE_FIELDS,
+    )
+    CatalogBook.refresh(Book.objects.filter(isbn__in=books.keys()))
+    invalidate_books(
+        publisher_ids=[row.publisher_id for row in rows] + [ids[0] for ids in previous],
+        category_ids=[row.category_id for row in rows] + [ids[1] for ids in previous]
     )
-    serializer = BorrowedBookSerializer(borrowed_books, many=True)
-    return Response(serializer.data)
 
 
 @api_view(['POST'])
 @authentication_classes([InterServiceAuthentication])
 @permission_classes([])
-def sync_book_create(request):
-    # Get or create publisher and category
-    publisher, _ = Publisher.objects.get_or_create(
-        name=request.data['publisher_name']
-    )
-    category, _ = Category.objects.get_or_create(
-        name=request.data['category_name']
-    )
-    
-    # Create or update book
-    book_data = {
-        'title': request.data['title'],
-        'author': request.data['author'],
-        'isbn': request.data['isbn'],
-        'publisher': publisher,
-        'category': category,
-        'published_date': request.data['published_date'],
-        'description': request.data.get('description', ''),
-        'is_available': request.data.get('is_available', True)
-    }
-    
-    book, created = Book.objects.update_or_create(
-        isbn=book_data['isbn'],
-        defaults=book_data
-    )
-    
-    return Response(BookSerializer(book).data, 
-                   status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
+def apply_book_changes(request):
+    serializer = BookChangeSerializer(data=request.data.get('changes', []), many=True)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    # Highest sequence wins per ISBN, so retried or reordered batches are harmless
+    latest = {}
+    for change in serializer.validated_data:
+        current = latest.get(change['isbn'])
+        if current is None or change['sequence'] > current['sequence']:
+            latest[change['isbn']] = change
+
+    with transaction.atomic():
+        applied = dict(
+            Book.objects.select_for_update()
+            .filter(isbn__in=latest.keys())
+            .values_list('isbn', 'sync_sequence')
+        )
+        # A deleted book's sequence outlives its row in the tombstone
+        tombstones = BookTombstone.objects.select_for_update().filter(isbn__in=latest.keys())
+        for isbn, sequence in tombstones.values_list('isbn', 'sync_sequence'):
+            applied[isbn] = max(sequence, applied.get(isbn, 0))
+        fresh = [change for isbn, change in latest.items() if change['sequence'] > applied.get(isbn, 0)]
+
+        deleted = [change['isbn'] for change in fresh if change['operation'] == 'delete']
+        if deleted:
+            deleted_books = Book.objects.filter(isbn__in=deleted)
+            previous = list(deleted_books.values_list('publisher_id', 'category_id'))
+            deleted_books.delete()
+            BookTombstone.objects.bulk_create(
+                [BookTombstone(isbn=isbn, sync_sequence=latest[isbn]['sequence']) for isbn in deleted],
+                update_conflicts=True,
+                unique_fields=['isbn'],
+                update_fields=['sync_sequence', 'deleted_at'],
+            )
+            invalidate_books(
+                publisher_ids=[ids[0] for ids in previous],
+                category_ids=[ids[1] for ids in previous]
+            )
+
+        upserts = {
+            change['isbn']: dict(change['book'], isbn=change['isbn'], sync_sequence=change['sequence'])
+            for change in fresh if change['operation'] == 'upsert'
+        }
+        if upserts:
+            upsert_books(upserts)
+            # The book's own sync_sequence is ahead of any tombstone now
+            BookTombstone.objects.filter(isbn__in=upserts.keys()).delete()
 
-@api_view(['DELETE'])
+    return Response({
+        'applied': len(fresh),
+        'skipped': len(serializer.validated_data) - len(fresh)
+    }, status=status.HTTP_200_OK)
+
+
+@api_view(['POST'])
+@authentication_classes([InterServiceAuthentication])
+@permission_classes([])
+def purge_tombstones(request):
+    # Called from the admin's beat schedule; this service runs no scheduler
+    cutoff = timezone.now() - timedelta(seconds=settings.TOMBSTONE_RETENTION)
+    purged, _ = BookTombstone.objects.filter(deleted_at__lt=cutoff).delete()
+    return Response({'purged': purged})
+
+
+@api_view(['POST'])
+@authentication_classes([InterServiceAuthentication])
+@permission_classes([])
+def catalog_ranges(request):
+    parents = request.data.get('parents', [])
+    length = int(request.data.get('length', 0))
+    return Response({'ranges': summarize_ranges(parents, length)})
+
+
+@api_view(['POST'])
 @authentication_classes([InterServiceAuthentication])
 @permission_classes([])
-def sync_book_delete(request, isbn):
-    try:
-        book = Book.objects.get(isbn=isbn)
-        book.delete()
-        return Response(status=status.HTTP_204_NO_CONTENT)
-    except Book.DoesNotExist:
-        return Response(status=status.HTTP_404_NOT_FOUND)
\ No newline at end of file
+def catalog_digests(request):
+    return Response({'digests': range_digests(request.data.get('prefixes', []))})
@@ -19,6 +19,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'rest_framework_simplejwt',
     'django_filters',
@@ -28,6 +29,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'library_common.metrics.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -59,6 +61,10 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'frontend_api.wsgi.application'
 
+# SERVER_MODE=asgi (frontend_api.asgi under uvicorn workers) routes the catalog
+# reads and my-borrowed to the async views in books/async_views.py
+ASYNC_READ_VIEWS = os.environ.get('SERVER_MODE', 'wsgi') == 'asgi'
+
 # Database
 DATABASES = {
     'default': dj_database_url.config(
@@ -109,6 +115,11 @@ REST_FRAMEWORK = {
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend',
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        # JSONRenderer that times itself for serializer_duration_seconds
+        'library_common.metrics.TimedJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 20
 }
@@ -125,8 +136,50 @@ SIMPLE_JWT = {
 CELERY_BROKER_URL = os.environ.get('REDIS_URL', 'redis://localhost:6379/0')
 CELERY_RESULT_BACKEND = CELERY_BROKER_URL
 
+# Cache (Redis in docker-compose, local memory otherwise)
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+            'KEY_PREFIX': 'frontend',
+        }
+    }
+
+# Seconds a cached book list page may live; invalidation normally retires it sooner
+BOOK_LIST_CACHE_TIMEOUT = int(os.environ.get('BOOK_LIST_CACHE_TIMEOUT', 300))
+
+# Seconds the catalog reads trust a cached account state (active or not) for a
+# token's user; deactivations and password changes take effect immediately
+TOKEN_USER_STATE_TIMEOUT = int(os.environ.get('TOKEN_USER_STATE_TIMEOUT', 60))
+
+# Seconds a deleted book's tombstone outlives it (see books.models.BookTombstone)
+TOMBSTONE_RETENTION = int(os.environ.get('TOMBSTONE_RETENTION', 7 * 24 * 60 * 60))
+
+# Publisher/Category lookups cached per process; invalidated over Redis pub/sub when set
+REFERENCE_CACHE_SIZE = int(os.environ.get('REFERENCE_CACHE_SIZE', 1000))
+REFERENCE_CACHE_REDIS_URL = os.environ.get('REDIS_URL')
+# Channels are shared by every Redis database, so each service gets its own
+REFERENCE_CACHE_CHANNEL = 'frontend:reference-cache:invalidate'
+
 # Inter-service communication
 INTER_SERVICE_TOKEN = os.environ.get('INTER_SERVICE_TOKEN', 'your-inter-service-token')
+# Further keys accepted while one is rotated in or out (comma-separated);
+# see library_common/inter_service_keys.py for the rotation steps
+INTER_SERVICE_ACCEPTED_TOKENS = [key for key in os.environ.get('INTER_SERVICE_ACCEPTED_TOKENS', '').split(',') if key]
+INTER_SERVICE_KEYS_REDIS_URL = os.environ.get('REDIS_URL')
+INTER_SERVICE_KEYS_REDIS_KEY = 'inter-service:keys'
+INTER_SERVICE_KEYS_REFRESH = float(os.environ.get('INTER_SERVICE_KEYS_REFRESH', 30))
+# Sign outgoing requests with HMAC instead of sending the key; reject unsigned ones
+INTER_SERVICE_SIGN_REQUESTS = os.environ.get('INTER_SERVICE_SIGN_REQUESTS', 'False') == 'True'
+INTER_SERVICE_REQUIRE_SIGNATURE = os.environ.get('INTER_SERVICE_REQUIRE_SIGNATURE', 'False') == 'True'
+# Seconds of clock skew (and replay window) tolerated on a signature
+INTER_SERVICE_SIGNATURE_MAX_AGE = int(os.environ.get('INTER_SERVICE_SIGNATURE_MAX_AGE', 300))
+
+# Request metrics: requests slower than this are logged with their SQL
+SLOW_REQUEST_THRESHOLD = float(os.environ.get('SLOW_REQUEST_THRESHOLD', 1.0))
+SLOW_REQUEST_MAX_QUERIES = int(os.environ.get('SLOW_REQUEST_MAX_QUERIES', 100))
+METRICS_COLLECTORS = []
 
 # CORS
 CORS_ALLOWED_ORIGINS = [